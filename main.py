@@ -1,18 +1,27 @@
+from __future__ import annotations
 import os
 import sys
+import time
 import argparse
-import pandas
+import functools
+import typing
 import numpy
 from sumo_rl.models.commons import Timer
 from sumo_rl.models.serde import GenericFile, SerdeYamlFile
 from sumo_rl.preprocessing.adiacency_graph import build_adiacency_graph
 import sumo_rl.util.config
+import sumo_rl.util.pipeline
+import sumo_rl.util.profiler
+import sumo_rl.util.traces
+import sumo_rl.util.tiers
 import sumo_rl.preprocessing.factories
 import sumo_rl.preprocessing.partitions
 import sumo_rl.observations
 import sumo_rl.rewards
 import sumo_rl.agents
 import sumo_rl.environment.env
+import sumo_rl.environment.metrics
+import sumo_rl.environment.vector
 
 if "SUMO_HOME" in os.environ:
   tools = os.path.join(os.environ["SUMO_HOME"], "tools")
@@ -40,7 +49,7 @@ class SelfAdapter:
   
   def need_to_adapt(self, env: sumo_rl.environment.env.SumoEnvironment) -> str|None:
     for metric, metric_data in self.monitor.items():
-      mean_value = numpy.mean(env.metrics[metric][-self.monitor_step_width:])
+      mean_value = numpy.nanmean(env.metrics[metric][-self.monitor_step_width:])
       diff = abs(mean_value - metric_data['E'])
       tol = metric_data['sigma'] * 10
       if diff >= tol:
@@ -49,7 +58,7 @@ class SelfAdapter:
   
   def need_to_adapt2(self, env: sumo_rl.environment.env.SumoEnvironment) -> str|None:
     for metric, metric_data in self.monitor.items():
-      mean_value = numpy.mean(env.metrics[metric][-self.monitor_step_width:])
+      mean_value = numpy.nanmean(env.metrics[metric][-self.monitor_step_width:])
       diff = abs((mean_value - metric_data['E']) / mean_value)
       tol = 0.05
       if diff >= tol:
@@ -220,7 +229,41 @@ def identify_pattern(routes_file_path: str) -> str|None:
       print(splitted[2])
   return None
 
-def perform_training(config: sumo_rl.util.config.Config, agents: list[sumo_rl.agents.Agent], env: sumo_rl.environment.env.SumoEnvironment, save_intermediate_agents: bool = False, save_monitoring_features: bool = False, log_time: bool = False):
+def build_env(cli_args, config: sumo_rl.util.config.Config) -> tuple[sumo_rl.environment.env.SumoEnvironment, typing.Any]:
+  """Environment selected by command line arguments, plus its vision graph if the observation or reward function needs one"""
+  _, _, observation_fn_by_option = use_selection_of_observation_fn()
+  _, _, reward_fn_by_option = use_selection_of_reward_fn()
+  observation_fn = observation_fn_by_option(cli_args)
+  reward_fn = reward_fn_by_option(cli_args)
+  env = sumo_rl.environment.env.SumoEnvironment.from_config(config, observation_fn, reward_fn, cli_args.use_gui, nproc(cli_args.jobs), cli_args.depth, not cli_args.no_subscriptions, persistent_connection=cli_args.persistent_connection, fast_forward=cli_args.fast_forward, trace_traci=cli_args.trace_traci, libsumo_worker=cli_args.libsumo_workers, surrogate=cli_args.surrogate, skip_idle=cli_args.skip_idle)
+  graph = None
+  if isinstance(env.observation_fn, sumo_rl.observations.SharedVisionObservationFunction) or isinstance(env.reward_fn, sumo_rl.rewards.SharedVisionRewardFunction):
+    graph = build_adiacency_graph(env, None)
+    if isinstance(env.observation_fn, sumo_rl.observations.SharedVisionObservationFunction):
+      env.observation_fn.vision_graph = graph
+    if isinstance(env.reward_fn, sumo_rl.rewards.SharedVisionRewardFunction):
+      env.reward_fn.vision_graph = graph
+  return env, graph
+
+def configure_metrics(cli_args, config: sumo_rl.util.config.Config) -> None:
+  """Metric columns of the run: --metrics over sumo.metrics, plus those the self adapter monitors"""
+  if cli_args.metrics is not None:
+    config.sumo.metrics = cli_args.metrics
+  if cli_args.self_adaptive and config.sumo.metrics is not None:
+    config.sumo.metrics = list(dict.fromkeys(config.sumo.metrics + ['mean_waiting_time', 'mean_speed']))
+
+def build_worker_env(cli_args, index: int) -> sumo_rl.environment.env.SumoEnvironment:
+  """Environment of a SumoVectorEnv worker, built in the worker process (see --workers)"""
+  config: sumo_rl.util.config.Config = sumo_rl.util.config.Config.from_yaml_file(cli_args.config)
+  if cli_args.seed is not None:
+    config.sumo.sumo_seed = cli_args.seed
+  if cli_args.mesosim:
+    config.sumo.fidelity = 'meso'
+  configure_metrics(cli_args, config)
+  env, _ = build_env(cli_args, config)
+  return env
+
+def perform_training(config: sumo_rl.util.config.Config, agents: list[sumo_rl.agents.Agent], env: sumo_rl.environment.env.SumoEnvironment, save_intermediate_agents: bool = False, save_monitoring_features: bool = False, log_time: bool = False, csv_metrics: bool = False, pipeline: sumo_rl.util.pipeline.PipelinedRunner|None = None, profiler: sumo_rl.util.profiler.Profiler = sumo_rl.util.profiler.NullProfiler(), record_traces: bool = False):
   timer = Timer()
   env.set_duration(config.training.seconds)
   tracks = {}
@@ -228,27 +271,23 @@ def perform_training(config: sumo_rl.util.config.Config, agents: list[sumo_rl.ag
     'mean_waiting_time': [],
     'mean_speed': []
   }
+  tiers = sumo_rl.util.tiers.TierReport()
   for episode, routes_file in enumerate(config.scenario.training_routes):
     env.sumo_seed += 1
     env.set_route_file(routes_file)
-    timer.round("Training :: Episode(%s)/Routes(%s)/Seed(%s) :: Starting" % (episode, routes_file, env.sumo_seed))
+    env.set_fidelity(config.training_fidelity(episode))
+    timer.round("Training :: Episode(%s)/Routes(%s)/Seed(%s)/Fidelity(%s) :: Starting" % (episode, routes_file, env.sumo_seed, env.fidelity))
+    episode_start = time.perf_counter()
     env.reset()
+    start_time = env.sim_step
+    path = config.training_metrics_file(episode)
+    env.stream_metrics(config.training_metrics_columns(episode), path if csv_metrics else None)
     for agent in agents:
       agent.reset()
-    env.gather_data_from_sumo()
-    env.compute_observations()
-    env.compute_rewards()
-    env.compute_metrics()
-    for agent in agents:
-      if agent.can_observe():
-        agent.observe(env.observations)
-    while not env.done():
-      actions = {}
-      if log_time:
-        print(env.sim_step, end="\r")
-      for agent in agents:
-        actions.update(agent.act())
-      env.step(action=actions)
+    traces = sumo_rl.util.traces.TraceRecorder(config.training_traces_dir(episode), env.ts_ids) if record_traces else None
+    if pipeline is not None:
+      print(pipeline.run_episode(log_time))
+    else:
       env.gather_data_from_sumo()
       env.compute_observations()
       env.compute_rewards()
@@ -256,18 +295,65 @@ def perform_training(config: sumo_rl.util.config.Config, agents: list[sumo_rl.ag
       for agent in agents:
         if agent.can_observe():
           agent.observe(env.observations)
-        if agent.can_learn():
-          agent.learn(env.rewards)
+      while not env.done():
+        start = profiler.clock()
+        skipped = env.skip_idle_steps()
+        if skipped > 0:
+          profiler.record('env.skip_idle', start)
+          for agent in agents:
+            agent.skip(skipped)
+            if agent.can_observe():
+              agent.observe(env.observations)
+          continue
+        actions = {}
+        if log_time:
+          print(env.sim_step, end="\r")
+        start = profiler.clock()
+        for agent in agents:
+          actions.update(agent.act())
+        start = profiler.record('agent.act', start)
+        previous_observations = env.observation_matrix
+        env.step(action=actions)
+        start = profiler.record('env.step', start)
+        env.gather_data_from_sumo()
+        start = profiler.record('gather_data_from_sumo', start)
+        env.compute_observations()
+        start = profiler.record('compute_observations', start)
+        env.compute_rewards()
+        start = profiler.record('compute_rewards', start)
+        if traces is not None:
+          traces.record(env.sim_step, previous_observations, env.observation_sizes, actions, env.reward_vector, env.observation_matrix)
+          start = profiler.record('traces.record', start)
+        env.compute_metrics()
+        start = profiler.record('compute_metrics', start)
+        for agent in agents:
+          if agent.can_observe():
+            agent.observe(env.observations)
+            start = profiler.record('agent.observe', start)
+          if agent.can_learn():
+            agent.learn(env.rewards)
+            start = profiler.record('agent.learn', start)
     timer.round("Training :: Episode(%s)/Routes(%s)/Seed(%s) :: Ended" % (episode, routes_file, env.sumo_seed))
+    report = tiers.episode(env.fidelity, time.perf_counter() - episode_start, env.sim_step - start_time, env.metrics)
+    print("Training :: Episode(%s) :: %s" % (episode, sumo_rl.util.tiers.describe(report)))
+    GenericFile(report).to_yaml_file(config.training_fidelity_file(episode))
+    if traces is not None:
+      traces.close()
+    profiler.dump(config.training_timings_file(episode))
+    if env.tracer is not None:
+      env.tracer.dump(config.training_traci_file(episode))
+    if log_time:
+      print("Signal state commands", env.signal_command_stats)
 
     # Serialize Metrics
-    path = config.training_metrics_file(episode)
-    pandas.DataFrame(env.metrics).to_csv(path, index=False)
+    env.close_metrics()
     tracks[path] = identify_pattern(routes_file)
+    if env.directions_summary is not None:
+      print("Directions statistics", env.directions_summary)
 
     if save_monitoring_features:
-      monitor['mean_waiting_time'].append(numpy.mean(env.metrics['mean_waiting_time']))
-      monitor['mean_speed'].append(numpy.mean(env.metrics['mean_speed']))
+      monitor['mean_waiting_time'].append(numpy.nanmean(env.metrics['mean_waiting_time']))
+      monitor['mean_speed'].append(numpy.nanmean(env.metrics['mean_speed']))
 
     if save_intermediate_agents:
       # Serialize Agents
@@ -284,12 +370,136 @@ def perform_training(config: sumo_rl.util.config.Config, agents: list[sumo_rl.ag
   GenericFile(tracks).to_yaml_file(config.training_metrics_dir() + '/tracks.yml')
   if save_monitoring_features:
     for metric in monitor:
-      monitor[metric] = {'E': numpy.mean(monitor[metric]), 'sigma':  numpy.std(monitor[metric])}
+      monitor[metric] = {'E': numpy.nanmean(monitor[metric]), 'sigma':  numpy.nanstd(monitor[metric])}
     GenericFile(monitor).to_yaml_file(config.training_metrics_dir() + '/monitor.yml')
 
-def perform_evaluation(config: sumo_rl.util.config.Config, agents: list[sumo_rl.agents.Agent], env: sumo_rl.environment.env.SumoEnvironment, use_monitoring_features: bool = False, log_time: bool = False):
+def perform_training_vectorized(config: sumo_rl.util.config.Config, agents: list[sumo_rl.agents.Agent], env: sumo_rl.environment.env.SumoEnvironment, pool: sumo_rl.environment.vector.SumoVectorEnv, save_intermediate_agents: bool = False, save_monitoring_features: bool = False, log_time: bool = False, csv_metrics: bool = False):
+  """Same as perform_training, but runs the episodes in rounds of one episode per worker of the pool.
+
+  Agents drive every worker in turn, swapping their view of the simulation (Agent.context) between workers.
+  """
+  timer = Timer()
+  tracks = {}
+  monitor = {
+    'mean_waiting_time': [],
+    'mean_speed': []
+  }
+  routes = config.scenario.training_routes
+  tiers = sumo_rl.util.tiers.TierReport()
+  ts_position = {ts_id: position for position, ts_id in enumerate(pool.ts_ids)}
+  seed = env.sumo_seed
+  for first_episode in range(0, len(routes), pool.num_envs):
+    episodes = []
+    for worker in range(pool.num_envs):
+      episode = first_episode + worker
+      if episode >= len(routes):
+        episodes.append(None)
+        continue
+      seed += 1
+      episodes.append({
+        'route_file': routes[episode],
+        'seed': seed,
+        'seconds': config.training.seconds,
+        'metrics_path': config.training_metrics_columns(episode),
+        'csv_path': config.training_metrics_file(episode) if csv_metrics else None,
+        'fidelity': config.training_fidelity(episode),
+      })
+    active = [worker for worker, episode in enumerate(episodes) if episode is not None]
+    timer.round("Training :: Episodes(%s-%s) :: Starting" % (first_episode, first_episode + len(active) - 1))
+    round_start = time.perf_counter()
+    pool.reset_episodes(episodes)
+    contexts: dict[str, dict[int, dict]] = {}
+    for agent in agents:
+      contexts[agent.id] = {}
+      for worker in active:
+        agent.reset()
+        if agent.can_observe():
+          agent.observe(pool.observations_of(worker))
+        contexts[agent.id][worker] = agent.context()
+    actions = numpy.zeros(pool.buffers['actions'].shape, dtype=numpy.int64)
+    while not pool.all_done():
+      running = [worker for worker in active if not pool.done(worker)]
+      for agent in agents:
+        for worker in running:
+          agent.load_context(contexts[agent.id][worker])
+          for ts_id, action in agent.act().items():
+            actions[worker, ts_position[ts_id]] = action
+          contexts[agent.id][worker] = agent.context()
+      pool.step_workers(actions)
+      if log_time:
+        print(pool.metrics_of(running[0]).get('step'), end="\r")
+      for worker in running:
+        observations = pool.observations_of(worker)
+        rewards = pool.rewards_of(worker)
+        for agent in agents:
+          agent.load_context(contexts[agent.id][worker])
+          if agent.can_observe():
+            agent.observe(observations)
+          if agent.can_learn():
+            agent.learn(rewards)
+          contexts[agent.id][worker] = agent.context()
+    timer.round("Training :: Episodes(%s-%s) :: Ended" % (first_episode, first_episode + len(active) - 1))
+    round_seconds = time.perf_counter() - round_start
+
+    for worker in active:
+      episode = first_episode + worker
+      tracks[config.training_metrics_file(episode)] = identify_pattern(routes[episode])
+      # Episodes of a round run side by side, each gets the wall time of the round
+      metrics = sumo_rl.environment.metrics.read_metrics(config.training_metrics_dir(), episode)
+      report = tiers.episode(config.training_fidelity(episode), round_seconds, config.training.seconds, metrics)
+      print("Training :: Episode(%s) :: %s" % (episode, sumo_rl.util.tiers.describe(report)))
+      GenericFile(report).to_yaml_file(config.training_fidelity_file(episode))
+      if save_monitoring_features:
+        metrics = sumo_rl.environment.metrics.read_metrics(config.training_metrics_dir(), episode)
+        monitor['mean_waiting_time'].append(numpy.nanmean(metrics['mean_waiting_time']))
+        monitor['mean_speed'].append(numpy.nanmean(metrics['mean_speed']))
+
+    if save_intermediate_agents:
+      # Serialize Agents
+      for agent in agents:
+        if agent.can_be_serialized():
+          path = config.agents_file(first_episode + active[-1], agent.id)
+          agent.serialize(path)
+
+  # Serialize Agents
+  for agent in agents:
+    if agent.can_be_serialized():
+      path = config.agents_file(None, agent.id)
+      agent.serialize(path)
+  GenericFile(tracks).to_yaml_file(config.training_metrics_dir() + '/tracks.yml')
+  if save_monitoring_features:
+    for metric in monitor:
+      monitor[metric] = {'E': numpy.nanmean(monitor[metric]), 'sigma':  numpy.nanstd(monitor[metric])}
+    GenericFile(monitor).to_yaml_file(config.training_metrics_dir() + '/monitor.yml')
+
+def perform_offline_training(config: sumo_rl.util.config.Config, agents: list[sumo_rl.agents.Agent], save_intermediate_agents: bool = False):
+  """Trains the agents on the traces recorded by previous training runs (see --record-traces), without starting SUMO"""
+  timer = Timer()
+  traces_dir = config.training_traces_root()
+  episodes = sumo_rl.util.traces.identify_traces(traces_dir)
+  if len(episodes) == 0:
+    print("No recorded traces in %s" % traces_dir)
+  for episode in episodes:
+    path = config.training_traces_dir(episode)
+    timer.round("Offline training :: Episode(%s)/Traces(%s) :: Starting" % (episode, path))
+    steps = sumo_rl.util.traces.replay_trace(path, agents)
+    timer.round("Offline training :: Episode(%s)/Traces(%s) :: Ended (%s steps)" % (episode, path, steps))
+
+    if save_intermediate_agents:
+      # Serialize Agents
+      for agent in agents:
+        if agent.can_be_serialized():
+          agent.serialize(config.agents_file(episode, agent.id))
+
+  # Serialize Agents
+  for agent in agents:
+    if agent.can_be_serialized():
+      agent.serialize(config.agents_file(None, agent.id))
+
+def perform_evaluation(config: sumo_rl.util.config.Config, agents: list[sumo_rl.agents.Agent], env: sumo_rl.environment.env.SumoEnvironment, use_monitoring_features: bool = False, log_time: bool = False, csv_metrics: bool = False, profiler: sumo_rl.util.profiler.Profiler = sumo_rl.util.profiler.NullProfiler()):
   timer = Timer()
   env.set_duration(config.evaluation.seconds)
+  env.set_fidelity(config.sumo.fidelity)
   tracks = {}
   self_adapter = SelfAdapter()
   if use_monitoring_features:
@@ -303,6 +513,8 @@ def perform_evaluation(config: sumo_rl.util.config.Config, agents: list[sumo_rl.
     env.set_route_file(routes_file)
     timer.round("Evaluation :: Episode(%s)/Routes(%s)/Seed(%s) :: Starting" % (episode, routes_file, env.sumo_seed))
     env.reset()
+    path = config.evaluation_metrics_file(episode)
+    env.stream_metrics(config.evaluation_metrics_columns(episode), path if csv_metrics else None)
     for agent in agents:
       agent.reset()
     env.gather_data_from_sumo()
@@ -313,31 +525,56 @@ def perform_evaluation(config: sumo_rl.util.config.Config, agents: list[sumo_rl.
       if agent.can_observe():
         agent.observe(env.observations)
     while not env.done():
+      start = profiler.clock()
+      skipped = env.skip_idle_steps()
+      if skipped > 0:
+        profiler.record('env.skip_idle', start)
+        for agent in agents:
+          agent.skip(skipped)
+          if agent.can_observe():
+            agent.observe(env.observations)
+        continue
       actions = {}
       if log_time:
         print(env.sim_step, end="\r")
+      start = profiler.clock()
       for agent in agents:
         actions.update(agent.act())
+      start = profiler.record('agent.act', start)
       env.step(action=actions)
+      start = profiler.record('env.step', start)
       env.gather_data_from_sumo()
+      start = profiler.record('gather_data_from_sumo', start)
       env.compute_observations()
+      start = profiler.record('compute_observations', start)
       env.compute_rewards()
+      start = profiler.record('compute_rewards', start)
       env.compute_metrics()
+      start = profiler.record('compute_metrics', start)
       for agent in agents:
         if agent.can_observe():
           agent.observe(env.observations)
+          start = profiler.record('agent.observe', start)
       if use_monitoring_features:
         self_adapter.update(env, agents)
+        profiler.record('self_adapter.update', start)
     timer.round("Evaluation :: Episode(%s)/Routes(%s)/Seed(%s) :: Ended" % (episode, routes_file, env.sumo_seed))
+    profiler.dump(config.evaluation_timings_file(episode))
+    if env.tracer is not None:
+      env.tracer.dump(config.evaluation_traci_file(episode))
+    if log_time:
+      print("Signal state commands", env.signal_command_stats)
 
     # Serialize Metrics
-    path = config.evaluation_metrics_file(episode)
-    pandas.DataFrame(env.metrics).to_csv(path, index=False)
+    env.close_metrics()
     tracks[path] = identify_pattern(routes_file)
+    if env.directions_summary is not None:
+      print("Directions statistics", env.directions_summary)
   GenericFile(tracks).to_yaml_file(config.evaluation_metrics_dir() + '/tracks.yml')
 
 def perform_demo(config: sumo_rl.util.config.Config, agents: list[sumo_rl.agents.Agent], env: sumo_rl.environment.env.SumoEnvironment, use_monitoring_features: bool = False, log_time: bool = False):
   env.set_duration(config.demo.seconds)
+  env.set_fidelity(config.sumo.fidelity)
   self_adapter = SelfAdapter()
   if use_monitoring_features:
     self_adapter.read(config)
@@ -388,8 +625,25 @@ def show_args(cli_args):
     'jobs': cli_args.jobs,
     'paranoic': cli_args.paranoic,
     'depth': cli_args.depth,
+    'no_subscriptions': cli_args.no_subscriptions,
+    'metrics': cli_args.metrics,
+    'csv_metrics': cli_args.csv_metrics,
+    'persistent_connection': cli_args.persistent_connection,
+    'fast_forward': cli_args.fast_forward,
+    'trace_traci': cli_args.trace_traci,
+    'record_traces': cli_args.record_traces,
+    'libsumo_workers': cli_args.libsumo_workers,
+    'surrogate': cli_args.surrogate,
+    'skip_idle': cli_args.skip_idle,
+    'mesosim': cli_args.mesosim,
+    'meso_episodes': cli_args.meso_episodes,
+    'workers': cli_args.workers,
+    'timings': cli_args.timings,
+    'pipelined': cli_args.pipelined,
+    'pipelined_nondeterministic': cli_args.pipelined_nondeterministic,
     'self_adaptive': cli_args.self_adaptive,
     'do_training': cli_args.do_training,
+    'do_offline': cli_args.do_offline,
     'do_evaluation': cli_args.do_evaluation,
     'do_demo': cli_args.do_demo,
   })
@@ -413,8 +667,25 @@ def main():
   cli.add_argument('-j', '--jobs', type=int, default=1, nargs='?', help="Uses j number of threads")
   cli.add_argument('-pa', '--paranoic', action="store_true", default=False, help="Saves ALL intermediate results. you can never say!")
   cli.add_argument('-de', '--depth', action="store_true", default=False, help="Computes data for distinct routes in order to evaluate fairness of directions")
+  cli.add_argument('-ns', '--no-subscriptions', action="store_true", default=False, help="Gathers data from SUMO with one TraCI call per variable instead of subscriptions")
+  cli.add_argument('-M', '--metrics', nargs='+', default=None, help="Metric columns recorded at each step (overrides sumo.metrics, defaults to all of them), only the data they need is gathered from SUMO")
+  cli.add_argument('-cm', '--csv-metrics', action="store_true", default=False, help="Also exports metrics of each episode as CSV, besides the streamed column files")
+  cli.add_argument('-pc', '--persistent-connection', action="store_true", default=False, help="Keeps one SUMO process for the whole run, reloading it (traci.load) at each episode")
+  cli.add_argument('-ff', '--fast-forward', action="store_true", default=False, help="Advances SUMO from one phase event to the next (simulationStep(target)) instead of second by second")
+  cli.add_argument('-tt', '--trace-traci', action="store_true", default=False, help="Counts and times TraCI calls by call and caller, writes <episode>.traci.yml next to the metrics (as SUMO_RL_TRACE_TRACI=1)")
+  cli.add_argument('-lw', '--libsumo-workers', action="store_true", default=False, help="Runs each simulation with libsumo in a process of its own (as SUMO_RL_LIBSUMO_WORKERS=1), unlike LIBSUMO_AS_TRACI it works with the GUI and any number of environments")
+  cli.add_argument('-sg', '--surrogate', action="store_true", default=False, help="Runs episodes on a cell transmission model of the scenario instead of SUMO (fast, approximate, see tools.calibrate)")
+  cli.add_argument('-si', '--skip-idle', action="store_true", default=False, help="Jumps over the steps in which the network is empty and no vehicle is due to depart, agents are told to skip them (sequential training and evaluation)")
+  cli.add_argument('-ms', '--mesosim', action="store_true", default=False, help="Simulates with SUMO mesoscopic model (sets sumo.fidelity to meso), faster on large networks")
+  cli.add_argument('-me', '--meso-episodes', type=int, default=None, help="Runs the first MESO_EPISODES training episodes in meso and the others at the configured fidelity (overrides training.meso_episodes)")
+  cli.add_argument('-w', '--workers', type=int, default=1, help="Runs training episodes on WORKERS simulations in parallel (subprocesses)")
+  cli.add_argument('-pl', '--pipelined', action="store_true", default=False, help="Agents learn in a worker thread while metrics are computed, step-for-step identical to the sequential loop (no meaningful speedup, see --pipelined-nondeterministic)")
+  cli.add_argument('-pn', '--pipelined-nondeterministic', action="store_true", default=False, help="Agents learn in a worker thread while SUMO runs the next step (agents act with a policy one step stale)")
+  cli.add_argument('-tm', '--timings', action="store_true", default=False, help="Times each phase of the loop (step, gathering, observations, rewards, metrics, agents), writes <episode>.timings.yml next to the metrics")
+  cli.add_argument('-rt', '--record-traces', action="store_true", default=False, help="Records the transitions of each training episode (observations, actions, rewards) under <metrics>/training/traces, for --do-offline")
   cli.add_argument('-sa', '--self-adaptive', action="store_true", default=False, help="Self adaptive manouver")
   cli.add_argument('-DT', '--do-training', action="store_true", default=False, help="Perform training")
+  cli.add_argument('-DO', '--do-offline', action="store_true", default=False, help="Perform training on the recorded traces (see --record-traces), without simulating")
   cli.add_argument('-DE', '--do-evaluation', action="store_true", default=False, help="Perform evaluation")
   cli.add_argument('-DD', '--do-demo', action="store_true", default=False, help="Perform demo")
   cli.add_argument('-S', '--seed', type=int, help="Uses SEED as seed")
@@ -423,29 +694,48 @@ def main():
   config: sumo_rl.util.config.Config = sumo_rl.util.config.Config.from_yaml_file(cli_args.config)
   if cli_args.seed is not None:
     config.sumo.sumo_seed = cli_args.seed
+  if cli_args.mesosim:
+    config.sumo.fidelity = 'meso'
+  configure_metrics(cli_args, config)
+  if cli_args.meso_episodes is not None:
+    config.training.meso_episodes = cli_args.meso_episodes
 
   assert ((not cli_args.use_gui) or (os.environ.get("LIBSUMO_AS_TRACI") != '1'))
   assert ((cli_args.use_gui) or (not cli_args.do_demo))
+  assert ((not cli_args.use_gui) or cli_args.workers == 1)
+  assert ((not cli_args.surrogate) or not (cli_args.use_gui or cli_args.depth))
+  # Traces are recorded by the sequential training loop only
+  assert ((not cli_args.record_traces) or (cli_args.workers == 1 and not (cli_args.pipelined or cli_args.pipelined_nondeterministic)))
 
-  observation_fn = observation_fn_by_option(cli_args)
-  reward_fn = reward_fn_by_option(cli_args)
-  env = sumo_rl.environment.env.SumoEnvironment.from_config(config, observation_fn, reward_fn, cli_args.use_gui, nproc(cli_args.jobs), cli_args.depth)
-  if isinstance(env.observation_fn, sumo_rl.observations.SharedVisionObservationFunction) or isinstance(env.reward_fn, sumo_rl.rewards.SharedVisionRewardFunction):
-    graph = build_adiacency_graph(env, None)
-    if isinstance(env.observation_fn, sumo_rl.observations.SharedVisionObservationFunction):
-      env.observation_fn.vision_graph = graph
-    if isinstance(env.reward_fn, sumo_rl.rewards.SharedVisionRewardFunction):
-      env.reward_fn.vision_graph = graph
+  env, graph = build_env(cli_args, config)
+  if graph is not None:
     graph.to_d2_file('vision-graph.d2')
   agent_factory: sumo_rl.preprocessing.factories.AgentFactory = agent_factory_by_option(cli_args, config, env)
   agents_partition: sumo_rl.preprocessing.partitions.Partition = partition_by_option(cli_args, env)
   agents: list[sumo_rl.agents.Agent] = agent_factory.agent_by_assignments(agents_partition.data)
 
+  profiler = sumo_rl.util.profiler.Profiler() if cli_args.timings else sumo_rl.util.profiler.NullProfiler()
   if not cli_args.pretend:
     if cli_args.do_training:
-      perform_training(config, agents, env, save_intermediate_agents=cli_args.paranoic, save_monitoring_features=cli_args.self_adaptive, log_time=cli_args.verbose)
+      if cli_args.workers > 1:
+        pool = sumo_rl.environment.vector.SumoVectorEnv(functools.partial(build_worker_env, cli_args), cli_args.workers, env)
+        try:
+          perform_training_vectorized(config, agents, env, pool, save_intermediate_agents=cli_args.paranoic, save_monitoring_features=cli_args.self_adaptive, log_time=cli_args.verbose, csv_metrics=cli_args.csv_metrics)
+        finally:
+          pool.close()
+      else:
+        pipeline = None
+        if cli_args.pipelined or cli_args.pipelined_nondeterministic:
+          pipeline = sumo_rl.util.pipeline.PipelinedRunner(env, agents, deterministic=not cli_args.pipelined_nondeterministic)
+        try:
+          perform_training(config, agents, env, save_intermediate_agents=cli_args.paranoic, save_monitoring_features=cli_args.self_adaptive, log_time=cli_args.verbose, csv_metrics=cli_args.csv_metrics, pipeline=pipeline, profiler=profiler, record_traces=cli_args.record_traces)
+        finally:
+          if pipeline is not None:
+            pipeline.close()
+    if cli_args.do_offline:
+      perform_offline_training(config, agents, save_intermediate_agents=cli_args.paranoic)
     if cli_args.do_evaluation:
-      perform_evaluation(config, agents, env, use_monitoring_features=cli_args.self_adaptive, log_time=cli_args.verbose)
+      perform_evaluation(config, agents, env, use_monitoring_features=cli_args.self_adaptive, log_time=cli_args.verbose, csv_metrics=cli_args.csv_metrics, profiler=profiler)
     if cli_args.do_demo:
       perform_demo(config, agents, env, use_monitoring_features=cli_args.self_adaptive, log_time=cli_args.verbose)
   env.close()
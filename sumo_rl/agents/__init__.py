@@ -1,5 +1,5 @@
 """This module contains example of agents that can be used to interact with the environment."""
 
-from sumo_rl.agents.agent import Agent
+from sumo_rl.agents.agent import Agent, Experience
 from sumo_rl.agents.ql_agent import QLAgent
 from sumo_rl.agents.fixed_agent import FixedAgent
@@ -1,18 +1,46 @@
 """Abstract Agent class."""
+from __future__ import annotations
 
 import abc
 import typing
 
+class Experience:
+    """Transition an agent learns from, detached from the agent's view of simulation so that it can be learned later (or elsewhere)"""
+
+    def __init__(self, previous_states: dict, previous_actions: dict, current_states: dict, rewards: dict[str, typing.Any]) -> None:
+      self.previous_states: dict = previous_states
+      self.previous_actions: dict = previous_actions
+      self.current_states: dict = current_states
+      self.rewards: dict[str, typing.Any] = rewards
+
 class Agent(abc.ABC):
     """Abstract Agent class.
 
     An Agent should be able to comand multiple entities with the same state-space and action-space.
     """
 
+    # Attributes holding the agent's view of one simulation (as opposed to its memory), see context()
+    CONTEXT_ATTRIBUTES: list[str] = ['previous_states', 'current_states', 'previous_actions', 'current_actions',
+                                     'previous_values', 'previous_log_probs', 'steps_from_last_action']
+
     def __init__(self, id: str) -> None:
       """Initializes the Agent"""
       self.id: str = id
 
+    def context(self) -> dict[str, typing.Any]:
+      """Snapshot of the agent's view of the simulation it is driving
+
+      Together with load_context() it lets one agent (one memory) drive several simulations at once,
+      e.g. the workers of a SumoVectorEnv, by swapping views between them.
+      """
+      return {name: getattr(self, name) for name in self.CONTEXT_ATTRIBUTES if hasattr(self, name)}
+
+    def load_context(self, context: dict[str, typing.Any]) -> None:
+      """Restore a view of simulation taken with context()
+      """
+      for name, value in context.items():
+        setattr(self, name, value)
+
     @abc.abstractmethod
     def reset(self) -> None:
       """Resets the agent's view of simulation
@@ -52,6 +80,30 @@ class Agent(abc.ABC):
       """
       pass
 
+    def skip(self, steps: int) -> None:
+      """Tells the agent that the simulation went on for steps steps with no decision to take (e.g. an empty network)
+
+      Nothing is learned meanwhile, agents whose actions follow the clock catch up here.
+      Agents which observe are then given the observations at the end of the skipped steps.
+      """
+      pass
+
+    def experience(self, rewards: dict[str, typing.Any]) -> Experience:
+      """Capture the last transition (previous states and actions, current states) with its rewards
+
+      learn(rewards) is the same as learn_from(experience(rewards)).
+      Subclasses which don't support learning should throw a TypeError
+      """
+      raise TypeError("%s doesn't support learning" % self.__class__.__name__)
+
+    def learn_from(self, experience: Experience) -> None:
+      """Learn from a transition captured with experience()
+
+      It only touches the agent's memory, never its view of simulation, so it can run while the agent observes and acts.
+      Subclasses which don't support learning should throw a TypeError
+      """
+      raise TypeError("%s doesn't support learning" % self.__class__.__name__)
+
     @abc.abstractmethod
     def serialize(self, output_filepath: str) -> None:
       """Serialize Agent "memory" into an output file
@@ -1,7 +1,8 @@
 """Deep Q-learning Agent class."""
+from __future__ import annotations
 
 import numpy
-from sumo_rl.agents.agent import Agent
+from sumo_rl.agents.agent import Agent, Experience
 from sumo_rl.observations import ObservationFunction
 from sumo_rl.rewards import RewardFunction
 from sumo_rl.agents.dummy_env import DummyEnv
@@ -62,13 +63,20 @@ class DQNAgent(Agent):
     self.previous_actions = actions
     return {k:int(v) for k,v in actions.items()}
 
+  def experience(self, rewards: dict[str, typing.Any]) -> Experience:
+    return Experience(self.previous_states, self.previous_actions, self.current_states, rewards)
+
   def learn(self, rewards: dict[str, typing.Any]):
-    """Update Q-table with new experience."""
+    """Update replay buffer with new experience."""
+    self.learn_from(self.experience(rewards))
+
+  def learn_from(self, experience: Experience):
+    """Update replay buffer with a captured experience."""
     for ID in self.controlled_entities.keys():
-      previous_state = self.previous_states[ID]
-      current_state = self.current_states[ID]
-      previous_action = self.previous_actions[ID]
-      reward = rewards[ID]
+      previous_state = experience.previous_states[ID]
+      current_state = experience.current_states[ID]
+      previous_action = experience.previous_actions[ID]
+      reward = experience.rewards[ID]
       self.model.replay_buffer.add(previous_state, current_state, previous_action, reward, numpy.array([False]), [{}])
     if self.model.replay_buffer.full:
       self.model.train(1, batch_size=1)
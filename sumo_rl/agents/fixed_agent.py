@@ -1,4 +1,5 @@
 """Fixed Agent class."""
+from __future__ import annotations
 
 from sumo_rl.agents.agent import Agent
 from sumo_rl.environment.traffic_signal import TrafficSignal
@@ -44,6 +45,14 @@ class FixedAgent(Agent):
     else:
       return self.previous_actions
 
+  def skip(self, steps: int) -> None:
+    """Advance the cycle as if act() had been called steps times"""
+    elapsed = self.steps_from_last_action + steps
+    changes = elapsed // self.cycle_time_steps
+    if changes > 0:
+      self.previous_actions = {ID: (self.previous_actions[ID] + changes) % self.action_space.n for ID in self.controlled_entities}
+    self.steps_from_last_action = elapsed % self.cycle_time_steps
+
   def learn(self):
     """Nothing is learned"""
     raise TypeError("FixedAgent doesn't support learning")
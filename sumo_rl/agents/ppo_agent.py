@@ -1,7 +1,8 @@
 """Deep Q-learning Agent class."""
+from __future__ import annotations
 
 import numpy
-from sumo_rl.agents.agent import Agent
+from sumo_rl.agents.agent import Agent, Experience
 from sumo_rl.observations import ObservationFunction
 from sumo_rl.rewards import RewardFunction
 from sumo_rl.agents.dummy_env import DummyEnv
@@ -67,12 +68,19 @@ class PPOAgent(Agent):
     self.previous_log_probs = log_probs
     return actions
 
+  def experience(self, rewards: dict[str, typing.Any]) -> Experience:
+    return Experience(self.previous_states, self.previous_actions, self.current_states, rewards)
+
   def learn(self, rewards: dict[str, typing.Any]):
-    """Update Q-table with new experience."""
+    """Update rollout buffer with new experience."""
+    self.learn_from(self.experience(rewards))
+
+  def learn_from(self, experience: Experience):
+    """Update rollout buffer with a captured experience."""
     for ID in self.controlled_entities.keys():
-      previous_state = self.previous_states[ID]
-      previous_action = self.previous_actions[ID]
-      reward = rewards[ID]
+      previous_state = experience.previous_states[ID]
+      previous_action = experience.previous_actions[ID]
+      reward = experience.rewards[ID]
       state_tensor = torch.tensor([previous_state], dtype=torch.float32).to(self.model.device)
       value, log_prob, _ = self.model.policy.forward(state_tensor)
       self.model.rollout_buffer.add(obs=previous_state, action=previous_action, reward=reward, episode_start=numpy.array([False]), value=value.detach(), log_prob=log_prob.detach())
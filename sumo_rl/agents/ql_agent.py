@@ -1,7 +1,8 @@
 """Q-learning Agent class."""
+from __future__ import annotations
 
 import pickle
-from sumo_rl.agents.agent import Agent
+from sumo_rl.agents.agent import Agent, Experience
 from sumo_rl.observations import ObservationFunction
 from sumo_rl.rewards import RewardFunction
 from sumo_rl.exploration.epsilon_greedy import EpsilonGreedy
@@ -65,13 +66,20 @@ class QLAgent(Agent):
     self.previous_actions = actions
     return actions
 
+  def experience(self, rewards: dict[str, typing.Any]) -> Experience:
+    return Experience(self.previous_states, self.previous_actions, self.current_states, rewards)
+
   def learn(self, rewards: dict[str, typing.Any]):
     """Update Q-table with new experience."""
+    self.learn_from(self.experience(rewards))
+
+  def learn_from(self, experience: Experience):
+    """Update Q-table with a captured experience."""
     for ID in self.controlled_entities.keys():
-      previous_state = self.previous_states[ID]
-      current_state = self.current_states[ID]
-      previous_action = self.previous_actions[ID]
-      reward = rewards[ID]
+      previous_state = experience.previous_states[ID]
+      current_state = experience.current_states[ID]
+      previous_action = experience.previous_actions[ID]
+      reward = experience.rewards[ID]
       self.q_table[previous_state][previous_action] = self.q_table[previous_state][previous_action] + self.alpha * (
         reward + self.gamma * max(self.q_table[current_state]) - self.q_table[previous_state][previous_action]
       )
@@ -1,6 +1,167 @@
+"""Columnar storage of the data gathered from SUMO at each step."""
+from __future__ import annotations
+
+import collections.abc
+import typing
+import numpy
+
+# Numerical lane variables, each one stored as a float32 column indexed by lane index
+LANE_COLUMNS = ['ms', 'lsvn', 'lsvl', 'lshn', 'lsms', 'lso', 'lswt', 'tawt', 'mawt']
+
+# Lane variables which are reduced from per-vehicle variables of the lane vehicles ('vehs')
+DERIVED_LANE_VARIABLES = {
+  'tawt': 'awt',
+  'mawt': 'awt',
+}
+
+# Lane sets on which lane variables can be required
+INCOMING = 'incoming'
+OUTGOING = 'outgoing'
+ALL = 'all'
+
+class Requirements:
+  """Declares which lane variables a consumer reads and on which lane sets, plus the vehicle variables it reads."""
+
+  def __init__(self, lanes: dict[str, set[str]]|None = None, vehicles: set[str]|None = None) -> None:
+    self.lanes: dict[str, set[str]] = {}
+    self.vehicles: set[str] = set(vehicles or set({}))
+    for key, lane_sets in (lanes or {}).items():
+      self.require(key, *lane_sets)
+
+  def require(self, key: str, *lane_sets: str) -> 'Requirements':
+    """Require lane variable `key` on the given lane sets, pulling in the variables it is derived from."""
+    self.lanes[key] = self.lanes.get(key, set({})) | set(lane_sets)
+    if key in DERIVED_LANE_VARIABLES:
+      self.lanes['vehs'] = self.lanes.get('vehs', set({})) | set(lane_sets)
+      self.vehicles.add(DERIVED_LANE_VARIABLES[key])
+    return self
+
+  def require_vehicles(self, key: str) -> 'Requirements':
+    """Require vehicle variable `key` on every vehicle found on the lanes where 'vehs' is required."""
+    self.vehicles.add(key)
+    return self
+
+  def union(self, other: 'Requirements') -> 'Requirements':
+    result = Requirements(self.lanes, self.vehicles)
+    for key, lane_sets in other.lanes.items():
+      result.require(key, *lane_sets)
+    result.vehicles |= other.vehicles
+    return result
+
+  @staticmethod
+  def everything() -> 'Requirements':
+    """Every gatherable variable on every lane, the safe default for consumers which don't declare anything."""
+    requirements = Requirements()
+    for key in LANE_COLUMNS[1:] + ['vehs']:
+      requirements.require(key, ALL)
+    return requirements
+
+  def __repr__(self) -> str:
+    return "Requirements(%s, %s)" % (self.lanes, self.vehicles)
+
+class LaneView(collections.abc.Mapping):
+  """Read-only view of a single lane, with the same keys of the former dict of dicts."""
+
+  def __init__(self, datastore, idx: int) -> None:
+    self._datastore = datastore
+    self._idx = idx
+
+  def __getitem__(self, key: str) -> typing.Any:
+    if key == 'vehs':
+      return self._datastore.lane_vehicles[self._idx]
+    return self._datastore.columns[key][self._idx]
+
+  def __iter__(self):
+    yield from LANE_COLUMNS
+    yield 'vehs'
+
+  def __len__(self) -> int:
+    return len(LANE_COLUMNS) + 1
+
+class LanesView(collections.abc.Mapping):
+  """Read-only compatibility adapter exposing lanes as `lane_ID -> {key: value}`."""
+
+  def __init__(self, datastore) -> None:
+    self._datastore = datastore
+
+  def __getitem__(self, lane_ID: str) -> LaneView:
+    return LaneView(self._datastore, self._datastore.lane_index[lane_ID])
+
+  def __iter__(self):
+    return iter(self._datastore.lane_IDs)
+
+  def __len__(self) -> int:
+    return len(self._datastore.lane_IDs)
+
+class SignalIndex:
+  """Incoming lanes of a tuple of traffic signals, padded into a matrix so that they can be gathered in one pass."""
+
+  def __init__(self, traffic_signals: list) -> None:
+    self.IDs: list[str] = [ts.id for ts in traffic_signals]
+    self.rows: numpy.ndarray = numpy.arange(len(traffic_signals), dtype=numpy.int64)
+    self.num_green_phases: numpy.ndarray = numpy.array([ts.num_green_phases for ts in traffic_signals], dtype=numpy.int64)
+    self.num_lanes: numpy.ndarray = numpy.array([len(ts.lanes_idx) for ts in traffic_signals], dtype=numpy.int64)
+    self.lanes_mask: numpy.ndarray = numpy.arange(self.num_lanes.max(initial=0)) < self.num_lanes[:, None]
+    self.lanes_idx: numpy.ndarray = numpy.zeros(self.lanes_mask.shape, dtype=numpy.int64)
+    self.lanes_idx[self.lanes_mask] = numpy.concatenate([numpy.zeros(0, dtype=numpy.int64)] + [ts.lanes_idx for ts in traffic_signals])
+    # Flat (row, position, lane index) triples of the valid cells, in signal then lane order
+    self.lane_rows, self.lane_positions = numpy.nonzero(self.lanes_mask)
+    self.flat_lanes_idx: numpy.ndarray = self.lanes_idx[self.lanes_mask]
+    self.lanes_offsets: numpy.ndarray = numpy.concatenate([[0], numpy.cumsum(self.num_lanes)[:-1]]).astype(numpy.int64)
+    # Outgoing lanes, concatenated with the offset of each signal's segment
+    self.num_out_lanes: numpy.ndarray = numpy.array([len(ts.out_lanes_idx) for ts in traffic_signals], dtype=numpy.int64)
+    self.flat_out_lanes_idx: numpy.ndarray = numpy.concatenate([numpy.zeros(0, dtype=numpy.int64)] + [ts.out_lanes_idx for ts in traffic_signals])
+    self.out_lanes_offsets: numpy.ndarray = numpy.concatenate([[0], numpy.cumsum(self.num_out_lanes)[:-1]]).astype(numpy.int64)
+    # Position of each signal in the per-signal vectors of the datastore
+    self.signals: numpy.ndarray = numpy.array([ts.index for ts in traffic_signals], dtype=numpy.int64)
+
 class Datastore:
-  def __init__(self) -> None:
-    self.lanes: dict[str, dict] = {}
+  """Struct of arrays: one float32 column per lane variable, indexed by a stable lane index."""
+
+  def __init__(self, lane_IDs: list[str] = [], num_signals: int = 0) -> None:
+    self.lane_IDs: list[str] = list(lane_IDs)
+    self.lane_index: dict[str, int] = {lane_ID: idx for idx, lane_ID in enumerate(self.lane_IDs)}
+    self.columns: dict[str, numpy.ndarray] = {key: numpy.zeros(len(self.lane_IDs), dtype=numpy.float32) for key in LANE_COLUMNS}
+    self.lane_vehicles: list[set[str]] = [set({}) for _ in self.lane_IDs]
+    self.lanes: LanesView = LanesView(self)
+    self.vehicle_IDs: set[str] = set({})
     self.vehicles: dict[str, dict] = {}
     self.reward_cache: dict[str, dict] = {}
     self.observation_cache: dict[str, dict] = {}
+    self.signal_indices: dict[tuple, SignalIndex] = {}
+    # Per-signal state, indexed by TrafficSignal.index
+    self.last_ts_waiting_time: numpy.ndarray = numpy.zeros(num_signals, dtype=numpy.float64)
+
+  def __getattr__(self, key: str) -> numpy.ndarray:
+    """Columns are reachable as attributes, e.g. `datastore.lso[ts.lanes_idx]`."""
+    columns = self.__dict__.get('columns')
+    if columns is not None and key in columns:
+      return columns[key]
+    raise AttributeError(key)
+
+  def indices(self, lane_IDs: list[str]) -> numpy.ndarray:
+    """Return the integer lane indices of the given lanes."""
+    return numpy.array([self.lane_index[lane_ID] for lane_ID in lane_IDs], dtype=numpy.int64)
+
+  def signal_index(self, traffic_signals: list) -> SignalIndex:
+    """Return the padded lane indices of the given traffic signals, built once per tuple of signals."""
+    key = tuple(ts.id for ts in traffic_signals)
+    if key not in self.signal_indices:
+      self.signal_indices[key] = SignalIndex(traffic_signals)
+    return self.signal_indices[key]
+
+  def plan(self, requirements: Requirements, traffic_signals: list) -> dict[str, numpy.ndarray]:
+    """Resolve the lane sets of the requirements into the sorted lane indices to gather, by variable.
+
+    Static ("ms") and derived variables are left out, as they are not read from SUMO.
+    """
+    lane_sets = {
+      INCOMING: numpy.unique(numpy.concatenate([numpy.zeros(0, dtype=numpy.int64)] + [ts.lanes_idx for ts in traffic_signals])),
+      OUTGOING: numpy.unique(numpy.concatenate([numpy.zeros(0, dtype=numpy.int64)] + [ts.out_lanes_idx for ts in traffic_signals])),
+      ALL: numpy.arange(len(self.lane_IDs), dtype=numpy.int64),
+    }
+    return {
+      key: numpy.unique(numpy.concatenate([lane_sets[lane_set] for lane_set in sorted(required_sets)]))
+      for key, required_sets in requirements.lanes.items()
+      if key != 'ms' and key not in DERIVED_LANE_VARIABLES
+    }
@@ -0,0 +1,105 @@
+"""Per-direction statistics of vehicle variables, with the direction of each vehicle resolved once."""
+from __future__ import annotations
+
+import numpy
+
+class DirectionStatistics:
+  """Maps each vehicle to a slot holding its direction index, when it departs, and frees the slot when it arrives.
+
+  Statistics over the vehicles of a step are then grouped NumPy reductions over slot-indexed arrays:
+  no string splitting nor per-direction lists at each step.
+  """
+
+  def __init__(self, flows: dict[str, str] = {}, capacity: int = 1024) -> None:
+    self.directions: list[str|None] = []
+    self.direction_index: dict[str|None, int] = {}
+    self.flow_direction: dict[str, int] = {}
+    self.slot_of: dict[str, int] = {}
+    self.free_slots: list[int] = []
+    self.slot_direction: numpy.ndarray = numpy.zeros(capacity, dtype=numpy.int64)
+    self.used: int = 0
+    self.reset(flows)
+
+  def reset(self, flows: dict[str, str]) -> None:
+    """Forget every vehicle, and take the flow ID -> direction map of the next episode."""
+    self.directions = []
+    self.direction_index = {}
+    self.flow_direction = {flow_ID: self._direction(direction) for flow_ID, direction in flows.items()}
+    self.slot_of = {}
+    self.free_slots = []
+    self.used = 0
+
+  def _direction(self, direction: str|None) -> int:
+    if direction not in self.direction_index:
+      self.direction_index[direction] = len(self.directions)
+      self.directions.append(direction)
+    return self.direction_index[direction]
+
+  def _assign(self, vehicle_ID: str) -> int:
+    if len(self.free_slots) > 0:
+      slot = self.free_slots.pop()
+    else:
+      if self.used == len(self.slot_direction):
+        self.slot_direction = numpy.concatenate([self.slot_direction, numpy.zeros(len(self.slot_direction), dtype=numpy.int64)])
+      slot = self.used
+      self.used += 1
+    # Vehicles of a flow are named <flow ID>.<index>
+    flow_ID = vehicle_ID.split('.')[0]
+    direction = self.flow_direction.get(flow_ID)
+    self.slot_direction[slot] = self._direction(None) if direction is None else direction
+    self.slot_of[vehicle_ID] = slot
+    return slot
+
+  def depart(self, vehicle_IDs) -> None:
+    for vehicle_ID in vehicle_IDs:
+      if vehicle_ID not in self.slot_of:
+        self._assign(vehicle_ID)
+
+  def arrive(self, vehicle_IDs) -> None:
+    for vehicle_ID in vehicle_IDs:
+      slot = self.slot_of.pop(vehicle_ID, None)
+      if slot is not None:
+        self.free_slots.append(slot)
+
+  def slots(self, vehicle_IDs) -> numpy.ndarray:
+    """Slots of the given vehicles, vehicles never seen departing (e.g. loaded with a saved state) get one now."""
+    slot_of = self.slot_of
+    return numpy.fromiter((slot_of[v] if v in slot_of else self._assign(v) for v in vehicle_IDs), dtype=numpy.int64, count=len(vehicle_IDs))
+
+  def statistics(self, vehicle_IDs: list[str], values: numpy.ndarray) -> tuple[dict, dict, dict]:
+    """Mean, median and std of values (one per vehicle) by direction, for the directions with at least one vehicle."""
+    names, means, medians, stds = self.statistics_arrays(vehicle_IDs, values)
+    return (
+      dict(zip(names, means.tolist())),
+      dict(zip(names, medians.tolist())),
+      dict(zip(names, stds.tolist())),
+    )
+
+  def statistics_arrays(self, vehicle_IDs: list[str], values: numpy.ndarray) -> tuple[list[str|None], numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+    """Same as statistics(), as the list of directions present and one array per statistic."""
+    if len(vehicle_IDs) == 0:
+      return [], numpy.zeros(0), numpy.zeros(0), numpy.zeros(0)
+    values = numpy.asarray(values, dtype=numpy.float64)
+    slots = self.slots(vehicle_IDs)  # May grow slot_direction
+    groups = self.slot_direction[slots]
+    num_groups = len(self.directions)
+    counts = numpy.bincount(groups, minlength=num_groups)
+    present = numpy.flatnonzero(counts)
+    means = numpy.bincount(groups, weights=values, minlength=num_groups)[present] / counts[present]
+    mean_of = numpy.zeros(num_groups)
+    mean_of[present] = means
+    stds = numpy.sqrt(numpy.bincount(groups, weights=(values - mean_of[groups]) ** 2, minlength=num_groups)[present] / counts[present])
+    # Sorting by group makes each group a contiguous segment, whose median comes from a partial sort
+    ordered = values[numpy.argsort(groups, kind='stable')]
+    offsets = numpy.concatenate([[0], numpy.cumsum(counts)])
+    medians = []
+    for group in present:
+      segment = ordered[offsets[group]:offsets[group + 1]]
+      half = len(segment) // 2
+      if len(segment) % 2 == 1:
+        medians.append(numpy.partition(segment, half)[half])
+      else:
+        partitioned = numpy.partition(segment, [half - 1, half])
+        medians.append((partitioned[half - 1] + partitioned[half]) / 2)
+    names = [self.directions[group] for group in present]
+    return names, means, numpy.array(medians, dtype=numpy.float64), stds
@@ -3,12 +3,14 @@ from __future__ import annotations
 
 import os
 import sys
+import hashlib
 import numpy
 from pathlib import Path
 from typing import Optional, Tuple, Union
 import sumo_rl.util.config
-import sumo_rl.models.flows
-from sumo_rl.environment.datastore import Datastore
+import sumo_rl.models.scenario
+from sumo_rl.environment.datastore import Datastore, Requirements, ALL
+from sumo_rl.environment.metrics import MetricsRecorder, MetricsSink, DirectionsSink, DIRECTIONS_DIR
 
 if "SUMO_HOME" in os.environ:
     tools = os.path.join(os.environ["SUMO_HOME"], "tools")
@@ -17,17 +19,101 @@ else:
     raise ImportError("Please declare the environment variable 'SUMO_HOME'")
 import gymnasium as gym
 import numpy as np
-import pandas as pd
 import sumolib
 import traci
 
 import sumo_rl.observations
 import sumo_rl.rewards
 from .traffic_signal import TrafficSignal
+from .scheduler import EventScheduler, YELLOW_END, DECISION
+from .directions import DirectionStatistics
+from .tracing import CallTracer, traced_connection, tracing_requested
+from .remote import LibsumoWorker, workers_requested
+from .surrogate import SurrogateNetwork, SurrogateSimulation
 
 
 LIBSUMO = "LIBSUMO_AS_TRACI" in os.environ
 
+# Lane variables gathered at each step, by Datastore key
+LANE_VARIABLES = {
+  'lsvn': traci.constants.LAST_STEP_VEHICLE_NUMBER,
+  'lsvl': traci.constants.LAST_STEP_LENGTH,
+  'lshn': traci.constants.LAST_STEP_VEHICLE_HALTING_NUMBER,
+  'lsms': traci.constants.LAST_STEP_MEAN_SPEED,
+  'lso': traci.constants.LAST_STEP_OCCUPANCY,
+  'lswt': traci.constants.VAR_WAITING_TIME,
+  'vehs': traci.constants.LAST_STEP_VEHICLE_ID_LIST,
+}
+
+# TraCI getters of lane variables, used when gathering without subscriptions
+LANE_GETTERS = {
+  'lsvn': 'getLastStepVehicleNumber',
+  'lsvl': 'getLastStepLength',
+  'lshn': 'getLastStepHaltingNumber',
+  'lsms': 'getLastStepMeanSpeed',
+  'lso': 'getLastStepOccupancy',
+  'lswt': 'getWaitingTime',
+  'vehs': 'getLastStepVehicleIDs',
+}
+
+# Simulation variables subscribed in fast-forward mode, by counter.
+# A simulationStep(target) spanning several seconds reports the vehicles of all of them, not only of the last one.
+SIMULATION_VARIABLES = {
+  'num_arrived_vehicles': traci.constants.VAR_ARRIVED_VEHICLES_NUMBER,
+  'num_departed_vehicles': traci.constants.VAR_DEPARTED_VEHICLES_NUMBER,
+  'num_teleported_vehicles': traci.constants.VAR_TELEPORT_ENDING_VEHICLES_NUMBER,
+}
+
+# Lane variables which add up over the lanes of an edge, the others are averages (see _gather_lanes_from_edges)
+EXTENSIVE_LANE_VARIABLES = {'lsvn', 'lshn', 'lswt'}
+
+# Simulation fidelities: SUMO microsim, or mesoscopic queues of vehicles per edge segment (--mesosim)
+FIDELITIES = ['micro', 'meso']
+
+# Vehicle variables gathered at each step, by Datastore key
+VEHICLE_VARIABLES = {
+  'awt': traci.constants.VAR_ACCUMULATED_WAITING_TIME,
+}
+
+# Meso has no accumulated waiting time (SUMO returns INVALID_DOUBLE_VALUE): 'awt' is the waiting time in the current queue instead
+MESO_VEHICLE_VARIABLES = {
+  'awt': traci.constants.VAR_WAITING_TIME,
+}
+
+# Column type of each metric
+METRICS_DTYPES = {
+  "step": numpy.float64,
+  "total_running": numpy.int64,
+  "total_backlogged": numpy.int64,
+  "total_stopped": numpy.int64,
+  "total_arrived": numpy.int64,
+  "total_departed": numpy.int64,
+  "total_teleported": numpy.int64,
+  "total_waiting_time": numpy.float64,
+  "mean_waiting_time": numpy.float64,
+  "total_accumulated_waiting_time": numpy.float64,
+  "mean_accumulated_waiting_time": numpy.float64,
+  "mean_speed": numpy.float64,
+  "total_reward": numpy.float64,
+}
+
+# Lane variables read by each metric, always on all lanes
+METRICS_REQUIREMENTS = {
+  "step": [],
+  "total_running": ['vehs'],
+  "total_backlogged": [],
+  "total_stopped": ['lshn'],
+  "total_arrived": [],
+  "total_departed": [],
+  "total_teleported": [],
+  "total_waiting_time": ['lswt'],
+  "mean_waiting_time": ['lswt', 'vehs'],
+  "total_accumulated_waiting_time": ['tawt'],
+  "mean_accumulated_waiting_time": ['tawt', 'vehs'],
+  "mean_speed": ['lsms'],
+  "total_reward": [],
+}
+
 class SumoEnvironment(gym.Env):
   """SUMO Environment for Traffic Signal Control.
 
@@ -62,6 +148,16 @@ class SumoEnvironment(gym.Env):
     sumo_warnings (bool): If true, it will print SUMO warnings.
     additional_sumo_cmd (str): Additional SUMO command line arguments.
     render_mode (str): Mode of rendering. Can be 'human' or 'rgb_array'. Default: None
+    use_subscriptions (bool): If true, lane and vehicle data is read back through TraCI subscriptions (one round-trip per step) instead of one call per variable. Default: True
+    metrics (List[str]): Metrics recorded at each step, a subset of METRICS_REQUIREMENTS keys. Only the data they need is gathered. Default: None (all of them)
+    persistent_connection (bool): If true, the SUMO process is kept alive for the whole run and each reset reloads the simulation with traci.load instead of starting a new process. Default: False
+    fast_forward (bool): If true, SUMO advances straight to the next scheduled signal event (or to the end of the step) with simulationStep(target), and the vehicle counters are read through a subscription, instead of stepping and polling each second. Default: False
+    trace_traci (bool): If true (or if SUMO_RL_TRACE_TRACI is set), every TraCI call is counted and timed by domain.method and caller, see SumoEnvironment.tracer. Default: False
+    libsumo_worker (bool): If true (or if SUMO_RL_LIBSUMO_WORKERS is set), the simulation runs with libsumo in a process of its own (see remote.py) instead of a SUMO process behind a socket, so that any number of environments can use libsumo in one run. The GUI keeps the socket. Default: False
+    skip_idle (bool): If true, skip_idle_steps lets the training and evaluation loops jump over the steps in which the network is empty and no vehicle is due to depart (by the departure windows of the route file), filling their metrics rows without simulating them. Default: False
+    fidelity (str): 'micro' simulates each vehicle on its lane, 'meso' runs SUMO with --mesosim (vehicles queue on edge segments, much faster on large networks). Meso has no lanes, so lane variables are read per edge and shared out among its lanes. Meso has no accumulated waiting time either, the waiting time of a vehicle in its current queue stands for it. See set_fidelity to switch between episodes. Default: 'micro'
+    surrogate (bool): If true, episodes run on a cell transmission model of the network and routes (see surrogate.py) instead of SUMO: much faster, approximate, without vehicle identities (no GUI, no advanced metrics). Default: False
+    warmup_seconds (int): Seconds simulated with the native signal programs before each episode starts. The resulting state is cached in .cache/warmup and loaded by later episodes with the same net, routes, SUMO command line (binary, seed and options) and warm-up length (never with a random seed). Default: 0 (no warm-up)
   """
 
   metadata = {
@@ -98,7 +194,17 @@ class SumoEnvironment(gym.Env):
     additional_sumo_cmd: Optional[str] = None,
     render_mode: Optional[str] = None,
     jobs: int = 1,
-    advanced_metrics: bool = False
+    advanced_metrics: bool = False,
+    use_subscriptions: bool = True,
+    metrics: Optional[list[str]] = None,
+    warmup_seconds: int = 0,
+    persistent_connection: bool = False,
+    fast_forward: bool = False,
+    trace_traci: bool = False,
+    libsumo_worker: bool = False,
+    surrogate: bool = False,
+    fidelity: str = "micro",
+    skip_idle: bool = False,
   ) -> None:
     """Initialize the environment."""
     assert render_mode is None or render_mode in self.metadata["render_modes"], "Invalid render mode."
@@ -118,7 +224,23 @@ class SumoEnvironment(gym.Env):
     assert max_green > min_green, "Max green time must be greater than min green time."
 
     self.begin_time = begin_time
+    self.num_seconds = num_seconds
     self.sim_max_time = begin_time + num_seconds
+    self.warmup_seconds = warmup_seconds
+    self.persistent_connection = persistent_connection
+    self.fast_forward = fast_forward
+    # Counts and times every TraCI call when set (see tracing.py), None keeps the bare connection
+    self.tracer: CallTracer|None = CallTracer() if (trace_traci or tracing_requested()) else None
+    self.libsumo_worker = libsumo_worker or workers_requested()
+    self._worker: LibsumoWorker|None = None
+    assert fidelity in FIDELITIES, "Invalid fidelity."
+    self.fidelity = fidelity
+    self.skip_idle = skip_idle
+    self.surrogate = surrogate
+    # Surrogate networks by route file, built at their first episode
+    self._surrogate_networks: dict[str|None, SurrogateNetwork] = {}
+    assert not (surrogate and (use_gui or render_mode is not None)), "The surrogate simulation has no GUI."
+    assert not (surrogate and advanced_metrics), "The surrogate simulation has no vehicle identities, hence no advanced metrics."
     self.delta_time = delta_time  # seconds on sumo at each step
     self.max_depart_delay = max_depart_delay  # Max wait time to insert a vehicle
     self.waiting_time_memory = waiting_time_memory  # Number of seconds to remember the waiting time of a vehicle (see https://sumo.dlr.de/pydoc/traci._vehicle.html#VehicleDomain-getAccumulatedWaitingTime)
@@ -137,24 +259,22 @@ class SumoEnvironment(gym.Env):
     self.label = str(SumoEnvironment.CONNECTION_LABEL)
     self.jobs = jobs
     self.advanced_metrics = advanced_metrics
+    self.use_subscriptions = use_subscriptions
+    self.metrics_columns: list[str] = list(METRICS_REQUIREMENTS.keys()) if metrics is None else list(metrics)
+    unknown = [metric for metric in self.metrics_columns if metric not in METRICS_REQUIREMENTS]
+    assert len(unknown) == 0, "Unknown metrics %s, choose among %s" % (unknown, list(METRICS_REQUIREMENTS.keys()))
     SumoEnvironment.CONNECTION_LABEL += 1
     self.sumo = None
+    # Binary and fidelity of the running SUMO process, traci.load can only reuse it for the same ones
+    self._sumo_connection_binary = None
 
-    if LIBSUMO:
-      traci.start([sumolib.checkBinary("sumo"), "-n", self._net])  # Start only to retrieve traffic light information
-      conn = traci
-    else:
-      traci.start([sumolib.checkBinary("sumo"), "-n", self._net], label=self.label)
-      conn = traci.getConnection(self.label)
-
-    self.ts_ids = list(conn.trafficlight.getIDList())
+    # Traffic lights and lanes come from the compiled network, no need to start SUMO until reset
+    self.scenario = sumo_rl.models.scenario.load_scenario(self._net, [self._route] if self._route is not None else [])
+    self.ts_ids = self.scenario.ts_ids
     self.observation_fn = observation_fn
     self.reward_fn = reward_fn
 
-    self._build_traffic_signals(conn)
-
-    self.sumo = conn
-    # conn.close()
+    self._build_traffic_signals(None)
 
     self.reward_range = (-float("inf"), float("inf"))
     self.episode = 0
@@ -163,22 +283,55 @@ class SumoEnvironment(gym.Env):
     # USIAMOLE
     assert len(self.ts_ids) == len(self.traffic_signals)
 
-    self.datastore = Datastore()
-    self.datastore.lanes = {lane_ID:{'ms': self.sumo.lane.getMaxSpeed(lane_ID)} for lane_ID in self.sumo.lane.getIDList()}
+    self.datastore = Datastore(self.scenario.lane_IDs, len(self.ts_ids))
+    self.datastore.ms[:] = self.scenario.lane_speeds
+    for index, ts in enumerate(self.traffic_signals.values()):
+      ts.index_lanes(self.datastore, index)
+    self.requirements = self.observation_fn.requirements().union(self.reward_fn.requirements()).union(self.metrics_requirements())
+    self.gather_plan = self.datastore.plan(self.requirements, list(self.traffic_signals.values()))
+    # Edge of each lane (by index), its position on the edge and the lanes of each edge, to gather by edge in meso
+    lane_edges = [lane_ID.rsplit('_', 1)[0] for lane_ID in self.scenario.lane_IDs]
+    self.edge_IDs: list[str] = list(dict.fromkeys(lane_edges))
+    edge_index = {edge_ID: idx for idx, edge_ID in enumerate(self.edge_IDs)}
+    self.lane_edges = numpy.array([edge_index[edge_ID] for edge_ID in lane_edges], dtype=numpy.int64)
+    self.lane_positions = numpy.array([int(lane_ID.rsplit('_', 1)[1]) for lane_ID in self.scenario.lane_IDs], dtype=numpy.int64)
+    self.edge_lane_counts = numpy.bincount(self.lane_edges, minlength=len(self.edge_IDs))
+    self.edge_plan = {key: numpy.unique(self.lane_edges[lanes_idx]) for key, lanes_idx in self.gather_plan.items()}
     self.observations: dict = {ts_id:[] for ts_id in self.ts_ids}
     self.rewards = {ts: 0 for ts in self.ts_ids}
     self.metrics = self.empty_metrics()
     self.flows: dict[str, str]
+    # Simulation clock, cached at each simulation step
+    self.sim_time: float = begin_time
+    self.scheduler = EventScheduler()
+    self.direction_statistics = DirectionStatistics()
+    # Per-direction statistics of the last metrics row (directions present, then one array per statistic), and where they are streamed
+    self.xdir: tuple[list, numpy.ndarray, numpy.ndarray, numpy.ndarray]|None = None
+    self.directions_sink: DirectionsSink|None = None
+    self.directions_summary: dict|None = None
+    # Last state string sent to each signal, and the states to send before the next simulation step, by signal index
+    self.sent_signal_states: list[str|None] = [None for _ in self.ts_ids]
+    self.pending_signal_states: dict[int, str] = {}
+    self.signal_commands_sent: int = 0
+    self.signal_commands_suppressed: int = 0
+    self.signals_by_index: list[TrafficSignal] = list(self.traffic_signals.values())
 
   def set_duration(self, num_seconds: int):
+    self.num_seconds = num_seconds
     self.sim_max_time = self.begin_time + num_seconds
 
+  def set_fidelity(self, fidelity: str):
+    """Fidelity of the next episodes, a change restarts SUMO at the next reset."""
+    assert fidelity in FIDELITIES, "Invalid fidelity."
+    self.fidelity = fidelity
+
   def set_route_file(self, route_file: str):
     self._route = route_file
-    self.flows = sumo_rl.models.flows.read_flows_from_routes_file(route_file)
+    self.scenario = sumo_rl.models.scenario.load_scenario(self._net, [route_file])
+    self.flows = self.scenario.flows_of(route_file)
 
   @staticmethod
-  def from_config(config: sumo_rl.util.config.Config, observation_fn: sumo_rl.observations.ObservationFunction, reward_fn: sumo_rl.rewards.RewardFunction, use_gui: bool = False, jobs: int = 1, advanced_metrics: bool = False) -> SumoEnvironment:
+  def from_config(config: sumo_rl.util.config.Config, observation_fn: sumo_rl.observations.ObservationFunction, reward_fn: sumo_rl.rewards.RewardFunction, use_gui: bool = False, jobs: int = 1, advanced_metrics: bool = False, use_subscriptions: bool = True, metrics: list[str]|None = None, persistent_connection: bool = False, fast_forward: bool = False, trace_traci: bool = False, libsumo_worker: bool = False, surrogate: bool = False, skip_idle: bool = False) -> SumoEnvironment:
     return SumoEnvironment(
       net_file=config.scenario.network,
       use_gui=use_gui,
@@ -191,7 +344,17 @@ class SumoEnvironment(gym.Env):
       fixed_ts=False,
       additional_sumo_cmd=" ".join(config.sumo.further_cmd_args),
       jobs=jobs,
-      advanced_metrics=advanced_metrics
+      advanced_metrics=advanced_metrics,
+      use_subscriptions=use_subscriptions,
+      metrics=metrics if metrics is not None else config.sumo.metrics,
+      warmup_seconds=config.sumo.warmup_seconds,
+      persistent_connection=persistent_connection,
+      fast_forward=fast_forward,
+      trace_traci=trace_traci,
+      libsumo_worker=libsumo_worker,
+      surrogate=surrogate,
+      fidelity=config.sumo.fidelity,
+      skip_idle=skip_idle,
     )
 
   def _build_traffic_signals(self, conn) -> None:
@@ -206,22 +369,23 @@ class SumoEnvironment(gym.Env):
         self.enforce_max_green,
         self.begin_time,
         conn,
+        self.scenario.signals[ts],
       )
       for ts in self.ts_ids
     }
 
-  def _start_simulation(self) -> None:
-    sumo_cmd = [
-      self._sumo_binary,
+  def _sumo_args(self) -> list[str]:
+    """Command line of the simulation, without the SUMO binary."""
+    sumo_args = [
       "-n",
       self._net,
     ]
     if self._route is not None:
-      sumo_cmd += [
+      sumo_args += [
         "-r",
         self._route,
       ]
-    sumo_cmd += [
+    sumo_args += [
       "--max-depart-delay",
       str(self.max_depart_delay),
       "--waiting-time-memory",
@@ -229,57 +393,116 @@ class SumoEnvironment(gym.Env):
       "--time-to-teleport",
       str(self.time_to_teleport),
     ]
-    sumo_cmd += [
+    sumo_args += [
       "--threads", str(self.jobs)
     ]
     if self.begin_time > 0:
-      sumo_cmd.append(f"-b {self.begin_time}")
+      sumo_args.append(f"-b {self.begin_time}")
     if self.sumo_seed == "random":
-      sumo_cmd.append("--random")
+      sumo_args.append("--random")
     else:
-      sumo_cmd.extend(["--seed", str(self.sumo_seed)])
+      sumo_args.extend(["--seed", str(self.sumo_seed)])
+    if self.fidelity == 'meso':
+      # Without junction control meso ignores the signals, which are all the agents act upon
+      sumo_args.extend(["--mesosim", "--meso-junction-control"])
     if not self.sumo_warnings:
-      sumo_cmd.append("--no-warnings")
+      sumo_args.append("--no-warnings")
     if self.additional_sumo_cmd is not None:
-      sumo_cmd.extend(self.additional_sumo_cmd.split())
+      sumo_args.extend(self.additional_sumo_cmd.split())
     if self.use_gui or self.render_mode is not None:
-      sumo_cmd.extend(["--start", "--quit-on-end"])
+      sumo_args.extend(["--start", "--quit-on-end"])
       if self.render_mode == "rgb_array":
-        sumo_cmd.extend(["--window-size", f"{self.virtual_display[0]},{self.virtual_display[1]}"])
-        from pyvirtualdisplay.smartdisplay import SmartDisplay
-
-        print("Creating a virtual display.")
-        self.disp = SmartDisplay(size=self.virtual_display)
-        self.disp.start()
-        print("Virtual display started.")
+        sumo_args.extend(["--window-size", f"{self.virtual_display[0]},{self.virtual_display[1]}"])
+    return sumo_args
 
-    if LIBSUMO:
+  def _start_simulation(self) -> None:
+    sumo_cmd = [self._sumo_binary] + self._sumo_args()
+    if self.render_mode == "rgb_array":
+      from pyvirtualdisplay.smartdisplay import SmartDisplay
+
+      print("Creating a virtual display.")
+      self.disp = SmartDisplay(size=self.virtual_display)
+      self.disp.start()
+      print("Virtual display started.")
+
+    if self.surrogate:
+      self.sumo = SurrogateSimulation(self._surrogate_network(), self.begin_time)
+    elif self.libsumo_worker and not (self.use_gui or self.render_mode is not None):
+      self._worker = LibsumoWorker(sumo_cmd)
+      self.sumo = self._worker
+    elif LIBSUMO:
       traci.start(sumo_cmd)
       self.sumo = traci
     else:
       traci.start(sumo_cmd, label=self.label)
       self.sumo = traci.getConnection(self.label)
+    if self.tracer is not None:
+      self.sumo = traced_connection(self.sumo, self.tracer)
+    self._sumo_connection_binary = (self._sumo_binary, self.fidelity)
 
     if self.use_gui or self.render_mode is not None:
       if "DEFAULT_VIEW" not in dir(traci.gui):  # traci.gui.DEFAULT_VIEW is not defined in libsumo
         traci.gui.DEFAULT_VIEW = "View #0"
       self.sumo.gui.setSchema(traci.gui.DEFAULT_VIEW, "real world")
 
+  def _surrogate_network(self) -> SurrogateNetwork:
+    network = self._surrogate_networks.get(self._route)
+    if network is None:
+      network = self._surrogate_networks[self._route] = SurrogateNetwork(self._net, self._route, self.scenario.lane_IDs, self.ts_ids)
+    return network
+
+  def _can_reload_simulation(self) -> bool:
+    return self.persistent_connection and not self.surrogate and self.sumo is not None and self._sumo_connection_binary == (self._sumo_binary, self.fidelity)
+
+  def _reload_simulation(self) -> None:
+    """Reload the simulation on the open connection with the current routes and seed, the SUMO process stays alive."""
+    self.sumo.load(self._sumo_args())
+
   def reset(self, seed: Optional[int] = None, **kwargs):
     """Reset the environment."""
     super().reset(seed=seed, **kwargs)
 
-    self.close()
+    reload = self._can_reload_simulation()
+    if not reload:
+      self.close()
+    self.close_metrics()
     self.save_csv(self.out_csv_name, self.episode)
     self.episode += 1
 
     if seed is not None:
       self.sumo_seed = seed
-    self._start_simulation()
-
+    if reload:
+      self._reload_simulation()
+    else:
+      self._start_simulation()
+    if self.warmup_seconds > 0:
+      self._warm_up()
+    if self.use_subscriptions:
+      self._subscribe_lanes()
+    # The clock comes along with each simulation step, as do the counters in fast-forward mode
+    variables = [traci.constants.VAR_TIME]
+    if self.fast_forward:
+      variables += list(SIMULATION_VARIABLES.values())
+    if self.advanced_metrics:
+      variables += [traci.constants.VAR_DEPARTED_VEHICLES_IDS, traci.constants.VAR_ARRIVED_VEHICLES_IDS]
+      self.direction_statistics.reset(getattr(self, 'flows', {}))
+    self.sumo.simulation.subscribe(variables)
+
+    # Episodes start after the warm-up, if any
+    start_time = self.sumo.simulation.getTime()
+    self.sim_time = start_time
+    self.sim_max_time = start_time + self.num_seconds
+    self.scheduler.clear()
+    self.sent_signal_states = [None for _ in self.ts_ids]
+    self.pending_signal_states = {}
+    self.signal_commands_sent = 0
+    self.signal_commands_suppressed = 0
     for ts_id in self.traffic_signals:
       self.traffic_signals[ts_id].sumo = self.sumo
-      self.traffic_signals[ts_id].reset(self.begin_time)
+      self.traffic_signals[ts_id].reset(start_time)
+      self.traffic_signals[ts_id].install_program()
+      self.scheduler.schedule(start_time, DECISION, self.traffic_signals[ts_id].index)
+    self.datastore.last_ts_waiting_time[:] = 0.0
 
     self.num_arrived_vehicles = 0
     self.num_departed_vehicles = 0
@@ -290,88 +513,258 @@ class SumoEnvironment(gym.Env):
 
     return self.sumo
 
-  def gather_data_from_sumo(self):
-    vehicles = set({})
-    for lane_ID in self.datastore.lanes.keys():
-      self.datastore.lanes[lane_ID]['lsvn'] = self.sumo.lane.getLastStepVehicleNumber(lane_ID)
-      self.datastore.lanes[lane_ID]['lsvl'] = self.sumo.lane.getLastStepLength(lane_ID)
-      self.datastore.lanes[lane_ID]['lshn'] = self.sumo.lane.getLastStepHaltingNumber(lane_ID)
-      self.datastore.lanes[lane_ID]['lsms'] = self.sumo.lane.getLastStepMeanSpeed(lane_ID)
-      self.datastore.lanes[lane_ID]['lso'] = self.sumo.lane.getLastStepOccupancy(lane_ID)
-      self.datastore.lanes[lane_ID]['lswt'] = self.sumo.lane.getWaitingTime(lane_ID)
-      self.datastore.lanes[lane_ID]['vehs'] = set(self.sumo.lane.getLastStepVehicleIDs(lane_ID))
-      vehicles |= self.datastore.lanes[lane_ID]['vehs']
+  def _warmup_state_path(self) -> str|None:
+    """Path of the cached warm-up state for the current net, routes, SUMO command line and warm-up length, None if it can't be cached."""
+    if self.sumo_seed == "random":
+      return None
+    key = hashlib.sha1()
+    for path in [self._net, self._route]:
+      if path is None:
+        key.update(b'-')
+        continue
+      stat = os.stat(path)
+      key.update(("%s:%s:%s" % (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)).encode())
+    # Every option of the command line (seed, begin, fidelity, teleports, ...) shapes the warmed-up state
+    key.update("\0".join([self._sumo_binary] + self._sumo_args() + [str(self.warmup_seconds)]).encode())
+    directory = os.path.join(".cache", "warmup")
+    if not os.path.exists(directory):
+      os.makedirs(directory)
+    return os.path.abspath(os.path.join(directory, key.hexdigest() + ".xml.gz"))
+
+  def _warm_up(self) -> None:
+    """Run the native signal programs for warmup_seconds, or load the state a previous warm-up saved."""
+    # A surrogate warm-up costs less than saving its state
+    path = None if self.surrogate else self._warmup_state_path()
+    if path is not None and os.path.exists(path):
+      self.sumo.simulation.loadState(path)
+      return
+    self.sumo.simulationStep(self.begin_time + self.warmup_seconds)
+    if path is not None:
+      self.sumo.simulation.saveState(path)
+      # A state loaded into a running simulation does not go on as the simulation that saved it, nor as one that just started
+      # (route files already read ahead, random number generators): restart and load it, as the episodes which find it cached
+      self._reload_simulation()
+      self.sumo.simulation.loadState(path)
+
+  def metrics_requirements(self) -> Requirements:
+    """Return the datastore variables read by the recorded metrics."""
+    requirements = Requirements()
+    for metric in self.metrics_columns:
+      for key in METRICS_REQUIREMENTS[metric]:
+        requirements.require(key, ALL)
+    if self.advanced_metrics:
+      requirements.require('vehs', ALL)
+      requirements.require_vehicles('awt')
+    return requirements
+
+  def _subscribe_lanes(self) -> None:
+    """Subscribe once per simulation to the planned lane variables, results come back along with each simulation step."""
+    if self.fidelity == 'meso':
+      self._subscribe_edges()
+      return
+    variables: dict[int, list[int]] = {}
+    for key, lanes_idx in self.gather_plan.items():
+      for idx in lanes_idx:
+        variables.setdefault(idx, []).append(LANE_VARIABLES[key])
+    for idx, lane_variables in variables.items():
+      self.sumo.lane.subscribe(self.datastore.lane_IDs[idx], lane_variables)
+
+  def _subscribe_edges(self) -> None:
+    variables: dict[int, list[int]] = {}
+    for key, edges_idx in self.edge_plan.items():
+      for idx in edges_idx:
+        variables.setdefault(idx, []).append(LANE_VARIABLES[key])
+    for idx, edge_variables in variables.items():
+      self.sumo.edge.subscribe(self.edge_IDs[idx], edge_variables)
+
+  def _gather_lanes_from_edges(self) -> None:
+    """Meso: vehicles queue on edge segments, not on lanes. Each lane gets its share of the values of its edge:
+    counts and waiting times are split evenly, speeds, occupancies and lengths are the same, vehicles are dealt out."""
+    datastore = self.datastore
+    results = self.sumo.edge.getAllSubscriptionResults() if self.use_subscriptions else None
+    for key, lanes_idx in self.gather_plan.items():
+      edges_idx = self.edge_plan[key]
+      if results is not None:
+        values = [results[self.edge_IDs[idx]][LANE_VARIABLES[key]] for idx in edges_idx]
+      else:
+        getter = getattr(self.sumo.edge, LANE_GETTERS[key])
+        values = [getter(self.edge_IDs[idx]) for idx in edges_idx]
+      if key == 'vehs':
+        edge_vehicles = {idx: sorted(vehicles) for idx, vehicles in zip(edges_idx.tolist(), values)}
+        for idx in lanes_idx:
+          edge = self.lane_edges[idx]
+          datastore.lane_vehicles[idx] = set(edge_vehicles[edge][self.lane_positions[idx]::self.edge_lane_counts[edge]])
+        continue
+      edge_values = numpy.zeros(len(self.edge_IDs), dtype=numpy.float64)
+      edge_values[edges_idx] = values
+      column = edge_values[self.lane_edges[lanes_idx]]
+      if key in EXTENSIVE_LANE_VARIABLES:
+        column = column / self.edge_lane_counts[self.lane_edges[lanes_idx]]
+      datastore.columns[key][lanes_idx] = column
+
+  def _gather_lanes_by_calls(self) -> None:
+    datastore = self.datastore
+    for key, lanes_idx in self.gather_plan.items():
+      getter = getattr(self.sumo.lane, LANE_GETTERS[key])
+      if key == 'vehs':
+        for idx in lanes_idx:
+          datastore.lane_vehicles[idx] = set(getter(datastore.lane_IDs[idx]))
+      else:
+        datastore.columns[key][lanes_idx] = [getter(datastore.lane_IDs[idx]) for idx in lanes_idx]
+
+  def _gather_lanes_by_subscriptions(self) -> None:
+    datastore = self.datastore
+    results = self.sumo.lane.getAllSubscriptionResults()
+    for key, lanes_idx in self.gather_plan.items():
+      variable = LANE_VARIABLES[key]
+      if key == 'vehs':
+        for idx in lanes_idx:
+          datastore.lane_vehicles[idx] = set(results[datastore.lane_IDs[idx]][variable])
+      else:
+        datastore.columns[key][lanes_idx] = [results[datastore.lane_IDs[idx]][variable] for idx in lanes_idx]
+
+  def _gather_vehicles_by_calls(self, vehicles: set[str]) -> None:
+    get_awt = self.sumo.vehicle.getWaitingTime if self.fidelity == 'meso' else self.sumo.vehicle.getAccumulatedWaitingTime
     self.datastore.vehicles = {
       vehicle_ID: {
-        'awt': self.sumo.vehicle.getAccumulatedWaitingTime(vehicle_ID),
+        'awt': get_awt(vehicle_ID),
       }
       for vehicle_ID in vehicles
     }
-    for lane_ID in self.datastore.lanes.keys():
-      awts = [self.datastore.vehicles[vehicle_ID]['awt'] for vehicle_ID in self.datastore.lanes[lane_ID]['vehs']]
-      self.datastore.lanes[lane_ID]['tawt'] = numpy.sum(awts)
-      self.datastore.lanes[lane_ID]['mawt'] = numpy.mean(awts)
-    if self.advanced_metrics:
-      flows = {}
-      for vehicle_ID in vehicles:
-        flow_id = vehicle_ID.split('.')[0]
-        flow_dir = self.flows.get(flow_id)
-        flows[flow_dir] = (flows.get(flow_dir) or []) + [self.datastore.vehicles[vehicle_ID]['awt']]
-      self.metrics['mean_awt_xdir'].append({flow_dir: float(numpy.mean(flow_data)) for flow_dir, flow_data in flows.items()})
-      self.metrics['median_awt_xdir'].append({flow_dir: float(numpy.median(flow_data)) for flow_dir, flow_data in flows.items()})
-      self.metrics['std_awt_xdir'].append({flow_dir: float(numpy.std(flow_data)) for flow_dir, flow_data in flows.items()})
+
+  def _gather_vehicles_by_subscriptions(self, vehicles: set[str]) -> None:
+    # Vehicles are subscribed the first time they are seen on a lane, SUMO drops the subscription when they leave
+    vehicle_variables = MESO_VEHICLE_VARIABLES if self.fidelity == 'meso' else VEHICLE_VARIABLES
+    variables = list(vehicle_variables.values())
+    results = self.sumo.vehicle.getAllSubscriptionResults()
+    for vehicle_ID in vehicles:
+      if vehicle_ID not in results:
+        self.sumo.vehicle.subscribe(vehicle_ID, variables)
+    results = self.sumo.vehicle.getAllSubscriptionResults()
+    self.datastore.vehicles = {
+      vehicle_ID: {key: results[vehicle_ID][variable] for key, variable in vehicle_variables.items()}
+      for vehicle_ID in vehicles
+    }
+
+  def _aggregate_waiting_times(self) -> None:
+    """Reduce per-vehicle accumulated waiting times into the per-lane `tawt` and `mawt` columns."""
+    datastore = self.datastore
+    counts = numpy.array([len(vehs) for vehs in datastore.lane_vehicles], dtype=numpy.int64)
+    awts = numpy.array([datastore.vehicles[vehicle_ID]['awt'] for vehs in datastore.lane_vehicles for vehicle_ID in vehs], dtype=numpy.float64)
+    tawt = numpy.bincount(numpy.repeat(numpy.arange(len(counts)), counts), weights=awts, minlength=len(counts))
+    datastore.tawt[:] = tawt
+    datastore.mawt[:] = numpy.divide(tawt, counts, out=numpy.full(len(counts), numpy.nan), where=(counts != 0))
+
+  def gather_data_from_sumo(self):
+    if self.surrogate:
+      self.sumo.gather(self.datastore, self.gather_plan)
+      return
+    if self.fidelity == 'meso':
+      self._gather_lanes_from_edges()
+    elif self.use_subscriptions:
+      self._gather_lanes_by_subscriptions()
+    else:
+      self._gather_lanes_by_calls()
+    vehicles = set({})
+    for vehs in self.datastore.lane_vehicles:
+      vehicles |= vehs
+    self.datastore.vehicle_IDs = vehicles
+    if 'awt' not in self.requirements.vehicles:
+      return
+    if self.use_subscriptions:
+      self._gather_vehicles_by_subscriptions(vehicles)
+    else:
+      self._gather_vehicles_by_calls(vehicles)
+    self._aggregate_waiting_times()
 
   def compute_observations(self):
     self.datastore.observation_cache = {}
-    for ts_ID, ts in self.traffic_signals.items():
-      self.observations[ts_ID] = self.observation_fn(self.datastore, ts)
+    signals = list(self.traffic_signals.values())
+    self.observation_matrix, self.observation_sizes = self.observation_fn.batch(self.datastore, signals)
+    for ts, observation in zip(signals, self.observation_fn.unbatch(self.observation_matrix, self.observation_sizes)):
+      self.observations[ts.id] = observation
 
   def compute_rewards(self):
     self.datastore.reward_cache = {}
-    for ts_ID, ts in self.traffic_signals.items():
-      self.rewards[ts_ID] = self.reward_fn(self.datastore, ts)
-
-  def empty_metrics(self) -> dict:
-    obj = {
-      "step": [],
-      "total_running": [],
-      "total_backlogged": [],
-      "total_stopped": [],
-      "total_arrived": [],
-      "total_departed": [],
-      "total_teleported": [],
-      "total_waiting_time": [],
-      "mean_waiting_time": [],
-      "total_accumulated_waiting_time": [],
-      "mean_accumulated_waiting_time": [],
-      "mean_speed": [],
-      "total_reward": [],
-    }
+    signals = list(self.traffic_signals.values())
+    self.reward_vector = self.reward_fn.batch(self.datastore, signals)
+    for ts, reward in zip(signals, self.reward_vector.tolist()):
+      self.rewards[ts.id] = reward
+
+  def empty_metrics(self) -> MetricsRecorder:
+    columns = list(self.metrics_columns)
+    capacity = self.num_seconds // self.delta_time + 1
+    return MetricsRecorder({column: METRICS_DTYPES[column] for column in columns}, capacity)
+
+  def stream_metrics(self, path: str, csv_path: str|None = None, chunk_size: int = 4096) -> None:
+    """Stream the metrics of the current episode to the column files in path, every chunk_size rows.
+
+    Call it after reset, the sink is closed (and the CSV exported, if csv_path is given) by close_metrics or the next reset.
+    With advanced metrics, per-direction statistics are streamed by a DirectionsSink into path/xdir.
+    """
+    self.metrics.stream(MetricsSink(path, self.metrics.dtypes, csv_path), chunk_size)
     if self.advanced_metrics:
-      obj["mean_awt_xdir"] = []
-      obj["median_awt_xdir"] = []
-      obj["std_awt_xdir"] = []
-    return obj
+      self.directions_sink = DirectionsSink(os.path.join(path, DIRECTIONS_DIR))
+
+  def close_metrics(self) -> None:
+    """Write the remaining rows of the current episode."""
+    self.metrics.close()
+    if self.directions_sink is not None:
+      self.directions_summary = self.directions_sink.close()
+      self.directions_sink = None
+
+  def _compute_metric(self, metric: str):
+    if metric == "step":
+      return self.sim_step
+    if metric == "total_running":
+      return len(self.datastore.vehicle_IDs)
+    if metric == "total_backlogged":
+      return len(self.sumo.simulation.getPendingVehicles())
+    if metric == "total_stopped":
+      return numpy.sum(self.datastore.lshn)
+    if metric == "total_arrived":
+      return self.num_arrived_vehicles
+    if metric == "total_departed":
+      return self.num_departed_vehicles
+    if metric == "total_teleported":
+      return self.num_teleported_vehicles
+    if metric == "total_waiting_time":
+      return numpy.sum(self.datastore.lswt)
+    if metric == "mean_waiting_time":
+      if len(self.datastore.vehicle_IDs) == 0:
+        return numpy.nan
+      return numpy.sum(self.datastore.lswt) / len(self.datastore.vehicle_IDs)
+    if metric == "total_accumulated_waiting_time":
+      return numpy.sum(self.datastore.tawt)
+    if metric == "mean_accumulated_waiting_time":
+      if len(self.datastore.vehicle_IDs) == 0:
+        return numpy.nan
+      return numpy.sum(self.datastore.tawt) / len(self.datastore.vehicle_IDs)
+    if metric == "mean_speed":
+      return numpy.mean(self.datastore.lsms)
+    if metric == "total_reward":
+      return numpy.sum(list(self.rewards.values()))
+    raise ValueError(metric)
+
+  def _compute_awt_xdir(self) -> tuple[list, numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+    vehicle_IDs = list(self.datastore.vehicle_IDs)
+    vehicles = self.datastore.vehicles
+    awts = numpy.fromiter((vehicles[vehicle_ID]['awt'] for vehicle_ID in vehicle_IDs), dtype=numpy.float64, count=len(vehicle_IDs))
+    return self.direction_statistics.statistics_arrays(vehicle_IDs, awts)
 
   def compute_metrics(self):
-    self.metrics["step"].append(self.sim_step)
-    self.metrics["total_running"].append(len(self.datastore.vehicles))
-    self.metrics["total_backlogged"].append(len(self.sumo.simulation.getPendingVehicles()))
-    self.metrics["total_stopped"].append(numpy.sum([lane['lshn'] for lane in self.datastore.lanes.values()]))
-    self.metrics["total_arrived"].append(self.num_arrived_vehicles)
-    self.metrics["total_departed"].append(self.num_departed_vehicles)
-    self.metrics["total_teleported"].append(self.num_teleported_vehicles)
-    self.metrics["total_waiting_time"].append(numpy.sum([lane['lswt'] for lane in self.datastore.lanes.values()]))
-    self.metrics["mean_waiting_time"].append(self.metrics["total_waiting_time"][-1] / self.metrics["total_running"][-1])
-    self.metrics["total_accumulated_waiting_time"].append(numpy.sum([lane['tawt'] for lane in self.datastore.lanes.values()]))
-    self.metrics["mean_accumulated_waiting_time"].append(self.metrics["total_accumulated_waiting_time"][-1] / self.metrics["total_running"][-1])
-    self.metrics["mean_speed"].append(numpy.mean([lane['lsms'] for lane in self.datastore.lanes.values()]))
-    self.metrics["total_reward"].append(numpy.sum(list(self.rewards.values())))
+    row = {metric: self._compute_metric(metric) for metric in self.metrics_columns}
+    self.metrics.append(row)
+    if self.advanced_metrics:
+      self.xdir = self._compute_awt_xdir()
+      if self.directions_sink is not None:
+        directions, means, medians, stds = self.xdir
+        self.directions_sink.write(self.metrics.length - 1, directions, [means, medians, stds])
 
   @property
   def sim_step(self) -> float:
-    """Return current simulation second on SUMO."""
-    return self.sumo.simulation.getTime()
+    """Return current simulation second on SUMO, as of the last simulation step (no TraCI call)."""
+    return self.sim_time
 
   def done(self) -> bool:
     return self.sim_step >= self.sim_max_time
@@ -384,19 +777,89 @@ class SumoEnvironment(gym.Env):
         If single_agent is True, action is an int, otherwise it expects a dict with keys corresponding to traffic signal ids.
     """
     self._apply_actions(action)
-    for _ in range(self.delta_time):
-      self._sumo_step()
-      for ts in self.ts_ids:
-        self.traffic_signals[ts].update()
+    self._advance_until(self.sim_time + self.delta_time)
+
+  def skip_idle_steps(self) -> int:
+    """Jump over the steps before the next departure if the network is empty and nothing waits to depart, returns how many.
+
+    Nothing changes in an idle network, so each skipped step gets a copy of the metrics row of the jump's end.
+    Signals hold their phase meanwhile: yellows end, decisions are postponed to the end of the jump.
+    Observations and rewards are computed at the end of the jump, callers observe them again before acting.
+    """
+    if not self.skip_idle or self._route is None:
+      return 0
+    # getMinExpectedNumber would also count the flows still to begin, the departure windows tell when they do
+    if self.sumo.vehicle.getIDCount() > 0 or len(self.sumo.simulation.getPendingVehicles()) > 0:
+      return 0
+    next_departure = self.scenario.next_departure(self._route, self.sim_time)
+    # Vehicles depart within the step ending at their departure time, steps must end before it
+    horizon = self.sim_max_time if next_departure is None else min(self.sim_max_time, next_departure - 1)
+    steps = int((horizon - self.sim_time) // self.delta_time)
+    if steps < 1:
+      return 0
+    start = self.sim_time
+    end = start + steps * self.delta_time
+    self._flush_signal_states()
+    self.sumo.simulationStep(end)
+    self._read_simulation_results(self.sumo.simulation.getSubscriptionResults())
+    for _, event, index in self.scheduler.pop_due(end):
+      if event == YELLOW_END:
+        self.signals_by_index[index].update()
+    # The decisions due meanwhile were popped above: signals act at the end of the jump, on the next step
+    for ts in self.signals_by_index:
+      if ts.next_action_time <= end:
+        ts.next_action_time = end
+    self.gather_data_from_sumo()
+    self.compute_observations()
+    self.compute_rewards()
+    self._record_idle_rows([start + step * self.delta_time for step in range(1, steps + 1)])
+    return steps
+
+  def _record_idle_rows(self, times: list[float]) -> None:
+    row = {metric: self._compute_metric(metric) for metric in self.metrics_columns}
+    if self.advanced_metrics:
+      self.xdir = self._compute_awt_xdir()
+    for time in times:
+      if 'step' in row:
+        row['step'] = time
+      self.metrics.append(row)
+      if self.advanced_metrics and self.directions_sink is not None:
+        directions, means, medians, stds = self.xdir
+        self.directions_sink.write(self.metrics.length - 1, directions, [means, medians, stds])
+
+  def _advance_until(self, end: float) -> bool:
+    """Advance the simulation to end, firing the signal events met on the way. Returns True if a signal has to decide at end."""
+    # Events due by now (the decision at reset or after an idle skip) were already met: drop them so fast forward aims at the next future one
+    self._fire_events()
+    decision = False
+    while self.sim_time < end:
+      if self.fast_forward:
+        next_time = self.scheduler.next_time()
+        self._sumo_step_until(end if next_time is None else min(end, next_time))
+      else:
+        self._sumo_step()
+      decision = self._fire_events() or decision
+    return decision
+
+  def _fire_events(self) -> bool:
+    """Handle the signal events due by now, only the signals concerned are touched. Returns True if a signal has to decide."""
+    decision = False
+    for time, event, index in self.scheduler.pop_due(self.sim_time):
+      ts = self.signals_by_index[index]
+      if event == YELLOW_END:
+        ts.update()
+      elif event == DECISION and ts.next_action_time == time:
+        decision = True
+    return decision
 
   def _run_steps(self):
-    time_to_act = False
-    while not time_to_act:
-      self._sumo_step()
-      for ts in self.ts_ids:
-        self.traffic_signals[ts].update()
-        if self.traffic_signals[ts].time_to_act:
-          time_to_act = True
+    """Advance the simulation until some signal has to decide, each signal deciding on its own delta_time."""
+    while True:
+      next_time = self.scheduler.next_time()
+      if next_time is None or next_time <= self.sim_time:
+        next_time = self.sim_time + 1
+      if self._advance_until(next_time):
+        return
 
   def _apply_actions(self, actions):
     """Set the next green phase for the traffic signals.
@@ -409,12 +872,55 @@ class SumoEnvironment(gym.Env):
       if self.traffic_signals[ts].time_to_act:
         self.traffic_signals[ts].set_next_phase(action)
 
+  def set_signal_state(self, index: int, state: str) -> None:
+    """Queue the red-yellow-green state of a signal, sent before the next simulation step only if it differs from the state SUMO has."""
+    self.pending_signal_states[index] = state
+
+  def signal_state_sent(self, index: int, state: str) -> None:
+    """Record a state sent to SUMO directly (e.g. when a program is installed)."""
+    self.sent_signal_states[index] = state
+    self.pending_signal_states.pop(index, None)
+
+  def _flush_signal_states(self) -> None:
+    """Send the queued signal states which change something, in one pass."""
+    if len(self.pending_signal_states) == 0:
+      return
+    for index, state in self.pending_signal_states.items():
+      if self.sent_signal_states[index] == state:
+        self.signal_commands_suppressed += 1
+        continue
+      self.sumo.trafficlight.setRedYellowGreenState(self.ts_ids[index], state)
+      self.sent_signal_states[index] = state
+      self.signal_commands_sent += 1
+    self.pending_signal_states = {}
+
+  @property
+  def signal_command_stats(self) -> dict[str, int]:
+    """Signal state commands sent to SUMO and suppressed as no-ops, since the last reset."""
+    return {'sent': self.signal_commands_sent, 'suppressed': self.signal_commands_suppressed}
+
   def _sumo_step(self):
+    self._flush_signal_states()
     self.sumo.simulationStep()
+    self._read_simulation_results(self.sumo.simulation.getSubscriptionResults())
     self.num_arrived_vehicles += self.sumo.simulation.getArrivedNumber()
     self.num_departed_vehicles += self.sumo.simulation.getDepartedNumber()
     self.num_teleported_vehicles += self.sumo.simulation.getEndingTeleportNumber()
 
+  def _sumo_step_until(self, target: float):
+    self._flush_signal_states()
+    self.sumo.simulationStep(target)
+    results = self.sumo.simulation.getSubscriptionResults()
+    self._read_simulation_results(results)
+    for counter, variable in SIMULATION_VARIABLES.items():
+      setattr(self, counter, getattr(self, counter) + results[variable])
+
+  def _read_simulation_results(self, results: dict) -> None:
+    self.sim_time = results[traci.constants.VAR_TIME]
+    if self.advanced_metrics:
+      self.direction_statistics.depart(results[traci.constants.VAR_DEPARTED_VEHICLES_IDS])
+      self.direction_statistics.arrive(results[traci.constants.VAR_ARRIVED_VEHICLES_IDS])
+
   def _get_system_info(self) -> dict:
     vehicles: list[str] = self.sumo.vehicle.getIDList()
     speeds: list[float] = [self.sumo.vehicle.getSpeed(vehicle) for vehicle in vehicles]
@@ -453,9 +959,15 @@ class SumoEnvironment(gym.Env):
     if self.sumo is None:
       return
 
-    if not LIBSUMO:
-      traci.switch(self.label)
-    traci.close()
+    if self._worker is not None:
+      self._worker.close()
+      self._worker = None
+    elif self.surrogate:
+      self.sumo.close()
+    else:
+      if not LIBSUMO:
+        traci.switch(self.label)
+      traci.close()
 
     if self.disp is not None:
       self.disp.stop()
@@ -475,6 +987,6 @@ class SumoEnvironment(gym.Env):
       episode (int): Episode number to be appended to the output file name.
     """
     if out_csv_name is not None:
-      df = pd.DataFrame(self.metrics)
+      df = self.metrics.to_dataframe()
       Path(Path(out_csv_name).parent).mkdir(parents=True, exist_ok=True)
       df.to_csv(out_csv_name + f"_conn{self.label}_ep{episode}" + ".csv", index=False)
@@ -0,0 +1,348 @@
+"""Per-step metrics recorded into preallocated typed columns, and streamed to disk in chunks."""
+from __future__ import annotations
+
+import collections.abc
+import os
+import queue
+import threading
+import time
+import typing
+import numpy
+import pandas
+from sumo_rl.models.serde import GenericFile
+
+# Suffix of the directory holding the column files of an episode, next to <episode>.csv
+COLUMNS_SUFFIX = '.columns'
+METADATA_FILE = 'meta.yml'
+
+def _column_file(path: str, key: str, dtype: typing.Any) -> str:
+  """Numerical columns are raw binary files, object columns are text files with one value (its str()) per line."""
+  if numpy.dtype(dtype) == numpy.dtype(object):
+    return os.path.join(path, key + '.txt')
+  return os.path.join(path, key + '.bin')
+
+class MetricsSink:
+  """Appends chunks of metrics rows to one file per column, from a background thread.
+
+  Rows written before a crash can still be read back with read_columns().
+  If csv_path is given, closing the sink also exports the whole episode as CSV.
+  The queue is bounded: when the writer lags behind, the caller waits, as no row can be dropped.
+  An error of the writer thread is raised again by the next write() or by close().
+  """
+
+  def __init__(self, path: str, dtypes: dict[str, typing.Any], csv_path: str|None = None, maxsize: int = 16) -> None:
+    self.path: str = path
+    self.dtypes: dict[str, typing.Any] = dict(dtypes)
+    self.csv_path: str|None = csv_path
+    self.rows: int = 0
+    # Written by the writer thread only
+    self.error: BaseException|None = None
+    os.makedirs(self.path, exist_ok=True)
+    for key, dtype in self.dtypes.items():
+      open(_column_file(self.path, key, dtype), mode='wb').close()
+    self._write_metadata(complete=False)
+    self.queue: queue.Queue = queue.Queue(maxsize=max(1, maxsize))
+    self.thread = threading.Thread(target=self._run, daemon=True)
+    self.thread.start()
+
+  def _write_metadata(self, complete: bool) -> None:
+    GenericFile({
+      'columns': {key: numpy.dtype(dtype).str for key, dtype in self.dtypes.items()},
+      # YAML sorts the keys of columns
+      'order': list(self.dtypes),
+      'rows': self.rows,
+      'complete': complete,
+    }).to_yaml_file(os.path.join(self.path, METADATA_FILE))
+
+  def write(self, chunk: dict[str, numpy.ndarray]) -> None:
+    """Queue a chunk (one array per column, all of the same length), waits only if the queue is full."""
+    if self.error is not None:
+      raise self.error
+    self.queue.put(chunk)
+
+  def _run(self) -> None:
+    while True:
+      chunk = self.queue.get()
+      if chunk is None:
+        break
+      # After an error chunks are only drained, so that callers waiting on a full queue get to see it
+      if self.error is None:
+        try:
+          self._write_chunk(chunk)
+        except BaseException as error:
+          self.error = error
+
+  def _write_chunk(self, chunk: dict[str, numpy.ndarray]) -> None:
+    for key, dtype in self.dtypes.items():
+      values = chunk[key]
+      if numpy.dtype(dtype) == numpy.dtype(object):
+        with open(_column_file(self.path, key, dtype), mode='a', encoding='utf-8') as file:
+          file.writelines(str(value) + '\n' for value in values)
+      else:
+        with open(_column_file(self.path, key, dtype), mode='ab') as file:
+          file.write(numpy.ascontiguousarray(values, dtype=dtype).tobytes())
+    self.rows += len(next(iter(chunk.values()), []))
+
+  def close(self) -> None:
+    """Wait for queued chunks to be written, then mark the episode complete."""
+    self.queue.put(None)
+    self.thread.join()
+    if self.error is not None:
+      raise self.error
+    self._write_metadata(complete=True)
+    if self.csv_path is not None:
+      read_columns(self.path).to_csv(self.csv_path, index=False)
+
+def read_columns(path: str) -> pandas.DataFrame:
+  """Read back the column files written by a MetricsSink, even if the episode was not completed."""
+  metadata = GenericFile.from_yaml_file(os.path.join(path, METADATA_FILE)).to_dict()
+  columns = {}
+  for key in metadata.get('order', metadata['columns']):
+    dtype = numpy.dtype(metadata['columns'][key])
+    if dtype == numpy.dtype(object):
+      with open(_column_file(path, key, dtype), mode='r', encoding='utf-8') as file:
+        columns[key] = numpy.array(file.read().splitlines(), dtype=object)
+    else:
+      columns[key] = numpy.fromfile(_column_file(path, key, dtype), dtype=dtype)
+  # An interrupted write may leave some columns a chunk ahead of others
+  rows = min([len(column) for column in columns.values()], default=0)
+  return pandas.DataFrame({key: column[:rows] for key, column in columns.items()}, copy=False)
+
+def identify_episodes(metrics_dir: str) -> list[int]:
+  """Episodes with metrics in metrics_dir, either as <episode>.csv or as <episode>.columns."""
+  episodes = set({})
+  for file in os.listdir(metrics_dir):
+    if file.endswith('.csv') or file.endswith(COLUMNS_SUFFIX):
+      episodes.add(int(file.split('.')[0]))
+  return sorted(episodes)
+
+def read_metrics(metrics_dir: str, episode: int) -> pandas.DataFrame:
+  """Metrics of an episode, preferring the column files over the CSV export."""
+  columns_path = os.path.join(metrics_dir, '%s%s' % (episode, COLUMNS_SUFFIX))
+  if os.path.isdir(columns_path):
+    return read_columns(columns_path)
+  return pandas.read_csv(os.path.join(metrics_dir, '%s.csv' % episode))
+
+# Directory of the per-direction statistics of an episode, inside its column files directory
+DIRECTIONS_DIR = 'xdir'
+DIRECTION_STATISTICS = ['mean_awt_xdir', 'median_awt_xdir', 'std_awt_xdir']
+
+class DirectionsSink:
+  """Writes per-direction statistics (one value per direction present, per metrics row) from a background thread.
+
+  Each (statistic, direction) pair is a float64 column file aligned with the metrics rows, NaN where the direction had no vehicle.
+  The queue is bounded: when the writer lags behind, rows are dropped (drop=True) or the caller waits (drop=False).
+  An error of the writer thread is raised again by the next write() or by close().
+  """
+
+  def __init__(self, path: str, statistics: list[str] = DIRECTION_STATISTICS, maxsize: int = 1024, batch_size: int = 256, drop: bool = True) -> None:
+    self.path: str = path
+    self.statistics: list[str] = list(statistics)
+    self.batch_size: int = max(1, batch_size)
+    self.drop: bool = drop
+    # Written by the caller only
+    self.enqueued: int = 0
+    self.dropped: int = 0
+    self.blocked_seconds: float = 0.0
+    # Written by the writer thread only
+    self.directions: dict[str|None, int] = {}
+    self.written: dict[tuple[str, int], int] = {}
+    self.rows: int = 0
+    self.error: BaseException|None = None
+    os.makedirs(self.path, exist_ok=True)
+    self._write_metadata(complete=False)
+    self.queue: queue.Queue = queue.Queue(maxsize=max(1, maxsize))
+    self.thread = threading.Thread(target=self._run, daemon=True)
+    self.thread.start()
+
+  def write(self, row: int, directions: list[str|None], values: list[numpy.ndarray]) -> bool:
+    """Queue the statistics of a metrics row: one array per statistic, one value per direction. Returns False if the row was dropped."""
+    if self.error is not None:
+      raise self.error
+    item = (row, directions, values)
+    if self.drop:
+      try:
+        self.queue.put_nowait(item)
+      except queue.Full:
+        self.dropped += 1
+        return False
+    else:
+      try:
+        self.queue.put_nowait(item)
+      except queue.Full:
+        start = time.perf_counter()
+        self.queue.put(item)
+        self.blocked_seconds += time.perf_counter() - start
+    self.enqueued += 1
+    return True
+
+  def _file(self, statistic: str, direction: int) -> str:
+    return os.path.join(self.path, '%s.%s.bin' % (statistic, direction))
+
+  def _write_metadata(self, complete: bool) -> None:
+    GenericFile({
+      'statistics': self.statistics,
+      'directions': {index: direction for direction, index in self.directions.items()},
+      'rows': self.rows,
+      'complete': complete,
+    }).to_yaml_file(os.path.join(self.path, METADATA_FILE))
+
+  def _run(self) -> None:
+    batch = []
+    while True:
+      item = self.queue.get()
+      if item is not None:
+        batch.append(item)
+      if item is None or len(batch) >= self.batch_size or self.queue.empty():
+        # After an error rows are only drained, so that callers waiting on a full queue get to see it
+        if self.error is None:
+          try:
+            self._write_batch(batch)
+          except BaseException as error:
+            self.error = error
+        batch = []
+      if item is None:
+        break
+
+  def _write_batch(self, batch: list) -> None:
+    if len(batch) == 0:
+      return
+    columns: dict[tuple[str, int], tuple[list[int], list[float]]] = {}
+    for row, directions, values in batch:
+      for position, direction in enumerate(directions):
+        if direction not in self.directions:
+          self.directions[direction] = len(self.directions)
+        for statistic, statistic_values in zip(self.statistics, values):
+          rows, column = columns.setdefault((statistic, self.directions[direction]), ([], []))
+          rows.append(row)
+          column.append(statistic_values[position])
+      self.rows = max(self.rows, row + 1)
+    for key, (rows, column) in columns.items():
+      self._append(key, numpy.array(rows, dtype=numpy.int64), numpy.array(column, dtype=numpy.float64), self.rows)
+
+  def _append(self, key: tuple[str, int], rows: numpy.ndarray, values: numpy.ndarray, end: int) -> None:
+    """Write the values at their rows, NaN from the end of the file up to end."""
+    start = self.written.get(key, 0)
+    if end <= start:
+      return
+    block = numpy.full(end - start, numpy.nan, dtype=numpy.float64)
+    block[rows - start] = values
+    with open(self._file(*key), mode='ab') as file:
+      file.write(block.tobytes())
+    self.written[key] = end
+
+  def close(self) -> dict:
+    """Wait for the queued rows to be written, pad every column to the same length, and return the summary of the episode."""
+    self.queue.put(None)
+    self.thread.join()
+    if self.error is not None:
+      raise self.error
+    for statistic in self.statistics:
+      for index in self.directions.values():
+        self._append((statistic, index), numpy.zeros(0, dtype=numpy.int64), numpy.zeros(0), self.rows)
+    self._write_metadata(complete=True)
+    return {
+      'rows': self.rows,
+      'enqueued': self.enqueued,
+      'dropped': self.dropped,
+      'blocked_seconds': self.blocked_seconds,
+    }
+
+def read_directions(path: str) -> dict[str, dict[str|None, numpy.ndarray]]:
+  """Read back the files written by a DirectionsSink: statistic -> direction -> values by metrics row (NaN when absent)."""
+  metadata = GenericFile.from_yaml_file(os.path.join(path, METADATA_FILE)).to_dict()
+  result: dict[str, dict[str|None, numpy.ndarray]] = {}
+  for statistic in metadata['statistics']:
+    result[statistic] = {}
+    for index, direction in (metadata['directions'] or {}).items():
+      values = numpy.fromfile(os.path.join(path, '%s.%s.bin' % (statistic, index)), dtype=numpy.float64)
+      result[statistic][direction] = numpy.pad(values, (0, max(0, metadata['rows'] - len(values))), constant_values=numpy.nan)
+  return result
+
+def read_episode_directions(metrics_dir: str, episode: int) -> dict[str, dict[str|None, numpy.ndarray]]|None:
+  """Per-direction statistics of an episode, None if they were not recorded as files (older runs keep them in the metrics)."""
+  path = os.path.join(metrics_dir, '%s%s' % (episode, COLUMNS_SUFFIX), DIRECTIONS_DIR)
+  if not os.path.isdir(path):
+    return None
+  return read_directions(path)
+
+def direction_records(values: dict[str|None, numpy.ndarray]) -> list[dict[str, float]]:
+  """One {direction: value} dict per metrics row, with the directions present in that row, like the former xdir metric columns."""
+  rows = max([len(column) for column in values.values()], default=0)
+  records: list[dict[str, float]] = [{} for _ in range(rows)]
+  for direction, column in values.items():
+    for row in numpy.flatnonzero(~numpy.isnan(column)):
+      records[row][str(direction)] = float(column[row])
+  return records
+
+class MetricsRecorder(collections.abc.Mapping):
+  """Append-only table of per-step metrics, one preallocated NumPy column per metric.
+
+  Appending a row is O(1) (amortized, columns double when full), reading a metric gives a view of the recorded rows.
+  """
+
+  def __init__(self, dtypes: dict[str, typing.Any], capacity: int = 1024) -> None:
+    self.dtypes: dict[str, typing.Any] = dict(dtypes)
+    self.capacity: int = max(1, int(capacity))
+    self.length: int = 0
+    self.columns: dict[str, numpy.ndarray] = {key: numpy.empty(self.capacity, dtype=dtype) for key, dtype in self.dtypes.items()}
+    self.sink: MetricsSink|None = None
+    self.chunk_size: int = 0
+    self.flushed: int = 0
+
+  def stream(self, sink: MetricsSink, chunk_size: int = 4096) -> None:
+    """Hand every chunk_size recorded rows over to sink, rows stay readable in memory as well."""
+    self.sink = sink
+    self.chunk_size = max(1, chunk_size)
+    self.flushed = 0
+    if self.length >= self.chunk_size:
+      self.flush()
+
+  def append(self, row: dict[str, typing.Any]) -> None:
+    """Record a row, which must have a value for every column."""
+    if self.length == self.capacity:
+      self._grow()
+    for key, column in self.columns.items():
+      column[self.length] = row[key]
+    self.length += 1
+    if self.sink is not None and self.length - self.flushed >= self.chunk_size:
+      self.flush()
+
+  def flush(self) -> None:
+    """Send the rows recorded since the last flush to the sink."""
+    if self.sink is None or self.flushed == self.length:
+      return
+    self.sink.write({key: column[self.flushed:self.length].copy() for key, column in self.columns.items()})
+    self.flushed = self.length
+
+  def close(self) -> None:
+    """Flush the remaining rows and close the sink, if any."""
+    if self.sink is None:
+      return
+    self.flush()
+    self.sink.close()
+    self.sink = None
+
+  def _grow(self) -> None:
+    self.capacity *= 2
+    for key, column in self.columns.items():
+      grown = numpy.empty(self.capacity, dtype=column.dtype)
+      grown[:self.length] = column[:self.length]
+      self.columns[key] = grown
+
+  def clear(self) -> None:
+    self.length = 0
+    self.flushed = 0
+
+  def __getitem__(self, key: str) -> numpy.ndarray:
+    return self.columns[key][:self.length]
+
+  def __iter__(self):
+    return iter(self.columns)
+
+  def __len__(self) -> int:
+    return len(self.columns)
+
+  def to_dataframe(self) -> pandas.DataFrame:
+    """DataFrame view of the recorded rows, columns are not copied."""
+    return pandas.DataFrame({key: self[key] for key in self.columns}, copy=False)
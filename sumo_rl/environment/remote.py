@@ -0,0 +1,173 @@
+"""libsumo simulations hosted each in its own process, so that several of them (and the GUI) can live in one run.
+
+libsumo is a module with global state: one simulation per process. LibsumoWorker starts a process which runs
+libsumo and exposes it to the parent with the interface of a TraCI connection (`worker.lane.getIDList()`,
+`worker.simulationStep()`, ...), over a multiprocessing pipe.
+
+Round trips are what makes a remote simulation slow, so:
+- commands (set*, subscribe*, unsubscribe*) are queued and sent along with the next call which needs an answer,
+- subscription results are pushed by the worker with the reply to each simulation step, for every query
+  (domain, method, arguments) asked at least once, and are served from that cache until a command on the
+  same domain invalidates them.
+"""
+from __future__ import annotations
+
+import os
+import sys
+import multiprocessing
+
+# Set (to anything but 0) to run each libsumo simulation in a worker process, as --libsumo-workers does
+WORKERS_ENVIRONMENT_VARIABLE = "SUMO_RL_LIBSUMO_WORKERS"
+
+COMMAND_PREFIXES = ('set', 'subscribe', 'unsubscribe')
+CACHED_QUERIES = ('getAllSubscriptionResults', 'getSubscriptionResults')
+# Calls of the connection itself which change the simulation, hence every subscription result
+STEPS = ('simulationStep', 'load')
+
+def workers_requested() -> bool:
+  return os.environ.get(WORKERS_ENVIRONMENT_VARIABLE, "0") not in ("", "0")
+
+class RemoteSumoError(RuntimeError):
+  """Error raised by libsumo in a worker process, with the name of its type."""
+
+def _plain(value):
+  """Traffic light programs (traci.trafficlight.Logic) travel as tuples, the worker rebuilds libsumo ones."""
+  if hasattr(value, 'programID') and hasattr(value, 'phases'):
+    phases = tuple((phase.duration, phase.state, phase.minDur, phase.maxDur, tuple(phase.next), phase.name) for phase in value.phases)
+    return ('Logic', value.programID, value.type, value.currentPhaseIndex, phases)
+  return value
+
+def _native(libsumo, value):
+  if isinstance(value, tuple) and len(value) == 5 and value[0] == 'Logic':
+    _, program_ID, type, current_phase_index, phases = value
+    return libsumo.TraCILogic(program_ID, type, current_phase_index, [libsumo.TraCIPhase(*phase) for phase in phases])
+  return value
+
+def _serve(pipe, sumo_cmd: list[str]) -> None:
+  """Worker: starts libsumo and runs the batches of calls of the parent until it sends None."""
+  if "SUMO_HOME" in os.environ:
+    sys.path.append(os.path.join(os.environ["SUMO_HOME"], "tools"))
+  import libsumo
+  queries: dict[tuple, None] = {}
+  try:
+    libsumo.start(sumo_cmd)
+    pipe.send(('ok', None, None))
+  except Exception as error:
+    pipe.send(('error', type(error).__name__, str(error)))
+    return
+  while True:
+    calls = pipe.recv()
+    if calls is None:
+      break
+    try:
+      result = None
+      stepped = False
+      for domain, method, args, kwargs in calls:
+        target = getattr(libsumo, domain) if domain else libsumo
+        result = getattr(target, method)(*[_native(libsumo, arg) for arg in args], **kwargs)
+        if method in CACHED_QUERIES:
+          queries[(domain, method, args)] = None
+        stepped = stepped or (not domain and method in STEPS)
+      prefetched = None
+      if stepped:
+        prefetched = {query: getattr(getattr(libsumo, query[0]), query[1])(*query[2]) for query in queries}
+      pipe.send(('ok', result, prefetched))
+    except Exception as error:
+      pipe.send(('error', type(error).__name__, str(error)))
+  try:
+    libsumo.close()
+  except Exception:
+    pass
+
+class RemoteDomain:
+  """Domain (lane, vehicle, simulation, ...) of a LibsumoWorker."""
+
+  def __init__(self, worker: 'LibsumoWorker', name: str) -> None:
+    self._worker = worker
+    self._name = name
+
+  def __getattr__(self, method: str):
+    worker, domain = self._worker, self._name
+    if method in CACHED_QUERIES:
+      def call(*args):
+        return worker.query(domain, method, args)
+    elif method.startswith(COMMAND_PREFIXES):
+      def call(*args, **kwargs):
+        worker.command(domain, method, args, kwargs)
+    else:
+      def call(*args, **kwargs):
+        return worker.call(domain, method, args, kwargs)
+    # Later lookups of the same method skip __getattr__
+    setattr(self, method, call)
+    return call
+
+class LibsumoWorker:
+  """libsumo simulation running in a subprocess, used like the connection of traci.getConnection."""
+
+  def __init__(self, sumo_cmd: list[str]) -> None:
+    context = multiprocessing.get_context('spawn')
+    self._pipe, child_pipe = context.Pipe()
+    # Daemonic processes (e.g. workers of a SumoVectorEnv) can't have daemonic children
+    self._process = context.Process(target=_serve, args=(child_pipe, sumo_cmd), daemon=not multiprocessing.current_process().daemon)
+    self._process.start()
+    child_pipe.close()
+    self._pending: list[tuple] = []
+    self._cache: dict[tuple, object] = {}
+    self._receive()
+
+  def _receive(self):
+    status, result, prefetched = self._pipe.recv()
+    if status == 'error':
+      raise RemoteSumoError("%s: %s" % (result, prefetched))
+    if prefetched is not None:
+      self._cache = prefetched
+    return result
+
+  def call(self, domain: str, method: str, args: tuple, kwargs: dict):
+    """Sends the queued commands and this call, waits for its result."""
+    if not domain and method in STEPS:
+      self._cache = {}
+    self._pending.append((domain, method, tuple(_plain(arg) for arg in args), kwargs))
+    calls, self._pending = self._pending, []
+    self._pipe.send(calls)
+    return self._receive()
+
+  def command(self, domain: str, method: str, args: tuple, kwargs: dict) -> None:
+    """Queues a call whose result nobody needs, its errors surface with the next call."""
+    if len(self._cache) > 0:
+      self._cache = {query: result for query, result in self._cache.items() if query[0] != domain}
+    self._pending.append((domain, method, tuple(_plain(arg) for arg in args), kwargs))
+
+  def query(self, domain: str, method: str, args: tuple):
+    key = (domain, method, args)
+    if key in self._cache:
+      return self._cache[key]
+    return self.call(domain, method, args, {})
+
+  def simulationStep(self, step: float = 0.0):
+    return self.call('', 'simulationStep', (step,), {})
+
+  def load(self, args: list[str]):
+    return self.call('', 'load', (args,), {})
+
+  def close(self) -> None:
+    if self._process is None:
+      return
+    try:
+      if len(self._pending) > 0:
+        self.call('', 'getVersion', (), {})
+      self._pipe.send(None)
+    except (OSError, EOFError, RemoteSumoError):
+      pass
+    self._process.join(timeout=10)
+    if self._process.is_alive():
+      self._process.terminate()
+    self._pipe.close()
+    self._process = None
+
+  def __getattr__(self, name: str) -> RemoteDomain:
+    if name.startswith('_'):
+      raise AttributeError(name)
+    domain = RemoteDomain(self, name)
+    setattr(self, name, domain)
+    return domain
@@ -0,0 +1,71 @@
+"""stable-baselines3 view of a SumoVectorEnv (stable-baselines3 is only required by this module)."""
+from __future__ import annotations
+
+import typing
+import numpy
+import gymnasium.spaces
+try:
+  from stable_baselines3.common.vec_env import VecEnv
+except ImportError as error:
+  raise ImportError("sumo_rl.environment.sb3 needs stable-baselines3, install it with: pip install sumo-rl[sb3]") from error
+from sumo_rl.environment.vector import SumoVectorEnv
+
+class SumoVecEnvAdapter(VecEnv):
+  """Parameter sharing over a SumoVectorEnv: every (worker, traffic signal) pair is one environment of the VecEnv.
+
+  Every traffic signal must have the same number of green phases, as a VecEnv has a single action space.
+  Finished workers are reset on the next route file of the pool, the last observation goes in infos['terminal_observation'].
+  """
+
+  def __init__(self, pool: SumoVectorEnv) -> None:
+    nvec = pool.single_action_space.nvec
+    assert len(set(nvec.tolist())) == 1, "Traffic signals have different numbers of green phases"
+    self.pool: SumoVectorEnv = pool
+    self.pool.autoreset = True
+    self.num_signals: int = len(pool.ts_ids)
+    self.obs_dim: int = pool.single_observation_space.shape[1]
+    self.actions: numpy.ndarray|None = None
+    observation_space = gymnasium.spaces.Box(low=0.0, high=1.0, shape=(self.obs_dim,), dtype=numpy.float32)
+    action_space = gymnasium.spaces.Discrete(int(nvec[0]))
+    super().__init__(pool.num_envs * self.num_signals, observation_space, action_space)
+
+  def reset(self) -> numpy.ndarray:
+    observations, _ = self.pool.reset(seed=self._seeds[0] if getattr(self, '_seeds', None) else None)
+    return observations.reshape(self.num_envs, self.obs_dim)
+
+  def step_async(self, actions: numpy.ndarray) -> None:
+    self.actions = numpy.asarray(actions, dtype=numpy.int64).reshape(self.pool.num_envs, self.num_signals)
+
+  def step_wait(self):
+    observations, rewards, terminated, truncated, infos = self.pool.step(self.actions)
+    dones = numpy.repeat(terminated | truncated, self.num_signals)
+    flat_infos: list[dict] = [{} for _ in range(self.num_envs)]
+    if 'final_observation' in infos:
+      for worker, done in enumerate(infos['_final_observation']):
+        if done:
+          for signal in range(self.num_signals):
+            flat_infos[worker * self.num_signals + signal]['terminal_observation'] = infos['final_observation'][worker][signal]
+            flat_infos[worker * self.num_signals + signal]['TimeLimit.truncated'] = bool(truncated[worker] and not terminated[worker])
+    return observations.reshape(self.num_envs, self.obs_dim), rewards.reshape(self.num_envs).astype(numpy.float32), dones, flat_infos
+
+  def close(self) -> None:
+    self.pool.close()
+
+  def get_attr(self, attr_name: str, indices=None) -> list[typing.Any]:
+    return [getattr(self.pool, attr_name) for _ in self._get_indices(indices)]
+
+  def set_attr(self, attr_name: str, value: typing.Any, indices=None) -> None:
+    setattr(self.pool, attr_name, value)
+
+  def env_method(self, method_name: str, *method_args, indices=None, **method_kwargs) -> list[typing.Any]:
+    raise TypeError("Workers of a SumoVectorEnv can't be called directly")
+
+  def env_is_wrapped(self, wrapper_class, indices=None) -> list[bool]:
+    return [False for _ in self._get_indices(indices)]
+
+  def _get_indices(self, indices) -> list[int]:
+    if indices is None:
+      return list(range(self.num_envs))
+    if isinstance(indices, int):
+      return [indices]
+    return list(indices)
@@ -0,0 +1,39 @@
+"""Priority queue of the traffic signal events of a simulation."""
+from __future__ import annotations
+
+import heapq
+
+# Kinds of event, at the same second yellow phases end before signals decide
+YELLOW_END = 0
+DECISION = 1
+
+class EventScheduler:
+  """Min-heap of (time, event, signal index) entries.
+
+  Entries are never removed when plans change: whoever pops an entry checks it is still due (see SumoEnvironment._fire_events).
+  """
+
+  def __init__(self) -> None:
+    self.queue: list[tuple[float, int, int]] = []
+
+  def clear(self) -> None:
+    self.queue = []
+
+  def schedule(self, time: float, event: int, signal: int) -> None:
+    heapq.heappush(self.queue, (time, event, signal))
+
+  def next_time(self) -> float|None:
+    """Time of the earliest pending event, None if nothing is scheduled."""
+    if len(self.queue) == 0:
+      return None
+    return self.queue[0][0]
+
+  def pop_due(self, now: float) -> list[tuple[float, int, int]]:
+    """Remove and return every event due at or before now, in order."""
+    due = []
+    while len(self.queue) > 0 and self.queue[0][0] <= now:
+      due.append(heapq.heappop(self.queue))
+    return due
+
+  def __len__(self) -> int:
+    return len(self.queue)
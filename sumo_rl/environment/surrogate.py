@@ -0,0 +1,438 @@
+"""Cell transmission surrogate of SUMO: the lanes of a network as cells of vehicles, advanced with vectorized NumPy.
+
+A SurrogateSimulation answers the few TraCI calls SumoEnvironment makes to run an episode (simulationStep,
+simulation counters, traffic light states) and fills the Datastore lane columns directly, so observation
+functions, reward functions and agents run unchanged on top of it. It trades fidelity for speed: vehicles are
+fluid quantities, turns follow the routes' average turning ratios and junctions without signals never block.
+"""
+from __future__ import annotations
+
+import heapq
+import xml.etree.ElementTree as ET
+import numpy
+import traci
+import sumo_rl.models.flows
+from sumo_rl.models.flows import VEHICLE_LENGTH, MIN_GAP, TAU
+
+# Signal states letting vehicles through (green, green without priority, yellow, off)
+OPEN_STATES = 'GgyYoO'
+# Below this many vehicles a lane (or cell) counts as empty
+EPSILON = 1e-6
+
+def _rate(attrib: dict) -> float|None:
+  """Vehicles per second of a <flow>, None if it can't be told."""
+  if 'vehsPerHour' in attrib:
+    return float(attrib['vehsPerHour']) / 3600
+  if 'period' in attrib:
+    period = attrib['period']
+    if period.startswith('exp('):
+      return float(period[4:-1])
+    return 1 / float(period)
+  if 'probability' in attrib:
+    return float(attrib['probability'])
+  if 'number' in attrib:
+    duration = float(attrib.get('end', 3600)) - float(attrib.get('begin', 0))
+    return float(attrib['number']) / max(duration, 1.0)
+  return None
+
+def _time(value: str|None) -> float|None:
+  try:
+    return float(value)
+  except (TypeError, ValueError):
+    return None
+
+class SurrogateNetwork:
+  """Cells, connections and demand of a network and a route file, built once and shared by the episodes on them.
+
+  Lanes are split into cells one free-flow step long, each with a jam capacity, a flow capacity
+  (models.flows.Lane) and a backward wave ratio. Connections join the last cell of a lane to the first cell
+  of the next one, signalized ones by (signal, link index). Demand is the routes' flows and vehicles, each with
+  the edge it enters from and the path its vehicles follow, which sets the turning ratios.
+  """
+
+  def __init__(self, net_file: str, route_file: str|None, lane_IDs: list[str], ts_ids: list[str], step_length: float = 1.0) -> None:
+    self.step_length = step_length
+    self.num_lanes = len(lane_IDs)
+    lane_index = {lane_ID: idx for idx, lane_ID in enumerate(lane_IDs)}
+    edges, lanes, connections = self._parse_network(net_file)
+    self.edge_IDs: list[str] = list(edges.keys())
+    edge_index = {edge_ID: idx for idx, edge_ID in enumerate(self.edge_IDs)}
+    successors: dict[int, set[int]] = {}
+    for from_lane, to_lane, _, _ in connections:
+      successors.setdefault(edge_index[lanes[from_lane][0]], set()).add(edge_index[lanes[to_lane][0]])
+    self.successors = successors
+    self.edge_junctions = [(edges[edge_ID][0], edges[edge_ID][1]) for edge_ID in self.edge_IDs]
+    self.edge_costs = [min(lanes[lane][1] / max(lanes[lane][2], 0.1) for lane in edges[edge_ID][2]) if edges[edge_ID][2] else 0.0 for edge_ID in self.edge_IDs]
+
+    # Lanes of normal edges, in the order of the datastore
+    normal_lanes = sorted((lane for lane in lanes if lane in lane_index), key=lambda lane: lane_index[lane])
+    self.lane_slots = numpy.array([lane_index[lane] for lane in normal_lanes], dtype=numpy.int64)
+    local = {lane: idx for idx, lane in enumerate(normal_lanes)}
+    self.lane_edges = numpy.array([edge_index[lanes[lane][0]] for lane in normal_lanes], dtype=numpy.int64)
+    self.lane_lengths = numpy.array([lanes[lane][1] for lane in normal_lanes], dtype=numpy.float64)
+    self.lane_speeds = numpy.array([lanes[lane][2] for lane in normal_lanes], dtype=numpy.float64)
+
+    # Cells
+    num_cells = numpy.maximum(1, numpy.round(self.lane_lengths / (self.lane_speeds * step_length))).astype(numpy.int64)
+    self.first_cell = numpy.concatenate([[0], numpy.cumsum(num_cells)[:-1]]).astype(numpy.int64)
+    self.last_cell = self.first_cell + num_cells - 1
+    self.cell_lanes = numpy.repeat(numpy.arange(len(normal_lanes)), num_cells)
+    flow_capacity = numpy.array([sumo_rl.models.flows.Lane(length, speed).flow_capacity for length, speed in zip(self.lane_lengths, self.lane_speeds)], dtype=numpy.float64)
+    jam_capacity = numpy.maximum(self.lane_lengths / (VEHICLE_LENGTH + MIN_GAP), 1.0)
+    self.cell_jam = (jam_capacity / num_cells)[self.cell_lanes]
+    self.cell_flow = (numpy.maximum(flow_capacity, 1.0) / 3600 * step_length)[self.cell_lanes]
+    wave_speed = (VEHICLE_LENGTH + MIN_GAP) / TAU
+    self.cell_wave = numpy.minimum(1.0, wave_speed / self.lane_speeds)[self.cell_lanes]
+    is_last = numpy.zeros(len(self.cell_lanes), dtype=bool)
+    is_last[self.last_cell] = True
+    self.inner_cells = numpy.flatnonzero(~is_last)
+
+    # Connections
+    kept = [(local[from_lane], local[to_lane], tl, link) for from_lane, to_lane, tl, link in connections if from_lane in local and to_lane in local]
+    self.connection_from = numpy.array([c[0] for c in kept], dtype=numpy.int64)
+    self.connection_to = numpy.array([c[1] for c in kept], dtype=numpy.int64)
+    self.signal_ids = list(ts_ids)
+    signal_index = {ts_id: idx for idx, ts_id in enumerate(ts_ids)}
+    self.signal_connections: dict[int, tuple[numpy.ndarray, numpy.ndarray]] = {}
+    for idx, (_, _, tl, link) in enumerate(kept):
+      if tl in signal_index:
+        self.signal_connections.setdefault(signal_index[tl], ([], []))
+        self.signal_connections[signal_index[tl]][0].append(idx)
+        self.signal_connections[signal_index[tl]][1].append(link)
+    self.signal_connections = {signal: (numpy.array(conns, dtype=numpy.int64), numpy.array(links, dtype=numpy.int64)) for signal, (conns, links) in self.signal_connections.items()}
+
+    self._load_demand(route_file)
+    self._build_ratios()
+
+  @staticmethod
+  def _parse_network(net_file: str):
+    """Normal edges (from, to, lanes), their lanes (edge, length, speed) and the connections between them."""
+    edges: dict[str, tuple[str, str, list[str]]] = {}
+    lanes: dict[str, tuple[str, float, float]] = {}
+    connections: list[tuple[str, str, str|None, int]] = []
+    for _, element in ET.iterparse(net_file, events=("end",)):
+      if element.tag == 'edge':
+        if 'function' not in element.attrib and 'from' in element.attrib and 'to' in element.attrib:
+          edge_lanes = []
+          for lane in element.iter('lane'):
+            edge_lanes.append(lane.attrib['id'])
+            lanes[lane.attrib['id']] = (element.attrib['id'], float(lane.attrib['length']), float(lane.attrib['speed']))
+          edges[element.attrib['id']] = (element.attrib['from'], element.attrib['to'], edge_lanes)
+        element.clear()
+      elif element.tag == 'connection':
+        if not element.attrib['from'].startswith(':') and not element.attrib['to'].startswith(':'):
+          from_lane = "%s_%s" % (element.attrib['from'], element.attrib['fromLane'])
+          to_lane = "%s_%s" % (element.attrib['to'], element.attrib['toLane'])
+          connections.append((from_lane, to_lane, element.attrib.get('tl'), int(element.attrib.get('linkIndex', -1))))
+        element.clear()
+    connections = [c for c in connections if c[0] in lanes and c[1] in lanes]
+    return edges, lanes, connections
+
+  def shortest_path(self, sources: list[int], targets: set[int]) -> list[int]|None:
+    """Fastest edge path (free-flow travel time) from any of sources to any of targets."""
+    queue = [(self.edge_costs[edge], edge, -1) for edge in sources]
+    heapq.heapify(queue)
+    previous: dict[int, int] = {}
+    while len(queue) > 0:
+      cost, edge, before = heapq.heappop(queue)
+      if edge in previous:
+        continue
+      previous[edge] = before
+      if edge in targets:
+        path = [edge]
+        while previous[path[-1]] != -1:
+          path.append(previous[path[-1]])
+        return path[::-1]
+      for successor in self.successors.get(edge, ()):
+        if successor not in previous:
+          heapq.heappush(queue, (cost + self.edge_costs[successor], successor, edge))
+    return None
+
+  def _path(self, attrib: dict, routes: dict[str, list[str]], child_route: list[str]|None) -> list[int]|None:
+    edge_index = {edge_ID: idx for idx, edge_ID in enumerate(self.edge_IDs)}
+    if child_route is not None:
+      edges = child_route
+    elif 'route' in attrib:
+      edges = routes.get(attrib['route'])
+    elif 'from' in attrib and 'to' in attrib:
+      if attrib['from'] not in edge_index or attrib['to'] not in edge_index:
+        return None
+      return self.shortest_path([edge_index[attrib['from']]], {edge_index[attrib['to']]})
+    elif 'fromJunction' in attrib and 'toJunction' in attrib:
+      sources = [idx for idx, (from_junction, _) in enumerate(self.edge_junctions) if from_junction == attrib['fromJunction']]
+      targets = {idx for idx, (_, to_junction) in enumerate(self.edge_junctions) if to_junction == attrib['toJunction']}
+      return self.shortest_path(sources, targets)
+    else:
+      return None
+    if edges is None or any(edge not in edge_index for edge in edges):
+      return None
+    return [edge_index[edge] for edge in edges]
+
+  def _load_demand(self, route_file: str|None) -> None:
+    """Flows (entry edge, begin, end, rate) and single departures (entry edge, time) of the route file, with their paths."""
+    self.paths: list[tuple[list[int], float]] = []
+    flows: list[tuple[int, float, float, float]] = []
+    departures: list[tuple[float, int]] = []
+    if route_file is not None:
+      root = ET.parse(route_file).getroot()
+      routes = {child.attrib['id']: child.attrib['edges'].split() for child in root if child.tag == 'route' and 'id' in child.attrib}
+      for child in root:
+        if child.tag not in ('flow', 'vehicle', 'trip'):
+          continue
+        embedded = child.find('route')
+        path = self._path(child.attrib, routes, embedded.attrib['edges'].split() if embedded is not None else None)
+        if path is None or len(path) == 0:
+          continue
+        if child.tag == 'flow':
+          rate = _rate(child.attrib)
+          begin = _time(child.attrib.get('begin', '0'))
+          end = _time(child.attrib.get('end', '3600'))
+          if rate is None or begin is None or end is None:
+            continue
+          flows.append((path[0], begin, end, rate))
+          self.paths.append((path, rate * (end - begin)))
+        else:
+          depart = _time(child.attrib.get('depart'))
+          if depart is None:
+            continue
+          departures.append((depart, path[0]))
+          self.paths.append((path, 1.0))
+    self.flow_edges = numpy.array([f[0] for f in flows], dtype=numpy.int64)
+    self.flow_begins = numpy.array([f[1] for f in flows], dtype=numpy.float64)
+    self.flow_ends = numpy.array([f[2] for f in flows], dtype=numpy.float64)
+    self.flow_rates = numpy.array([f[3] for f in flows], dtype=numpy.float64)
+    departures.sort()
+    self.departure_times = numpy.array([d[0] for d in departures], dtype=numpy.float64)
+    self.departure_edges = numpy.array([d[1] for d in departures], dtype=numpy.int64)
+
+  def _build_ratios(self) -> None:
+    """Share of the vehicles leaving each lane through each of its connections, and towards their destination (sink)."""
+    num_edges = len(self.edge_IDs)
+    turns: dict[tuple[int, int], float] = {}
+    ends = numpy.zeros(num_edges)
+    for path, weight in self.paths:
+      for from_edge, to_edge in zip(path[:-1], path[1:]):
+        turns[(from_edge, to_edge)] = turns.get((from_edge, to_edge), 0.0) + weight
+      ends[path[-1]] += weight
+    num_lanes = len(self.lane_edges)
+    # Connections of each lane towards each edge share that edge's turns
+    to_edges = self.lane_edges[self.connection_to]
+    from_edges = self.lane_edges[self.connection_from]
+    pair_keys = self.connection_from * num_edges + to_edges
+    _, pair_of, pair_counts = numpy.unique(pair_keys, return_inverse=True, return_counts=True)
+    weights = numpy.array([turns.get((int(f), int(t)), 0.0) for f, t in zip(from_edges, to_edges)], dtype=numpy.float64) / numpy.maximum(pair_counts[pair_of], 1)
+    sink = ends[self.lane_edges]
+    has_connections = numpy.bincount(self.connection_from, minlength=num_lanes) > 0
+    # Lanes no route goes through: spread over their connections, or leave the network if they have none
+    total = numpy.bincount(self.connection_from, weights=weights, minlength=num_lanes) + sink
+    unknown = total <= 0
+    weights = numpy.where(unknown[self.connection_from], 1.0, weights)
+    sink = numpy.where(unknown & ~has_connections, 1.0, sink)
+    total = numpy.bincount(self.connection_from, weights=weights, minlength=num_lanes) + sink
+    self.connection_ratios = weights / total[self.connection_from]
+    self.sink_ratios = sink / total
+
+class SurrogateSimulation:
+  """One episode on a SurrogateNetwork, with the TraCI interface SumoEnvironment uses (see the module docstring)."""
+
+  def __init__(self, network: SurrogateNetwork, begin_time: float = 0.0) -> None:
+    self.network = network
+    self.time = float(begin_time)
+    num_cells = len(network.cell_lanes)
+    num_lanes = len(network.lane_edges)
+    self.vehicles = numpy.zeros(num_cells)
+    self.backlog = numpy.zeros(len(network.edge_IDs))
+    self.waiting = numpy.zeros(num_lanes)
+    self.accumulated = numpy.zeros(num_lanes)
+    self.open = numpy.ones(len(network.connection_from))
+    self.next_departure = int(numpy.searchsorted(network.departure_times, self.time))
+    # Fractional counters since the beginning, and their integer values already reported
+    self.departed = 0.0
+    self.arrived = 0.0
+    self.reported = {'departed': 0, 'arrived': 0}
+    self.step_counts = {'departed': 0, 'arrived': 0}
+    self.lane_values: dict[str, numpy.ndarray] = {key: numpy.zeros(network.num_lanes) for key in ['lsvn', 'lsvl', 'lshn', 'lsms', 'lso', 'lswt', 'tawt', 'mawt']}
+    self.lane_values['lsms'][network.lane_slots] = network.lane_speeds
+    self.simulation = _SimulationDomain(self)
+    self.lane = _LaneDomain()
+    self.vehicle = _VehicleDomain(self)
+    self.trafficlight = _TrafficlightDomain(self)
+
+  def _arrivals(self) -> numpy.ndarray:
+    network = self.network
+    num_edges = len(network.edge_IDs)
+    active = (network.flow_begins <= self.time) & (self.time < network.flow_ends)
+    arrivals = numpy.bincount(network.flow_edges[active], weights=network.flow_rates[active] * network.step_length, minlength=num_edges)
+    end = int(numpy.searchsorted(network.departure_times, self.time + network.step_length))
+    if end > self.next_departure:
+      arrivals += numpy.bincount(network.departure_edges[self.next_departure:end], minlength=num_edges)
+      self.next_departure = end
+    return arrivals
+
+  def _step(self) -> None:
+    network = self.network
+    n = self.vehicles
+    num_lanes = len(network.lane_edges)
+    sending = numpy.minimum(n, network.cell_flow)
+    receiving = numpy.maximum(numpy.minimum(network.cell_flow, network.cell_wave * (network.cell_jam - n)), 0.0)
+    outflow = numpy.zeros(len(n))
+    inflow = numpy.zeros(len(n))
+
+    # Along lanes
+    inner = network.inner_cells
+    moved = numpy.minimum(sending[inner], receiving[inner + 1])
+    outflow[inner] = moved
+    inflow[inner + 1] = moved
+
+    # Across junctions, downstream supply shared by the connections in proportion to their demand
+    last = network.last_cell
+    demand = sending[last[network.connection_from]] * network.connection_ratios * self.open
+    targets = network.first_cell[network.connection_to]
+    requested = numpy.bincount(targets, weights=demand, minlength=len(n))
+    scale = numpy.divide(receiving, requested, out=numpy.ones(len(n)), where=requested > receiving)
+    crossing = demand * scale[targets]
+    outflow += numpy.bincount(last[network.connection_from], weights=crossing, minlength=len(n))
+    inflow += numpy.bincount(targets, weights=crossing, minlength=len(n))
+    sunk = sending[last] * network.sink_ratios
+    outflow[last] += sunk
+
+    # Into the network, where supply is left on the entry lanes of each edge
+    self.backlog += self._arrivals()
+    first = network.first_cell
+    supply = numpy.maximum(receiving[first] - inflow[first], 0.0)
+    edge_supply = numpy.bincount(network.lane_edges, weights=supply, minlength=len(self.backlog))
+    entering = numpy.minimum(self.backlog, edge_supply)
+    share = numpy.divide(entering, edge_supply, out=numpy.zeros(len(entering)), where=edge_supply > 0)
+    departing = supply * share[network.lane_edges]
+    inflow[first] += departing
+    self.backlog -= entering
+
+    # Lane variables, before and after the move
+    before = numpy.bincount(network.cell_lanes, weights=n, minlength=num_lanes)
+    stopped = numpy.bincount(network.cell_lanes, weights=numpy.maximum(n - outflow, 0.0), minlength=num_lanes)
+    advanced = numpy.bincount(network.cell_lanes, weights=outflow, minlength=num_lanes)
+    leaving = outflow[last]
+    n += inflow - outflow
+    numpy.maximum(n, 0.0, out=n)
+    after = numpy.bincount(network.cell_lanes, weights=n, minlength=num_lanes)
+
+    # Waiting times: vehicles leaving take their share along, accumulated times travel with them to the next lane
+    kept = numpy.divide(before - leaving, before, out=numpy.zeros(num_lanes), where=before > EPSILON)
+    halting = stopped > EPSILON
+    self.waiting = numpy.where(halting, self.waiting * kept + stopped * network.step_length, 0.0)
+    mean_accumulated = numpy.divide(self.accumulated, before, out=numpy.zeros(num_lanes), where=before > EPSILON)
+    carried = numpy.bincount(network.connection_to, weights=crossing * mean_accumulated[network.connection_from], minlength=num_lanes)
+    self.accumulated = self.accumulated * kept + stopped * network.step_length + carried
+    self.accumulated[after <= EPSILON] = 0.0
+
+    slots = network.lane_slots
+    values = self.lane_values
+    values['lsvn'][slots] = after
+    values['lsvl'][slots] = numpy.where(after > EPSILON, VEHICLE_LENGTH, 0.0)
+    values['lshn'][slots] = stopped
+    values['lsms'][slots] = numpy.where(before > EPSILON, network.lane_speeds * numpy.divide(advanced, before, out=numpy.ones(num_lanes), where=before > EPSILON), network.lane_speeds)
+    values['lso'][slots] = numpy.minimum(1.0, after * VEHICLE_LENGTH / network.lane_lengths)
+    values['lswt'][slots] = self.waiting
+    values['tawt'][slots] = self.accumulated
+    values['mawt'][slots] = numpy.divide(self.accumulated, after, out=numpy.full(num_lanes, numpy.nan), where=after > EPSILON)
+
+    self.departed += float(departing.sum())
+    self.arrived += float(sunk.sum())
+    self.time += network.step_length
+
+  def _count(self, counter: str, value: float) -> int:
+    """Integer vehicles since the last report, so that counters add up to the rounded fractional totals."""
+    total = int(round(value))
+    count = total - self.reported[counter]
+    self.reported[counter] = total
+    return count
+
+  def simulationStep(self, step: float = 0.0) -> None:
+    target = self.time + self.network.step_length if step <= self.time else step
+    while self.time < target - EPSILON:
+      self._step()
+    self.step_counts = {'departed': self._count('departed', self.departed), 'arrived': self._count('arrived', self.arrived)}
+
+  def gather(self, datastore, plan: dict[str, numpy.ndarray]) -> None:
+    """Copy the planned lane variables into the datastore, along with the waiting time aggregates."""
+    for key, lanes_idx in plan.items():
+      if key in self.lane_values:
+        datastore.columns[key][lanes_idx] = self.lane_values[key][lanes_idx]
+    datastore.tawt[:] = self.lane_values['tawt']
+    datastore.mawt[:] = self.lane_values['mawt']
+    # Metrics only count running vehicles, a range stands for them without materializing IDs
+    datastore.vehicle_IDs = range(int(round(float(self.vehicles.sum()))))
+
+  def set_signal_state(self, signal: int, state: str) -> None:
+    if signal not in self.network.signal_connections:
+      return
+    connections, links = self.network.signal_connections[signal]
+    self.open[connections] = [1.0 if link < len(state) and state[link] in OPEN_STATES else 0.0 for link in links.tolist()]
+
+  def close(self) -> None:
+    pass
+
+class _SimulationDomain:
+  def __init__(self, simulation: SurrogateSimulation) -> None:
+    self._simulation = simulation
+
+  def subscribe(self, variables: list[int]) -> None:
+    self._variables = variables
+
+  def getTime(self) -> float:
+    return self._simulation.time
+
+  def getSubscriptionResults(self) -> dict:
+    simulation = self._simulation
+    return {
+      traci.constants.VAR_TIME: simulation.time,
+      traci.constants.VAR_DEPARTED_VEHICLES_NUMBER: simulation.step_counts['departed'],
+      traci.constants.VAR_ARRIVED_VEHICLES_NUMBER: simulation.step_counts['arrived'],
+      traci.constants.VAR_TELEPORT_ENDING_VEHICLES_NUMBER: 0,
+      traci.constants.VAR_DEPARTED_VEHICLES_IDS: (),
+      traci.constants.VAR_ARRIVED_VEHICLES_IDS: (),
+    }
+
+  def getDepartedNumber(self) -> int:
+    return self._simulation.step_counts['departed']
+
+  def getArrivedNumber(self) -> int:
+    return self._simulation.step_counts['arrived']
+
+  def getEndingTeleportNumber(self) -> int:
+    return 0
+
+  def getPendingVehicles(self) -> range:
+    return range(int(round(float(self._simulation.backlog.sum()))))
+
+  def getMinExpectedNumber(self) -> int:
+    """Vehicles running or waiting to depart, like SUMO it doesn't count departures still to come"""
+    simulation = self._simulation
+    return int(round(float(simulation.vehicles.sum() + simulation.backlog.sum())))
+
+class _LaneDomain:
+  """Subscriptions are accepted and ignored: SurrogateSimulation.gather fills the datastore instead."""
+
+  def subscribe(self, *args) -> None:
+    pass
+
+  def getAllSubscriptionResults(self) -> dict:
+    return {}
+
+class _VehicleDomain(_LaneDomain):
+  def __init__(self, simulation: SurrogateSimulation) -> None:
+    self._simulation = simulation
+
+  def getIDCount(self) -> int:
+    return int(round(float(self._simulation.vehicles.sum())))
+
+class _TrafficlightDomain:
+  def __init__(self, simulation: SurrogateSimulation) -> None:
+    self._simulation = simulation
+    self._signals = {ts_id: idx for idx, ts_id in enumerate(simulation.network.signal_ids)}
+
+  def setProgramLogic(self, ts_id: str, logic) -> None:
+    self.setRedYellowGreenState(ts_id, logic.phases[0].state)
+
+  def setRedYellowGreenState(self, ts_id: str, state: str) -> None:
+    self._simulation.set_signal_state(self._signals[ts_id], state)
@@ -0,0 +1,135 @@
+"""Counting and timing of the TraCI calls made on a SUMO connection, by call and by caller."""
+from __future__ import annotations
+
+import os
+import sys
+import time
+from sumo_rl.models.serde import GenericFile
+
+# Setting it (to anything but 0) enables tracing, as --trace-traci does
+TRACE_ENVIRONMENT_VARIABLE = "SUMO_RL_TRACE_TRACI"
+
+def tracing_requested() -> bool:
+  return os.environ.get(TRACE_ENVIRONMENT_VARIABLE, "0") not in ("", "0")
+
+class CallTracer:
+  """Accumulates count, latency (nanoseconds) and socket bytes of each (domain.method, caller) pair.
+
+  Bytes are those sent and received on the TraCI socket while the call was running, so a simulationStep
+  accounts for the subscription results it brings back. With libsumo there is no socket and bytes stay 0.
+  """
+
+  def __init__(self) -> None:
+    self.calls: dict[tuple[str, str], list[int]] = {}
+    self.bytes: int = 0
+    self.clock = time.perf_counter_ns
+
+  def record(self, call: str, caller: str, elapsed: int, transferred: int) -> None:
+    stats = self.calls.get((call, caller))
+    if stats is None:
+      stats = self.calls[(call, caller)] = [0, 0, 0]
+    stats[0] += 1
+    stats[1] += elapsed
+    stats[2] += transferred
+
+  def clear(self) -> None:
+    self.calls = {}
+
+  def _grouped(self, by: int) -> dict[str, list[int]]:
+    grouped = {}
+    for key, stats in self.calls.items():
+      total = grouped.setdefault(key[by], [0, 0, 0])
+      for i in range(3):
+        total[i] += stats[i]
+    return grouped
+
+  def summary(self, top: int|None = None) -> dict[str, dict[str, dict[str, float]]]:
+    """count, total time (seconds) and bytes by call and by caller, hottest (by total time) first"""
+    summary = {}
+    for section, by in [('calls', 0), ('callers', 1)]:
+      ordered = sorted(self._grouped(by).items(), key=lambda item: -item[1][1])
+      summary[section] = {
+        name: {'count': count, 'total': elapsed / 1e9, 'bytes': transferred}
+        for name, (count, elapsed, transferred) in ordered[:top]
+      }
+    return summary
+
+  def table(self, top: int = 20) -> str:
+    lines = ["%-50s %-50s %10s %10s %10s %12s" % ('call', 'caller', 'count', 'total s', 'mean us', 'bytes')]
+    ordered = sorted(self.calls.items(), key=lambda item: -item[1][1])
+    for (call, caller), (count, elapsed, transferred) in ordered[:top]:
+      lines.append("%-50s %-50s %10d %10.3f %10.1f %12d" % (call, caller, count, elapsed / 1e9, elapsed / count / 1e3, transferred))
+    return "\n".join(lines)
+
+  def dump(self, path: str, top: int = 20) -> None:
+    """Write the report of the episode to path (YAML), print the hottest calls and start over."""
+    GenericFile(self.summary()).to_yaml_file(path)
+    print(self.table(top))
+    self.clear()
+
+class TracedDomain:
+  """Proxy of a TraCI domain (or of the connection itself), whose methods report to the tracer."""
+
+  def __init__(self, target, name: str, tracer: CallTracer) -> None:
+    self._target = target
+    self._name = name
+    self._tracer = tracer
+
+  def _trace(self, name: str, method):
+    tracer = self._tracer
+    call = "%s.%s" % (self._name, name) if self._name else name
+
+    def traced(*args, **kwargs):
+      frame = sys._getframe(1)
+      caller = "%s:%s" % (frame.f_globals.get('__name__', '?'), frame.f_code.co_name)
+      transferred = tracer.bytes
+      start = tracer.clock()
+      try:
+        return method(*args, **kwargs)
+      finally:
+        tracer.record(call, caller, tracer.clock() - start, tracer.bytes - transferred)
+    return traced
+
+  def __getattr__(self, name: str):
+    attribute = getattr(self._target, name)
+    if callable(attribute):
+      attribute = self._trace(name, attribute)
+    elif not self._name and not name.startswith('_') and not isinstance(attribute, (int, float, str)):
+      # Domains of the connection (lane, vehicle, simulation, ...)
+      attribute = TracedDomain(attribute, name, self._tracer)
+    else:
+      return attribute
+    # Later lookups of the same attribute skip __getattr__
+    object.__setattr__(self, name, attribute)
+    return attribute
+
+class CountingSocket:
+  """Socket of a TraCI connection which adds the bytes it sends and receives to the tracer."""
+
+  def __init__(self, socket, tracer: CallTracer) -> None:
+    self._socket = socket
+    self._tracer = tracer
+
+  def send(self, data, *args) -> int:
+    sent = self._socket.send(data, *args)
+    self._tracer.bytes += sent
+    return sent
+
+  def sendall(self, data, *args) -> None:
+    self._socket.sendall(data, *args)
+    self._tracer.bytes += len(data)
+
+  def recv(self, size: int, *args) -> bytes:
+    data = self._socket.recv(size, *args)
+    self._tracer.bytes += len(data)
+    return data
+
+  def __getattr__(self, name: str):
+    return getattr(self._socket, name)
+
+def traced_connection(connection, tracer: CallTracer) -> TracedDomain:
+  """Wraps connection (a traci.Connection, or the traci/libsumo module) so that its calls report to tracer."""
+  socket = getattr(connection, '_socket', None)
+  if socket is not None and not isinstance(socket, CountingSocket):
+    connection._socket = CountingSocket(socket, tracer)
+  return TracedDomain(connection, "", tracer)
@@ -2,7 +2,7 @@
 
 import os
 import sys
-from typing import Callable, List, Union
+from typing import Callable, List, Optional, Union
 
 if "SUMO_HOME" in os.environ:
     tools = os.path.join(os.environ["SUMO_HOME"], "tools")
@@ -11,6 +11,9 @@ else:
     raise ImportError("Please declare the environment variable 'SUMO_HOME'")
 import numpy as np
 import gymnasium.spaces
+import traci
+from sumo_rl.models.scenario import SignalLayout
+from sumo_rl.environment.scheduler import YELLOW_END, DECISION
 
 class TrafficSignal:
     """This class represents a Traffic Signal controlling an intersection.
@@ -54,6 +57,7 @@ class TrafficSignal:
         enforce_max_green: bool,
         begin_time: int,
         sumo,
+        layout: Optional[SignalLayout] = None,
     ):
         """Initializes a TrafficSignal object.
 
@@ -68,7 +72,8 @@ class TrafficSignal:
             begin_time (int): The time in seconds when the traffic signal starts operating.
             reward_fn (Union[str, Callable]): The reward function. Can be a string with the name of the reward function or a callable function.
             reward_weights (List[float]): The weights of the reward function.
-            sumo (Sumo): The Sumo instance.
+            sumo (Sumo): The Sumo instance, None if the simulation is not started yet.
+            layout (SignalLayout): Program and lanes of the traffic signal, as compiled from the network. If None, they are queried from sumo.
         """
         self.id = ts_id
         self.env = env
@@ -79,78 +84,91 @@ class TrafficSignal:
         self.enforce_max_green = enforce_max_green
         self.green_phase = 0
         self.is_yellow = False
-        self.time_since_last_phase_change = 0
+        self.last_phase_change_time = begin_time
         self.next_action_time = begin_time
-        self.last_ts_waiting_time = 0.0
         self.sumo = sumo
+        self.index = 0
 
-        self._build_phases()
+        if layout is None:
+            layout = SignalLayout.from_traci(self.sumo, self.id)
+        self._build_phases(layout)
 
-        self.lanes = list(
-            dict.fromkeys(self.sumo.trafficlight.getControlledLanes(self.id))
-        )  # Remove duplicates and keep order
-        self.out_lanes = [link[0][1] for link in self.sumo.trafficlight.getControlledLinks(self.id) if link]
-        self.out_lanes = list(set(self.out_lanes))
-        self.lanes_length = {lane: self.sumo.lane.getLength(lane) for lane in self.lanes + self.out_lanes}
+        self.lanes = list(layout.lanes)
+        self.out_lanes = list(layout.out_lanes)
+        self.lanes_length = dict(layout.lanes_length)
+        self.lanes_idx = np.zeros(0, dtype=np.int64)
+        self.out_lanes_idx = np.zeros(0, dtype=np.int64)
         self.action_space = gymnasium.spaces.Discrete(self.num_green_phases)
 
-    def _build_phases(self):
-        phases = self.sumo.trafficlight.getAllProgramLogics(self.id)[0].phases
+    def index_lanes(self, datastore, index: int):
+        """Resolves incoming and outgoing lanes into integer indices of the datastore columns.
+
+        Args:
+            datastore (Datastore): The datastore whose lane index is used.
+            index (int): Position of this traffic signal in the per-signal vectors of the datastore.
+        """
+        self.index = index
+        self.lanes_idx = datastore.indices(self.lanes)
+        self.out_lanes_idx = datastore.indices(self.out_lanes)
+
+    def _build_phases(self, layout: SignalLayout):
+        self.program = None
         if self.env.fixed_ts:
-            self.num_green_phases = len(phases) // 2  # Number of green phases == number of phases (green+yellow) divided by 2
+            self.num_green_phases = len(layout.states) // 2  # Number of green phases == number of phases (green+yellow) divided by 2
             return
 
-        self.green_phases = []
-        self.yellow_dict = {}
-        for phase in phases:
-            state = phase.state
-            if "y" not in state and (state.count("r") + state.count("s") != len(state)):
-                self.green_phases.append(self.sumo.trafficlight.Phase(60, state))
+        self.green_phases = [traci.trafficlight.Phase(60, state) for state in layout.green_states]
         self.num_green_phases = len(self.green_phases)
         self.all_phases = self.green_phases.copy()
 
-        for i, p1 in enumerate(self.green_phases):
-            for j, p2 in enumerate(self.green_phases):
-                if i == j:
-                    continue
-                yellow_state = ""
-                for s in range(len(p1.state)):
-                    if (p1.state[s] == "G" or p1.state[s] == "g") and (p2.state[s] == "r" or p2.state[s] == "s"):
-                        yellow_state += "y"
-                    else:
-                        yellow_state += p1.state[s]
-                self.yellow_dict[(i, j)] = len(self.all_phases)
-                self.all_phases.append(self.sumo.trafficlight.Phase(self.yellow_time, yellow_state))
-
-        programs = self.sumo.trafficlight.getAllProgramLogics(self.id)
-        logic = programs[0]
-        logic.type = 0
-        logic.phases = self.all_phases
-        self.sumo.trafficlight.setProgramLogic(self.id, logic)
+        self.yellow_dict = {}
+        for (i, j), yellow_state in layout.yellow_states.items():
+            self.yellow_dict[(i, j)] = len(self.all_phases)
+            self.all_phases.append(traci.trafficlight.Phase(self.yellow_time, yellow_state))
+
+        self.program = traci.trafficlight.Logic(layout.program_id, 0, 0, self.all_phases)
+        if self.sumo is not None:
+            self.install_program()
+
+    def install_program(self):
+        """Installs the program built by _build_phases on the current simulation, without querying SUMO again.
+
+        Later states go through env.set_signal_state, which only sends actual changes.
+
+        Needed after every (re)load of the simulation, as SUMO starts again from the programs of the .net file.
+        """
+        if self.program is None:
+            return
+        self.sumo.trafficlight.setProgramLogic(self.id, self.program)
         self.sumo.trafficlight.setRedYellowGreenState(self.id, self.all_phases[0].state)
+        self.env.signal_state_sent(self.index, self.all_phases[0].state)
 
     def reset(self, begin_time: int):
       """Resets the Traffic Signal as simulation was never started"""
       self.green_phase = 0
       self.is_yellow = False
-      self.time_since_last_phase_change = 0
+      self.last_phase_change_time = begin_time
       self.next_action_time = begin_time
-      self.last_ts_waiting_time = 0.0
 
     @property
     def time_to_act(self):
         """Returns True if the traffic signal should act in the current step."""
         return self.next_action_time == self.env.sim_step
 
+    @property
+    def time_since_last_phase_change(self):
+        """Returns the seconds elapsed since the last phase change (or since the start of the episode)."""
+        return self.env.sim_step - self.last_phase_change_time
+
     def update(self):
         """Updates the traffic signal state.
 
-        If the traffic signal should act, it will set the next green phase and update the next action time.
+        If the yellow phase is over, it will set the next green phase.
+        Called by the environment when the yellow end event scheduled by set_next_phase fires.
         """
-        self.time_since_last_phase_change += 1
-        if self.is_yellow and self.time_since_last_phase_change == self.yellow_time:
+        if self.is_yellow and self.time_since_last_phase_change >= self.yellow_time:
             # self.sumo.trafficlight.setPhase(self.id, self.green_phase)
-            self.sumo.trafficlight.setRedYellowGreenState(self.id, self.all_phases[self.green_phase].state)
+            self.env.set_signal_state(self.index, self.all_phases[self.green_phase].state)
             self.is_yellow = False
 
     def set_next_phase(self, new_phase: int):
@@ -173,8 +191,9 @@ class TrafficSignal:
 
         if self.green_phase == new_phase or self.time_since_last_phase_change < self.yellow_time + self.min_green:
             # self.sumo.trafficlight.setPhase(self.id, self.green_phase)
-            self.sumo.trafficlight.setRedYellowGreenState(self.id, self.all_phases[self.green_phase].state)
+            self.env.set_signal_state(self.index, self.all_phases[self.green_phase].state)
             self.next_action_time = self.env.sim_step + self.delta_time
+            self.env.scheduler.schedule(self.next_action_time, DECISION, self.index)
         else:
             # self.sumo.trafficlight.setPhase(self.id, self.yellow_dict[(self.green_phase, new_phase)])  # turns yellow
             if (self.green_phase, new_phase) not in self.yellow_dict:
@@ -183,13 +202,13 @@ class TrafficSignal:
               print(self.yellow_dict)
               print(self.all_phases)
               raise ValueError(new_phase, "Failed assertion: (self.green_phase, new_phase) in self.yellow_dict")
-            self.sumo.trafficlight.setRedYellowGreenState(
-                self.id, self.all_phases[self.yellow_dict[(self.green_phase, new_phase)]].state
-            )
+            self.env.set_signal_state(self.index, self.all_phases[self.yellow_dict[(self.green_phase, new_phase)]].state)
             self.green_phase = new_phase
             self.next_action_time = self.env.sim_step + self.delta_time
             self.is_yellow = True
-            self.time_since_last_phase_change = 0
+            self.last_phase_change_time = self.env.sim_step
+            self.env.scheduler.schedule(self.last_phase_change_time + self.yellow_time, YELLOW_END, self.index)
+            self.env.scheduler.schedule(self.next_action_time, DECISION, self.index)
 
     def get_accumulated_waiting_time_per_lane(self) -> List[float]:
         """Returns the accumulated waiting time per lane.
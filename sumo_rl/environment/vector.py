@@ -0,0 +1,272 @@
+"""Pool of SumoEnvironment workers running in subprocesses, exchanging per-step data through shared memory."""
+
+from __future__ import annotations
+import multiprocessing
+import multiprocessing.shared_memory
+import traceback
+import typing
+import numpy
+import gymnasium
+import gymnasium.spaces
+import gymnasium.vector
+
+class SharedBuffers:
+  """NumPy arrays backed by shared memory blocks, created by the pool and attached by the workers."""
+
+  def __init__(self, layout: dict[str, tuple[tuple, str, str]], create: bool) -> None:
+    self.blocks: dict[str, multiprocessing.shared_memory.SharedMemory] = {}
+    self.arrays: dict[str, numpy.ndarray] = {}
+    self.create: bool = create
+    for key, (shape, dtype, name) in layout.items():
+      size = max(1, int(numpy.prod(shape)) * numpy.dtype(dtype).itemsize)
+      if create:
+        block = multiprocessing.shared_memory.SharedMemory(create=True, size=size)
+      else:
+        block = multiprocessing.shared_memory.SharedMemory(name=name)
+      self.blocks[key] = block
+      self.arrays[key] = numpy.ndarray(shape, dtype=dtype, buffer=block.buf)
+      if create:
+        self.arrays[key].fill(0)
+
+  @staticmethod
+  def allocate(shapes: dict[str, tuple[tuple, typing.Any]]) -> SharedBuffers:
+    return SharedBuffers({key: (shape, numpy.dtype(dtype).str, '') for key, (shape, dtype) in shapes.items()}, create=True)
+
+  def layout(self) -> dict[str, tuple[tuple, str, str]]:
+    """What a worker needs to attach the same buffers."""
+    return {key: (array.shape, array.dtype.str, self.blocks[key].name) for key, array in self.arrays.items()}
+
+  def __getitem__(self, key: str) -> numpy.ndarray:
+    return self.arrays[key]
+
+  def close(self) -> None:
+    self.arrays = {}
+    for block in self.blocks.values():
+      block.close()
+      if self.create:
+        block.unlink()
+    self.blocks = {}
+
+def _write_step(env, buffers: SharedBuffers, index: int, metrics_columns: list[str]) -> None:
+  observations = buffers['observations']
+  observations[index] = 0
+  observations[index, :, :env.observation_matrix.shape[1]] = env.observation_matrix
+  buffers['rewards'][index] = env.reward_vector
+  buffers['metrics'][index] = [env.metrics[column][-1] for column in metrics_columns]
+  buffers['dones'][index] = env.done()
+
+def _worker(index: int, make_env: typing.Callable[[int], typing.Any], layout: dict, metrics_columns: list[str], pipe) -> None:
+  """Runs one SumoEnvironment, driven by the commands of the pool."""
+  env = make_env(index)
+  buffers = SharedBuffers(layout, create=False)
+  try:
+    while True:
+      command, payload = pipe.recv()
+      if command == 'reset':
+        if payload is None:
+          # Nothing to simulate in this round
+          buffers['dones'][index] = True
+          pipe.send(('ok', None))
+          continue
+        env.close_metrics()
+        env.set_duration(payload['seconds'])
+        env.set_route_file(payload['route_file'])
+        env.sumo_seed = payload['seed']
+        if payload.get('fidelity') is not None:
+          env.set_fidelity(payload['fidelity'])
+        env.reset()
+        if payload.get('metrics_path') is not None:
+          env.stream_metrics(payload['metrics_path'], payload.get('csv_path'))
+        env.gather_data_from_sumo()
+        env.compute_observations()
+        env.compute_rewards()
+        env.compute_metrics()
+        _write_step(env, buffers, index, metrics_columns)
+        pipe.send(('ok', None))
+      elif command == 'step':
+        if not buffers['dones'][index]:
+          actions = buffers['actions'][index]
+          env.step(action={ts_id: int(action) for ts_id, action in zip(env.ts_ids, actions)})
+          env.gather_data_from_sumo()
+          env.compute_observations()
+          env.compute_rewards()
+          env.compute_metrics()
+          _write_step(env, buffers, index, metrics_columns)
+          if buffers['dones'][index]:
+            env.close_metrics()
+        pipe.send(('ok', None))
+      elif command == 'close':
+        env.close_metrics()
+        env.close()
+        pipe.send(('ok', None))
+        break
+      else:
+        raise ValueError(command)
+  except Exception:
+    pipe.send(('error', traceback.format_exc()))
+  finally:
+    # A failed worker stops its SUMO as well
+    try:
+      env.close()
+    finally:
+      buffers.close()
+
+class SumoVectorEnv(gymnasium.vector.VectorEnv):
+  """Runs num_envs SumoEnvironment workers in subprocesses, each one with its own route file and seed.
+
+  Observations (padded like ObservationFunction.batch), rewards, actions, the last metrics row and done flags of every worker
+  live in shared memory, so only command tokens go through the pipes. Every worker drives the same network as template,
+  observations have shape (num_envs, n_signals, obs_dim) and actions (num_envs, n_signals).
+
+  The gymnasium API (reset/step) returns copies and resets finished workers on the next route file when autoreset is set.
+  observations_of/rewards_of give the per-signal views used by agents, valid until the next step.
+  """
+
+  def __init__(self,
+               make_env: typing.Callable[[int], typing.Any],
+               num_envs: int,
+               template,
+               route_files: list[str] = [],
+               seconds: int|None = None,
+               seed: int = 0,
+               autoreset: bool = False) -> None:
+    self.num_envs: int = num_envs
+    self.template = template
+    self.ts_ids: list[str] = list(template.ts_ids)
+    self.route_files: list[str] = list(route_files)
+    self.seconds: int = seconds if seconds is not None else template.num_seconds
+    self.seed: int = seed
+    self.autoreset: bool = autoreset
+    self.next_episode: int = 0
+    self.closed: bool = False
+
+    signals = [template.traffic_signals[ts_id] for ts_id in self.ts_ids]
+    self.observation_sizes = numpy.array([template.observation_fn.observation_space_size(ts) for ts in signals], dtype=numpy.int64)
+    obs_dim = int(self.observation_sizes.max(initial=0))
+    self.metrics_columns: list[str] = [column for column in template.metrics.dtypes if numpy.dtype(template.metrics.dtypes[column]) != numpy.dtype(object)]
+    self.buffers = SharedBuffers.allocate({
+      'observations': ((num_envs, len(signals), obs_dim), numpy.float32),
+      'rewards': ((num_envs, len(signals)), numpy.float64),
+      'actions': ((num_envs, len(signals)), numpy.int64),
+      'metrics': ((num_envs, len(self.metrics_columns)), numpy.float64),
+      'dones': ((num_envs,), numpy.bool_),
+    })
+    self.buffers['dones'][:] = True
+
+    self.single_observation_space = gymnasium.spaces.Box(low=0.0, high=1.0, shape=(len(signals), obs_dim), dtype=numpy.float32)
+    self.single_action_space = gymnasium.spaces.MultiDiscrete([ts.num_green_phases for ts in signals])
+    self.observation_space = gymnasium.spaces.Box(low=0.0, high=1.0, shape=(num_envs, len(signals), obs_dim), dtype=numpy.float32)
+    self.action_space = gymnasium.spaces.MultiDiscrete(numpy.tile(self.single_action_space.nvec, (num_envs, 1)))
+
+    context = multiprocessing.get_context('spawn')
+    self.pipes = []
+    self.processes = []
+    layout = self.buffers.layout()
+    for index in range(num_envs):
+      parent_pipe, child_pipe = context.Pipe()
+      process = context.Process(target=_worker, args=(index, make_env, layout, self.metrics_columns, child_pipe), daemon=True)
+      process.start()
+      child_pipe.close()
+      self.pipes.append(parent_pipe)
+      self.processes.append(process)
+
+  def _command(self, commands: dict[int, tuple[str, typing.Any]]) -> None:
+    """Send a command to some workers, then wait for all of them: workers run in parallel.
+
+    Every reply is received before raising, so that no pipe is left with a reply of this command.
+    """
+    for index, command in commands.items():
+      self.pipes[index].send(command)
+    errors = []
+    for index in commands:
+      status, payload = self.pipes[index].recv()
+      if status == 'error':
+        errors.append("Worker %s failed:\n%s" % (index, payload))
+    if len(errors) > 0:
+      raise RuntimeError("\n".join(errors))
+
+  def _next_episode(self) -> dict:
+    assert len(self.route_files) > 0, "No route files to start episodes from"
+    episode = {
+      'route_file': self.route_files[self.next_episode % len(self.route_files)],
+      'seed': self.seed + self.next_episode,
+      'seconds': self.seconds,
+    }
+    self.next_episode += 1
+    return episode
+
+  def reset_episodes(self, episodes: list[dict|None]) -> None:
+    """Start one episode per worker, a dict with route_file, seed, seconds and optionally metrics_path, csv_path and fidelity. None leaves a worker idle (done)."""
+    assert len(episodes) == self.num_envs
+    self._command({index: ('reset', episode) for index, episode in enumerate(episodes)})
+
+  def reset(self, *, seed: int|None = None, options: dict|None = None) -> tuple[numpy.ndarray, dict]:
+    if seed is not None:
+      self.seed = seed
+      self.next_episode = 0
+    episodes = (options or {}).get('episodes')
+    if episodes is None:
+      episodes = [self._next_episode() for _ in range(self.num_envs)]
+    self.reset_episodes(episodes)
+    return self.buffers['observations'].copy(), {}
+
+  def step_workers(self, actions: numpy.ndarray) -> None:
+    """Step every worker which is not done, results stay in the shared buffers."""
+    self.buffers['actions'][:] = actions
+    self._command({index: ('step', None) for index in range(self.num_envs) if not self.buffers['dones'][index]})
+
+  def step(self, actions: numpy.ndarray) -> tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray, dict]:
+    self.step_workers(actions)
+    observations = self.buffers['observations'].copy()
+    rewards = self.buffers['rewards'].copy()
+    # Episodes only end on their time limit, as SumoEnvironment's
+    terminated = numpy.zeros(self.num_envs, dtype=numpy.bool_)
+    truncated = self.buffers['dones'].copy()
+    infos: dict = {}
+    if self.autoreset and truncated.any():
+      # Filled per index: numpy.array would stack the observations into one 3-d array when every worker is done
+      final_observations = numpy.empty(self.num_envs, dtype=object)
+      for index in numpy.flatnonzero(truncated):
+        final_observations[index] = observations[index]
+      infos['final_observation'] = final_observations
+      infos['_final_observation'] = truncated.copy()
+      self._command({index: ('reset', self._next_episode()) for index in range(self.num_envs) if truncated[index]})
+      observations[truncated] = self.buffers['observations'][truncated]
+    return observations, rewards, terminated, truncated, infos
+
+  def all_done(self) -> bool:
+    return bool(self.buffers['dones'].all())
+
+  def done(self, index: int) -> bool:
+    return bool(self.buffers['dones'][index])
+
+  def observations_of(self, index: int) -> dict[str, tuple]:
+    """Per-signal hashable observations of a worker, as SumoEnvironment.observations."""
+    observations = self.template.observation_fn.unbatch(self.buffers['observations'][index], self.observation_sizes)
+    return dict(zip(self.ts_ids, observations))
+
+  def rewards_of(self, index: int) -> dict[str, float]:
+    """Per-signal rewards of a worker, as SumoEnvironment.rewards."""
+    return dict(zip(self.ts_ids, self.buffers['rewards'][index].tolist()))
+
+  def metrics_of(self, index: int) -> dict[str, float]:
+    """Last recorded row of the numerical metrics of a worker."""
+    return dict(zip(self.metrics_columns, self.buffers['metrics'][index].tolist()))
+
+  def close(self, **kwargs) -> None:
+    if self.closed:
+      return
+    self.closed = True
+    for pipe, process in zip(self.pipes, self.processes):
+      if process.is_alive():
+        try:
+          pipe.send(('close', None))
+          pipe.recv()
+        except (BrokenPipeError, EOFError):
+          pass
+      process.join()
+    self.buffers.close()
+
+  def __del__(self) -> None:
+    if hasattr(self, 'closed'):
+      self.close()
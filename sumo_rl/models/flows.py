@@ -1,3 +1,4 @@
+from __future__ import annotations
 from sumo_rl.models.commons import Point, parse_shape
 import sumo_rl.models.sumo
 import xml.etree.ElementTree as ET
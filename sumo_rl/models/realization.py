@@ -1,9 +1,11 @@
 """
 Topology Realization
 """
+from __future__ import annotations
 import sumo_rl.models.sumo
 import sumo_rl.models.topology
 import math
+import typing
 
 def balance_branches(lhs: list, rhs: list) -> tuple[list, list]:
   while abs(len(lhs) - len(rhs)) > 1:
@@ -52,11 +54,11 @@ def partition_lanes(in_edge: sumo_rl.models.topology.Edge, outgoing_edges: list[
     partitions[-1] = (partitions[-1][0], partitions[-1][1] + lanes_to_partition[-diff:])
   return partitions
 
-NODE_BUILDER_YIELD=tuple[sumo_rl.models.sumo.Junction,
-                         list[sumo_rl.models.sumo.ViaConnection],
-                         list[sumo_rl.models.sumo.InternalConnection],
-                         list[sumo_rl.models.sumo.InternalEdge],
-                         list[sumo_rl.models.sumo.TLLogic]]
+NODE_BUILDER_YIELD=typing.Tuple[sumo_rl.models.sumo.Junction,
+                                typing.List[sumo_rl.models.sumo.ViaConnection],
+                                typing.List[sumo_rl.models.sumo.InternalConnection],
+                                typing.List[sumo_rl.models.sumo.InternalEdge],
+                                typing.List[sumo_rl.models.sumo.TLLogic]]
 def realize_node_as_dead_end(topology: sumo_rl.models.topology.Topology, node: sumo_rl.models.topology.Node) -> NODE_BUILDER_YIELD:
   outgoing_edges = list(topology.outgoing_edges[node.id].values())
   ingoing_edges = list(topology.ingoing_edges[node.id].values())
@@ -0,0 +1,232 @@
+"""Compiled scenarios: what the environment needs to know about a network, parsed once from the .net.xml and cached."""
+
+from __future__ import annotations
+import bisect
+import hashlib
+import os
+import pickle
+import tempfile
+import xml.etree.ElementTree as ET
+import sumo_rl.models.flows
+
+# Bump whenever the content of CompiledScenario changes, older bundles are then rebuilt
+BUNDLE_VERSION = 2
+
+# End of flows which don't give one, as in SUMO
+DEFAULT_FLOW_END = 86400.0
+
+def build_phase_tables(states: list[str]) -> tuple[list[str], dict[tuple[int, int], str]]:
+  """Return the green states of a program (yellow and all red phases are dropped) and the yellow state of each transition between them."""
+  green_states = [state for state in states if "y" not in state and (state.count("r") + state.count("s") != len(state))]
+  yellow_states = {}
+  for i, p1 in enumerate(green_states):
+    for j, p2 in enumerate(green_states):
+      if i == j:
+        continue
+      yellow_state = ""
+      for s in range(len(p1)):
+        if (p1[s] == "G" or p1[s] == "g") and (p2[s] == "r" or p2[s] == "s"):
+          yellow_state += "y"
+        else:
+          yellow_state += p1[s]
+      yellow_states[(i, j)] = yellow_state
+  return green_states, yellow_states
+
+class SignalLayout:
+  """Static description of a traffic signal: its first program, its controlled lanes and their lengths."""
+
+  def __init__(self, program_id: str, states: list[str], lanes: list[str], out_lanes: list[str], lanes_length: dict[str, float]) -> None:
+    self.program_id: str = program_id
+    self.states: list[str] = states
+    self.lanes: list[str] = lanes
+    self.out_lanes: list[str] = out_lanes
+    self.lanes_length: dict[str, float] = lanes_length
+    self.green_states, self.yellow_states = build_phase_tables(states)
+
+  @staticmethod
+  def from_traci(sumo, ts_id: str) -> SignalLayout:
+    """Query the layout of a traffic signal from a running simulation."""
+    logic = sumo.trafficlight.getAllProgramLogics(ts_id)[0]
+    lanes = list(dict.fromkeys(sumo.trafficlight.getControlledLanes(ts_id)))  # Remove duplicates and keep order
+    out_lanes = list(dict.fromkeys([link[0][1] for link in sumo.trafficlight.getControlledLinks(ts_id) if link]))
+    lanes_length = {lane: sumo.lane.getLength(lane) for lane in lanes + out_lanes}
+    return SignalLayout(logic.programID, [phase.state for phase in logic.phases], lanes, out_lanes, lanes_length)
+
+  def __repr__(self) -> str:
+    return "SignalLayout(%s, %s phases, %s lanes)" % (self.program_id, len(self.states), len(self.lanes))
+
+class CompiledScenario:
+  """Lanes, traffic signals and their adjacency of a network, plus the flow directions of its route files."""
+
+  def __init__(self,
+               lane_IDs: list[str],
+               lane_lengths: list[float],
+               lane_speeds: list[float],
+               edges: dict[str, tuple[str, str]],
+               signals: dict[str, SignalLayout]) -> None:
+    self.version: int = BUNDLE_VERSION
+    self.lane_IDs: list[str] = lane_IDs
+    self.lane_lengths: list[float] = lane_lengths
+    self.lane_speeds: list[float] = lane_speeds
+    self.edges: dict[str, tuple[str, str]] = edges
+    self.signals: dict[str, SignalLayout] = signals
+    self.adjacency: dict[str, set[str]] = self._build_adjacency()
+    # Flow ID -> direction, by route file (relative to the bundle)
+    self.flows: dict[str, dict[str, str]] = {}
+    # Sorted, disjoint (begin, end) windows in which vehicles depart, by route file (relative to the bundle)
+    self.departures: dict[str, list[tuple[float, float]]] = {}
+    # Hash of each source file, by path (relative to the bundle)
+    self.sources: dict[str, str] = {}
+    # Directory of the bundle, set when loaded
+    self.directory: str = '.'
+
+  @property
+  def ts_ids(self) -> list[str]:
+    return list(self.signals.keys())
+
+  def flows_of(self, route_file: str) -> dict[str, str]:
+    """Flow ID -> direction map of a route file compiled into the bundle."""
+    return self.flows[os.path.relpath(route_file, self.directory)]
+
+  def next_departure(self, route_file: str, time: float) -> float|None:
+    """Earliest time from time on at which a vehicle of the route file may depart, None if none will."""
+    windows = self.departures[os.path.relpath(route_file, self.directory)]
+    index = bisect.bisect_left([end for _, end in windows], time)
+    if index == len(windows):
+      return None
+    return max(windows[index][0], time)
+
+  def _build_adjacency(self) -> dict[str, set[str]]:
+    adjacency: dict[str, set[str]] = {}
+    for from_junction, to_junction in self.edges.values():
+      if from_junction in self.signals and to_junction in self.signals and from_junction != to_junction:
+        adjacency.setdefault(from_junction, set({})).add(to_junction)
+        adjacency.setdefault(to_junction, set({})).add(from_junction)
+    return adjacency
+
+  def __repr__(self) -> str:
+    return "CompiledScenario(%s lanes, %s signals, %s route files)" % (len(self.lane_IDs), len(self.signals), len(self.flows))
+
+# Hashes already computed in this process, by (path, size, mtime) of the file
+_file_hashes: dict[tuple[str, int, int], str] = {}
+
+def file_hash(path: str) -> str:
+  """SHA-1 of the file, read again only when its size or modification time changed."""
+  stat = os.stat(path)
+  key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+  if key not in _file_hashes:
+    digest = hashlib.sha1()
+    with open(path, "rb") as file:
+      for block in iter(lambda: file.read(1 << 20), b""):
+        digest.update(block)
+    _file_hashes[key] = digest.hexdigest()
+  return _file_hashes[key]
+
+def bundle_path(net_file: str) -> str:
+  """The bundle lives next to the network, e.g. scenario/network.net.xml -> scenario/network.bundle.pickle"""
+  directory, name = os.path.split(net_file)
+  return os.path.join(directory, name.split('.')[0] + '.bundle.pickle')
+
+def read_departure_windows(route_file: str) -> list[tuple[float, float]]:
+  """Windows of the departures of a route file: [begin, end] of each flow, [depart, depart] of each vehicle or trip, merged."""
+  windows: list[tuple[float, float]] = []
+  for _, element in ET.iterparse(route_file, events=("end",)):
+    try:
+      if element.tag == 'flow':
+        windows.append((float(element.attrib.get('begin', 0)), float(element.attrib.get('end', DEFAULT_FLOW_END))))
+      elif element.tag in ('vehicle', 'trip'):
+        depart = float(element.attrib['depart'])
+        windows.append((depart, depart))
+    except (KeyError, ValueError):
+      # Departures such as "triggered" have no time, they can't be told in advance
+      pass
+    if element.tag in ('flow', 'vehicle', 'trip'):
+      element.clear()
+  merged: list[tuple[float, float]] = []
+  for begin, end in sorted(windows):
+    if len(merged) > 0 and begin <= merged[-1][1]:
+      merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+    else:
+      merged.append((begin, end))
+  return merged
+
+def compile_network(net_file: str) -> CompiledScenario:
+  """Parse a .net.xml with one streaming pass."""
+  lane_IDs: list[str] = []
+  lane_lengths: list[float] = []
+  lane_speeds: list[float] = []
+  edges: dict[str, tuple[str, str]] = {}
+  programs: dict[str, tuple[str, list[str]]] = {}
+  links: dict[str, dict[int, tuple[str, str]]] = {}
+  for _, element in ET.iterparse(net_file, events=("end",)):
+    if element.tag == 'lane':
+      lane_IDs.append(element.attrib['id'])
+      lane_lengths.append(float(element.attrib['length']))
+      lane_speeds.append(float(element.attrib['speed']))
+    elif element.tag == 'edge':
+      # Internal, crossing and walking area edges don't join two junctions
+      if 'from' in element.attrib and 'to' in element.attrib:
+        edges[element.attrib['id']] = (element.attrib['from'], element.attrib['to'])
+      element.clear()
+    elif element.tag == 'tlLogic':
+      # Like trafficlight.getAllProgramLogics(ID)[0], the first program wins
+      if element.attrib['id'] not in programs:
+        programs[element.attrib['id']] = (element.attrib['programID'], [phase.attrib['state'] for phase in element.iter('phase')])
+      element.clear()
+    elif element.tag == 'connection':
+      if 'tl' in element.attrib:
+        from_lane = "%s_%s" % (element.attrib['from'], element.attrib['fromLane'])
+        to_lane = "%s_%s" % (element.attrib['to'], element.attrib['toLane'])
+        link_index = int(element.attrib['linkIndex'])
+        # Like trafficlight.getControlledLinks(ID)[linkIndex][0], the first connection wins
+        if link_index not in links.setdefault(element.attrib['tl'], {}):
+          links[element.attrib['tl']][link_index] = (from_lane, to_lane)
+      element.clear()
+
+  lengths = dict(zip(lane_IDs, lane_lengths))
+  signals: dict[str, SignalLayout] = {}
+  for ts_id, (program_id, states) in programs.items():
+    ts_links = [links.get(ts_id, {})[link_index] for link_index in sorted(links.get(ts_id, {}))]
+    lanes = list(dict.fromkeys([from_lane for from_lane, _ in ts_links]))
+    out_lanes = list(dict.fromkeys([to_lane for _, to_lane in ts_links]))
+    signals[ts_id] = SignalLayout(program_id, states, lanes, out_lanes, {lane: lengths[lane] for lane in lanes + out_lanes})
+  return CompiledScenario(lane_IDs, lane_lengths, lane_speeds, edges, signals)
+
+def load_scenario(net_file: str, route_files: list[str] = [], rebuild: bool = False) -> CompiledScenario:
+  """Load the bundle of the network, (re)compiling the network and the route files whose hash changed since it was written."""
+  path = bundle_path(net_file)
+  directory = os.path.dirname(path) or "."
+  scenario: CompiledScenario|None = None
+  if os.path.exists(path) and not rebuild:
+    try:
+      with open(path, "rb") as file:
+        scenario = pickle.load(file)
+    except (pickle.UnpicklingError, EOFError, AttributeError):
+      scenario = None
+  net_key = os.path.relpath(net_file, directory)
+  net_hash = file_hash(net_file)
+  changed = False
+  if scenario is None or getattr(scenario, 'version', None) != BUNDLE_VERSION or scenario.sources.get(net_key) != net_hash:
+    scenario = compile_network(net_file)
+    scenario.sources[net_key] = net_hash
+    changed = True
+  for route_file in route_files:
+    route_key = os.path.relpath(route_file, directory)
+    route_hash = file_hash(route_file)
+    if scenario.sources.get(route_key) != route_hash:
+      scenario.flows[route_key] = sumo_rl.models.flows.read_flows_from_routes_file(route_file)
+      scenario.departures[route_key] = read_departure_windows(route_file)
+      scenario.sources[route_key] = route_hash
+      changed = True
+  if changed:
+    # Written aside and moved in place, so that concurrent loaders never read a truncated bundle
+    descriptor, temporary = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path), suffix=".tmp")
+    try:
+      with os.fdopen(descriptor, "wb") as file:
+        pickle.dump(scenario, file)
+      os.replace(temporary, path)
+    except BaseException:
+      os.unlink(temporary)
+      raise
+  scenario.directory = directory
+  return scenario
@@ -1,6 +1,7 @@
 """Observation functions for traffic signals."""
+from __future__ import annotations
 
-from sumo_rl.environment.datastore import Datastore
+from sumo_rl.environment.datastore import Datastore, Requirements, INCOMING
 from sumo_rl.observations import ObservationFunction
 import sumo_rl.environment.traffic_signal
 import numpy
@@ -20,11 +21,22 @@ class DensityObservationFunction(ObservationFunction):
 
   def __call__(self, datastore: Datastore, ts: sumo_rl.environment.traffic_signal.TrafficSignal) -> tuple:
     """Return the density observation."""
-    density = [datastore.lanes[lane_ID]['lso'] for lane_ID in ts.lanes]
+    density = datastore.lso[ts.lanes_idx]
     observation = numpy.array(density, dtype=numpy.float32)
     state = self.encode(observation, ts)
     return state
 
+  def batch(self, datastore: Datastore, traffic_signals: list[sumo_rl.environment.traffic_signal.TrafficSignal]) -> tuple[numpy.ndarray, numpy.ndarray]:
+    """Return the density observations of all traffic signals in one pass."""
+    index = datastore.signal_index(traffic_signals)
+    matrix = numpy.zeros(index.lanes_mask.shape, dtype=numpy.float32)
+    matrix[index.lanes_mask] = datastore.lso[index.flat_lanes_idx]
+    return self.quantize(matrix), index.num_lanes.copy()
+
+  def requirements(self) -> Requirements:
+    """Reads lso on incoming lanes."""
+    return Requirements({'lso': {INCOMING}})
+
   def observation_space_size(self, ts: sumo_rl.environment.traffic_signal.TrafficSignal) -> int:
     """Return the observation space."""
     return len(ts.lanes)
@@ -1,12 +1,27 @@
 """Observation functions for traffic signals."""
+from __future__ import annotations
 
 import abc
-from sumo_rl.environment.datastore import Datastore
+from sumo_rl.environment.datastore import Datastore, Requirements
 import sumo_rl.environment.traffic_signal
 import gymnasium.spaces
 import numpy
 QUANTIZATION_LEVELS=64
 
+def queue_of_lanes(datastore: Datastore, lanes_idx: numpy.ndarray) -> numpy.ndarray:
+  """Occupancy scaled by the halting fraction of the given lanes, 0 on empty lanes."""
+  lsvn = datastore.lsvn[lanes_idx]
+  queue = datastore.lso[lanes_idx] * datastore.lshn[lanes_idx]
+  return numpy.divide(queue, lsvn, out=numpy.zeros_like(queue), where=(lsvn != 0.0))
+
+def green_phases_of(traffic_signals: list) -> numpy.ndarray:
+  """Current green phase of each traffic signal."""
+  return numpy.fromiter((ts.green_phase for ts in traffic_signals), dtype=numpy.int64, count=len(traffic_signals))
+
+def min_green_of(traffic_signals: list) -> numpy.ndarray:
+  """1 where the traffic signal has already spent min_green (plus yellow) seconds in the current phase, 0 otherwise."""
+  return numpy.fromiter((ts.time_since_last_phase_change >= ts.min_green + ts.yellow_time for ts in traffic_signals), dtype=numpy.float32, count=len(traffic_signals))
+
 class ObservationFunction(abc.ABC):
   """Abstract base class for observation functions."""
 
@@ -29,6 +44,26 @@ class ObservationFunction(abc.ABC):
     """Subclasses must override this method."""
     pass
 
+  def batch(self, datastore: Datastore, traffic_signals: list[sumo_rl.environment.traffic_signal.TrafficSignal]) -> tuple[numpy.ndarray, numpy.ndarray]:
+    """Return the observations of all traffic signals as a zero padded (n_signals, obs_dim) float32 matrix, along with the size of each row.
+
+    Subclasses should override it with a vectorized version, this one calls the observation function once per signal.
+    """
+    observations = [self(datastore, ts) for ts in traffic_signals]
+    sizes = numpy.array([len(observation) for observation in observations], dtype=numpy.int64)
+    matrix = numpy.zeros((len(traffic_signals), sizes.max(initial=0)), dtype=numpy.float32)
+    for row, observation in enumerate(observations):
+      matrix[row, :len(observation)] = observation
+    return matrix, sizes
+
+  def unbatch(self, matrix: numpy.ndarray, sizes: numpy.ndarray) -> list[tuple]:
+    """Split a batch into the hashable per-signal observations returned by __call__."""
+    return [tuple(row[:size]) for row, size in zip(matrix.tolist(), sizes.tolist())]
+
+  def requirements(self) -> Requirements:
+    """Return the datastore variables read by this observation function, subclasses should narrow it down."""
+    return Requirements.everything()
+
   def observation_space(self, ts: sumo_rl.environment.traffic_signal.TrafficSignal) -> gymnasium.spaces.Box:
     """Return the observation space."""
     return gymnasium.spaces.Box(low=numpy.zeros(self.observation_space_size(ts), dtype=numpy.float32),
@@ -49,6 +84,12 @@ class ObservationFunction(abc.ABC):
     assert density <= 1
     return int(density * QUANTIZATION_LEVELS) / QUANTIZATION_LEVELS
 
+  def quantize(self, matrix: numpy.ndarray) -> numpy.ndarray:
+    """Vectorized discretize_density."""
+    assert numpy.all(matrix >= 0)
+    assert numpy.all(matrix <= 1)
+    return numpy.floor(matrix * QUANTIZATION_LEVELS) / QUANTIZATION_LEVELS
+
   def encode(self, state: numpy.ndarray, ts: sumo_rl.environment.traffic_signal.TrafficSignal) -> tuple:
     """Encode the state of the traffic signal into a hashable object."""
     return tuple(map(self.discretize_density, state))
@@ -1,7 +1,9 @@
 """Observation functions for traffic signals."""
+from __future__ import annotations
 
-from sumo_rl.environment.datastore import Datastore
+from sumo_rl.environment.datastore import Datastore, Requirements
 from sumo_rl.observations import ObservationFunction
+from sumo_rl.observations.observation_function import green_phases_of
 import sumo_rl.environment.traffic_signal
 import numpy
 
@@ -25,6 +27,17 @@ class PhaseObservationFunction(ObservationFunction):
     state = self.encode(observation, ts)
     return state
 
+  def batch(self, datastore: Datastore, traffic_signals: list[sumo_rl.environment.traffic_signal.TrafficSignal]) -> tuple[numpy.ndarray, numpy.ndarray]:
+    """Return the phase observations of all traffic signals in one pass."""
+    index = datastore.signal_index(traffic_signals)
+    matrix = numpy.zeros((len(traffic_signals), index.num_green_phases.max(initial=0)), dtype=numpy.float32)
+    matrix[index.rows, green_phases_of(traffic_signals)] = 1
+    return matrix, index.num_green_phases.copy()
+
+  def requirements(self) -> Requirements:
+    """Reads nothing, the phase is kept by the traffic signal."""
+    return Requirements()
+
   def observation_space_size(self, ts: sumo_rl.environment.traffic_signal.TrafficSignal) -> int:
     """Return the observation space."""
     return ts.num_green_phases
@@ -1,7 +1,9 @@
 """Observation functions for traffic signals."""
+from __future__ import annotations
 
-from sumo_rl.environment.datastore import Datastore
+from sumo_rl.environment.datastore import Datastore, Requirements, INCOMING
 from sumo_rl.observations import ObservationFunction
+from sumo_rl.observations.observation_function import queue_of_lanes
 import sumo_rl.environment.traffic_signal
 import numpy
 
@@ -20,11 +22,22 @@ class QueueObservationFunction(ObservationFunction):
 
   def __call__(self, datastore: Datastore, ts: sumo_rl.environment.traffic_signal.TrafficSignal) -> tuple:
     """Return the queue observation."""
-    queue = [datastore.lanes[lane_ID]['lso'] * datastore.lanes[lane_ID]['lshn'] / datastore.lanes[lane_ID]['lsvn'] if (datastore.lanes[lane_ID]['lsvn'] != 0.0) else 0.0 for lane_ID in ts.lanes]
+    queue = queue_of_lanes(datastore, ts.lanes_idx)
     observation = numpy.array(queue, dtype=numpy.float32)
     state = self.encode(observation, ts)
     return state
 
+  def batch(self, datastore: Datastore, traffic_signals: list[sumo_rl.environment.traffic_signal.TrafficSignal]) -> tuple[numpy.ndarray, numpy.ndarray]:
+    """Return the queue observations of all traffic signals in one pass."""
+    index = datastore.signal_index(traffic_signals)
+    matrix = numpy.zeros(index.lanes_mask.shape, dtype=numpy.float32)
+    matrix[index.lanes_mask] = queue_of_lanes(datastore, index.flat_lanes_idx)
+    return self.quantize(matrix), index.num_lanes.copy()
+
+  def requirements(self) -> Requirements:
+    """Reads lso, lshn and lsvn on incoming lanes."""
+    return Requirements({'lso': {INCOMING}, 'lshn': {INCOMING}, 'lsvn': {INCOMING}})
+
   def observation_space_size(self, ts: sumo_rl.environment.traffic_signal.TrafficSignal) -> int:
     """Return the observation space."""
     return len(ts.lanes)
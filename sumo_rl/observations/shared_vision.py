@@ -1,6 +1,7 @@
 """Observation functions for traffic signals."""
+from __future__ import annotations
 
-from sumo_rl.environment.datastore import Datastore
+from sumo_rl.environment.datastore import Datastore, Requirements
 from sumo_rl.observations import ObservationFunction
 import sumo_rl.environment.traffic_signal
 import sumo_rl.preprocessing.graphs
@@ -25,6 +26,9 @@ class SharedVisionObservationFunction(ObservationFunction):
       observation += self.you_observation.cache(datastore, self.vision_graph.nodes[you_id])
     return observation
 
+  def requirements(self) -> Requirements:
+    """Reads what both composed observations read."""
+    return self.me_observation.requirements().union(self.you_observation.requirements())
 
   def observation_space_size(self, ts: sumo_rl.environment.traffic_signal.TrafficSignal) -> int:
     """Subclasses must override this method."""
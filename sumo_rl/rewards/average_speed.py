@@ -1,8 +1,10 @@
 """Reward functions for traffic signals."""
+from __future__ import annotations
 
 import sumo_rl.environment.traffic_signal
 from sumo_rl.rewards import RewardFunction
-from sumo_rl.environment.datastore import Datastore
+from sumo_rl.rewards.reward_function import segment_mean
+from sumo_rl.environment.datastore import Datastore, Requirements, INCOMING
 import numpy
 
 class AverageSpeedRewardFunction(RewardFunction):
@@ -14,4 +16,14 @@ class AverageSpeedRewardFunction(RewardFunction):
 
     def __call__(self, datastore: Datastore, ts: sumo_rl.environment.traffic_signal.TrafficSignal) -> float:
         """Return the average speed reward"""
-        return  numpy.mean([datastore.lanes[lane_ID]['lsms']/datastore.lanes[lane_ID]['ms'] for lane_ID in ts.lanes]) - 0.5
+        return numpy.mean(datastore.lsms[ts.lanes_idx] / datastore.ms[ts.lanes_idx]) - 0.5
+
+    def batch(self, datastore: Datastore, traffic_signals: list[sumo_rl.environment.traffic_signal.TrafficSignal]) -> numpy.ndarray:
+        """Return the average speed rewards of all traffic signals in one pass."""
+        index = datastore.signal_index(traffic_signals)
+        speeds = datastore.lsms[index.flat_lanes_idx] / datastore.ms[index.flat_lanes_idx]
+        return segment_mean(speeds, index.lanes_offsets, index.num_lanes) - 0.5
+
+    def requirements(self) -> Requirements:
+        """Reads lsms on incoming lanes."""
+        return Requirements({'lsms': {INCOMING}})
@@ -1,8 +1,10 @@
 """Reward functions for traffic signals."""
+from __future__ import annotations
 
 import sumo_rl.environment.traffic_signal
 from sumo_rl.rewards import RewardFunction
-from sumo_rl.environment.datastore import Datastore
+from sumo_rl.rewards.reward_function import segment_sum
+from sumo_rl.environment.datastore import Datastore, Requirements, INCOMING
 import numpy
 
 class DiffWaitingTimeRewardFunction(RewardFunction):
@@ -14,7 +16,19 @@ class DiffWaitingTimeRewardFunction(RewardFunction):
 
     def __call__(self, datastore: Datastore, ts: sumo_rl.environment.traffic_signal.TrafficSignal) -> float:
         """Return the diff waiting time reward"""
-        ts_wait = numpy.sum([datastore.lanes[lane_ID]['tawt'] for lane_ID in ts.lanes]) / 100.0
-        reward = ts.last_ts_waiting_time - ts_wait
-        ts.last_ts_waiting_time = ts_wait
+        ts_wait = numpy.sum(datastore.tawt[ts.lanes_idx]) / 100.0
+        reward = datastore.last_ts_waiting_time[ts.index] - ts_wait
+        datastore.last_ts_waiting_time[ts.index] = ts_wait
         return reward
+
+    def batch(self, datastore: Datastore, traffic_signals: list[sumo_rl.environment.traffic_signal.TrafficSignal]) -> numpy.ndarray:
+        """Return the diff waiting time rewards of all traffic signals in one pass."""
+        index = datastore.signal_index(traffic_signals)
+        ts_wait = segment_sum(datastore.tawt[index.flat_lanes_idx], index.lanes_offsets, index.num_lanes) / 100.0
+        rewards = datastore.last_ts_waiting_time[index.signals] - ts_wait
+        datastore.last_ts_waiting_time[index.signals] = ts_wait
+        return rewards
+
+    def requirements(self) -> Requirements:
+        """Reads tawt on incoming lanes."""
+        return Requirements({'tawt': {INCOMING}})
@@ -1,9 +1,10 @@
 """Reward functions for traffic signals."""
+from __future__ import annotations
 
 import numpy
 import sumo_rl.environment.traffic_signal
 from sumo_rl.rewards import RewardFunction
-from sumo_rl.environment.datastore import Datastore
+from sumo_rl.environment.datastore import Datastore, Requirements
 
 class MixedRewardFunction(RewardFunction):
     """Mixed reward function for traffic signals."""
@@ -16,7 +17,8 @@ class MixedRewardFunction(RewardFunction):
 
         if weights is None:
           length = len(self.reward_fns)
-          self.weights = [1/length for _ in range(length)]
+          weights = [1/length for _ in range(length)]
+        self.weights = weights
         assert(len(self.reward_fns) == len(self.weights))
         assert(sum(self.weights) == 1)
 
@@ -26,3 +28,15 @@ class MixedRewardFunction(RewardFunction):
         if len(rewards) > 1:
           return numpy.dot(rewards, self.weights)
         return rewards[0]
+
+    def batch(self, datastore: Datastore, traffic_signals: list[sumo_rl.environment.traffic_signal.TrafficSignal]) -> numpy.ndarray:
+        """Return the mixed rewards of all traffic signals, as a single dot product of the weights and the stacked batches."""
+        rewards = numpy.stack([reward_fn.batch(datastore, traffic_signals) for reward_fn in self.reward_fns])
+        return numpy.dot(self.weights, rewards)
+
+    def requirements(self) -> Requirements:
+        """Reads what every mixed reward function reads."""
+        requirements = Requirements()
+        for reward_fn in self.reward_fns:
+          requirements = requirements.union(reward_fn.requirements())
+        return requirements
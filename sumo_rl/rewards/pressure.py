@@ -1,8 +1,10 @@
 """Reward functions for traffic signals."""
+from __future__ import annotations
 
 import sumo_rl.environment.traffic_signal
 from sumo_rl.rewards import RewardFunction
-from sumo_rl.environment.datastore import Datastore
+from sumo_rl.rewards.reward_function import segment_sum
+from sumo_rl.environment.datastore import Datastore, Requirements, INCOMING, OUTGOING
 import numpy
 
 class PressureRewardFunction(RewardFunction):
@@ -14,4 +16,15 @@ class PressureRewardFunction(RewardFunction):
 
     def __call__(self, datastore: Datastore, ts: sumo_rl.environment.traffic_signal.TrafficSignal) -> float:
         """Return the pressure reward"""
-        return numpy.sum([datastore.lanes[lane_ID]['lsvn'] for lane_ID in ts.out_lanes]) - numpy.sum([datastore.lanes[lane_ID]['lsvn'] for lane_ID in ts.lanes])
+        return numpy.sum(datastore.lsvn[ts.out_lanes_idx]) - numpy.sum(datastore.lsvn[ts.lanes_idx])
+
+    def batch(self, datastore: Datastore, traffic_signals: list[sumo_rl.environment.traffic_signal.TrafficSignal]) -> numpy.ndarray:
+        """Return the pressure rewards of all traffic signals in one pass."""
+        index = datastore.signal_index(traffic_signals)
+        leaving = segment_sum(datastore.lsvn[index.flat_out_lanes_idx], index.out_lanes_offsets, index.num_out_lanes)
+        approaching = segment_sum(datastore.lsvn[index.flat_lanes_idx], index.lanes_offsets, index.num_lanes)
+        return leaving - approaching
+
+    def requirements(self) -> Requirements:
+        """Reads lsvn on incoming and outgoing lanes."""
+        return Requirements({'lsvn': {INCOMING, OUTGOING}})
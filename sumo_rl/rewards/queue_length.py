@@ -1,8 +1,10 @@
 """Reward functions for traffic signals."""
+from __future__ import annotations
 
 import sumo_rl.environment.traffic_signal
 from sumo_rl.rewards import RewardFunction
-from sumo_rl.environment.datastore import Datastore
+from sumo_rl.rewards.reward_function import segment_mean
+from sumo_rl.environment.datastore import Datastore, Requirements, INCOMING
 import numpy
 
 class QueueLengthRewardFunction(RewardFunction):
@@ -14,4 +16,13 @@ class QueueLengthRewardFunction(RewardFunction):
 
   def __call__(self, datastore: Datastore, ts: sumo_rl.environment.traffic_signal.TrafficSignal) -> float:
     """Return the queue length reward"""
-    return - numpy.mean([datastore.lanes[lane_ID]['lshn'] for lane_ID in ts.lanes])
+    return - numpy.mean(datastore.lshn[ts.lanes_idx])
+
+  def batch(self, datastore: Datastore, traffic_signals: list[sumo_rl.environment.traffic_signal.TrafficSignal]) -> numpy.ndarray:
+    """Return the queue length rewards of all traffic signals in one pass."""
+    index = datastore.signal_index(traffic_signals)
+    return - segment_mean(datastore.lshn[index.flat_lanes_idx], index.lanes_offsets, index.num_lanes)
+
+  def requirements(self) -> Requirements:
+    """Reads lshn on incoming lanes."""
+    return Requirements({'lshn': {INCOMING}})
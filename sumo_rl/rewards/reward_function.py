@@ -1,8 +1,24 @@
 """Reward functions for traffic signals."""
+from __future__ import annotations
 
 import abc
+import numpy
 import sumo_rl.environment.traffic_signal
-from sumo_rl.environment.datastore import Datastore
+from sumo_rl.environment.datastore import Datastore, Requirements
+
+def segment_sum(values: numpy.ndarray, offsets: numpy.ndarray, sizes: numpy.ndarray) -> numpy.ndarray:
+    """Sum of each segment values[offsets[i]:offsets[i] + sizes[i]] of consecutive segments, 0 for empty segments."""
+    sums = numpy.zeros(len(sizes), dtype=numpy.float64)
+    # reduceat yields values[offset] on empty segments and rejects offsets past the end: only the others are reduced
+    nonempty = sizes > 0
+    if nonempty.any():
+        sums[nonempty] = numpy.add.reduceat(values, offsets[nonempty], dtype=numpy.float64)
+    return sums
+
+def segment_mean(values: numpy.ndarray, offsets: numpy.ndarray, sizes: numpy.ndarray) -> numpy.ndarray:
+    """Mean of each segment, NaN for empty segments like numpy.mean."""
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        return segment_sum(values, offsets, sizes) / sizes
 
 class RewardFunction(abc.ABC):
     """Abstract base class for reward functions."""
@@ -26,3 +42,14 @@ class RewardFunction(abc.ABC):
         """Subclasses must override this method."""
         pass
 
+    def batch(self, datastore: Datastore, traffic_signals: list[sumo_rl.environment.traffic_signal.TrafficSignal]) -> numpy.ndarray:
+        """Return the rewards of all traffic signals as a vector.
+
+        Subclasses should override it with a vectorized version, this one calls the reward function once per signal.
+        """
+        return numpy.array([self(datastore, ts) for ts in traffic_signals], dtype=numpy.float64)
+
+    def requirements(self) -> Requirements:
+        """Return the datastore variables read by this reward function, subclasses should narrow it down."""
+        return Requirements.everything()
+
@@ -1,8 +1,9 @@
 """Reward functions for traffic signals."""
+from __future__ import annotations
 
 import sumo_rl.environment.traffic_signal
 from sumo_rl.rewards import RewardFunction
-from sumo_rl.environment.datastore import Datastore
+from sumo_rl.environment.datastore import Datastore, Requirements
 import sumo_rl.preprocessing.graphs
 
 class SharedVisionRewardFunction(RewardFunction):
@@ -22,3 +23,7 @@ class SharedVisionRewardFunction(RewardFunction):
     for you_id in (self.vision_graph.edges.get(ts.id) or []):
       reward += self.reward_function.cache(datastore, self.vision_graph.nodes[you_id])
     return reward
+
+  def requirements(self) -> Requirements:
+    """Reads what the shared reward function reads."""
+    return self.reward_function.requirements()
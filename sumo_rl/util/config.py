@@ -28,6 +28,11 @@ class SumoConfig(SerdeDict):
     self.delta_time: int = data['delta_time']
     self.sumo_seed: int = (data.get('sumo_seed') or random.randint(1, 100000))
     self.further_cmd_args: list[str] = data['further_cmd_args']
+    self.warmup_seconds: int = (data.get('warmup_seconds') or 0)
+    # 'micro' (default) or 'meso' (SUMO --mesosim)
+    self.fidelity: str = (data.get('fidelity') or 'micro')
+    # Metric columns recorded at each step (default: all of them), only the data they need is gathered
+    self.metrics: list[str]|None = data.get('metrics')
 
   def to_dict(self) -> dict:
     return {
@@ -36,6 +41,9 @@ class SumoConfig(SerdeDict):
       'delta_time': self.delta_time,
       'sumo_seed': self.sumo_seed,
       'further_cmd_args': self.further_cmd_args,
+      'warmup_seconds': self.warmup_seconds,
+      'fidelity': self.fidelity,
+      'metrics': self.metrics,
     }
 
   @staticmethod
@@ -94,10 +102,13 @@ class AgentsConfig(SerdeDict):
 class TrainingConfig(SerdeDict):
   def __init__(self, data: dict):
     self.seconds: int = data['seconds']
+    # The first meso_episodes training episodes run in meso, the others at the fidelity of the sumo section
+    self.meso_episodes: int = (data.get('meso_episodes') or 0)
 
   def to_dict(self) -> dict:
     return {
       'seconds': self.seconds,
+      'meso_episodes': self.meso_episodes,
     }
 
   @staticmethod
@@ -257,12 +268,42 @@ class Config(SerdeYamlFile, SerdeJsonFile):
   def training_metrics_file(self, episode: int) -> str:
     return "%s/%s.csv" % (self.training_metrics_dir(), episode)
 
+  def training_metrics_columns(self, episode: int) -> str:
+    return "%s/%s.columns" % (self.training_metrics_dir(), episode)
+
+  def training_timings_file(self, episode: int) -> str:
+    return "%s/%s.timings.yml" % (self.training_metrics_dir(), episode)
+
+  def training_traci_file(self, episode: int) -> str:
+    return "%s/%s.traci.yml" % (self.training_metrics_dir(), episode)
+
+  def training_fidelity(self, episode: int) -> str:
+    return 'meso' if episode < self.training.meso_episodes else self.sumo.fidelity
+
+  def training_fidelity_file(self, episode: int) -> str:
+    return "%s/%s.fidelity.yml" % (self.training_metrics_dir(), episode)
+
+  def training_traces_root(self) -> str:
+    return "%s/traces" % (self.training_metrics_dir())
+
+  def training_traces_dir(self, episode: int) -> str:
+    return ensure_dir("%s/%s" % (self.training_traces_root(), episode))
+
   def evaluation_metrics_dir(self) -> str:
     return ensure_dir("%s/evaluation" % (self.artifacts.metrics))
 
   def evaluation_metrics_file(self, episode: int) -> str:
     return "%s/%s.csv" % (self.evaluation_metrics_dir(), episode)
 
+  def evaluation_metrics_columns(self, episode: int) -> str:
+    return "%s/%s.columns" % (self.evaluation_metrics_dir(), episode)
+
+  def evaluation_timings_file(self, episode: int) -> str:
+    return "%s/%s.timings.yml" % (self.evaluation_metrics_dir(), episode)
+
+  def evaluation_traci_file(self, episode: int) -> str:
+    return "%s/%s.traci.yml" % (self.evaluation_metrics_dir(), episode)
+
   def training_plots_dir(self, label: str) -> str:
     return ensure_dir("%s/training/%s" % (self.artifacts.plots, label))
 
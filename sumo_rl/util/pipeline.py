@@ -0,0 +1,133 @@
+"""Episode runner overlapping agents' learning with the simulation."""
+
+from __future__ import annotations
+import concurrent.futures
+import time
+import typing
+import sumo_rl.agents
+import sumo_rl.environment.env
+
+class OverlapStats:
+  """Time spent by the main thread (SUMO and bookkeeping) and by the learner thread in overlapped sections, and their wall time."""
+
+  def __init__(self) -> None:
+    self.sections: int = 0
+    self.main_ns: int = 0
+    self.learn_ns: int = 0
+    self.wall_ns: int = 0
+
+  def add(self, main_ns: int, learn_ns: int, wall_ns: int) -> None:
+    self.sections += 1
+    self.main_ns += main_ns
+    self.learn_ns += learn_ns
+    self.wall_ns += wall_ns
+
+  @property
+  def overlap_ns(self) -> int:
+    """Time during which both threads were busy, i.e. the time saved over running them in sequence."""
+    return max(0, self.main_ns + self.learn_ns - self.wall_ns)
+
+  @property
+  def ratio(self) -> float:
+    """Fraction of the learning time hidden behind the main thread."""
+    return self.overlap_ns / self.learn_ns if self.learn_ns > 0 else 0.0
+
+  def to_dict(self) -> dict:
+    return {
+      'sections': self.sections,
+      'main_s': self.main_ns / 1e9,
+      'learn_s': self.learn_ns / 1e9,
+      'wall_s': self.wall_ns / 1e9,
+      'overlap_s': self.overlap_ns / 1e9,
+      'ratio': self.ratio,
+    }
+
+  def __repr__(self) -> str:
+    return "Overlap %.3f s of %.3f s learning (%.1f%%) in %s sections" % (self.overlap_ns / 1e9, self.learn_ns / 1e9, 100 * self.ratio, self.sections)
+
+def _learn(experiences: list[tuple[sumo_rl.agents.Agent, sumo_rl.agents.Experience]]) -> int:
+  start = time.perf_counter_ns()
+  for agent, experience in experiences:
+    agent.learn_from(experience)
+  return time.perf_counter_ns() - start
+
+class PipelinedRunner:
+  """Runs episodes like the sequential loop of main.py, with agents learning in a worker thread.
+
+  deterministic=True: the learning of a step overlaps with the metrics bookkeeping of that step only, and ends before agents act again,
+  so the run is step-for-step identical to the sequential loop. The bookkeeping is short next to learning, so this gives no meaningful speedup.
+  deterministic=False: the learning of a step overlaps with the whole next step (SUMO included), so agents act with a policy one step stale.
+  This is the mode that hides learning behind the simulation.
+
+  In both cases agents are never observed, acting and learning at the same time: learn_from() only touches their memory.
+  """
+
+  def __init__(self, env: sumo_rl.environment.env.SumoEnvironment, agents: list[sumo_rl.agents.Agent], deterministic: bool = True) -> None:
+    self.env: sumo_rl.environment.env.SumoEnvironment = env
+    self.agents: list[sumo_rl.agents.Agent] = agents
+    self.deterministic: bool = deterministic
+    self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='learner')
+    self.stats: OverlapStats = OverlapStats()
+
+  def _observe(self) -> None:
+    for agent in self.agents:
+      if agent.can_observe():
+        agent.observe(self.env.observations)
+
+  def _act(self) -> dict[str, int]:
+    actions = {}
+    for agent in self.agents:
+      actions.update(agent.act())
+    return actions
+
+  def _experiences(self) -> list[tuple[sumo_rl.agents.Agent, sumo_rl.agents.Experience]]:
+    return [(agent, agent.experience(self.env.rewards)) for agent in self.agents if agent.can_learn()]
+
+  def _overlap(self, experiences: list, main: typing.Callable[[], None]) -> None:
+    """Learn from experiences in the worker thread while running main in this one."""
+    start = time.perf_counter_ns()
+    future = self.executor.submit(_learn, experiences)
+    main()
+    main_ns = time.perf_counter_ns() - start
+    learn_ns = future.result()
+    self.stats.add(main_ns, learn_ns, time.perf_counter_ns() - start)
+
+  def _advance(self, actions: dict[str, int]) -> None:
+    self.env.step(action=actions)
+    self.env.gather_data_from_sumo()
+    self.env.compute_observations()
+    self.env.compute_rewards()
+    self.env.compute_metrics()
+
+  def run_episode(self, log_time: bool = False) -> OverlapStats:
+    """Run the current episode (env and agents must be reset) to its end, returns the overlap achieved."""
+    env = self.env
+    self.stats = OverlapStats()
+    env.gather_data_from_sumo()
+    env.compute_observations()
+    env.compute_rewards()
+    env.compute_metrics()
+    self._observe()
+    pending: list = []
+    while not env.done():
+      if log_time:
+        print(env.sim_step, end="\r")
+      actions = self._act()
+      if self.deterministic:
+        env.step(action=actions)
+        env.gather_data_from_sumo()
+        env.compute_observations()
+        env.compute_rewards()
+        self._observe()
+        # Metrics don't depend on agents, nor agents on metrics
+        self._overlap(self._experiences(), env.compute_metrics)
+      else:
+        self._overlap(pending, lambda: self._advance(actions))
+        self._observe()
+        pending = self._experiences()
+    if pending:
+      _learn(pending)
+    return self.stats
+
+  def close(self) -> None:
+    self.executor.shutdown(wait=True)
@@ -0,0 +1,73 @@
+"""Low overhead timing of the phases of a simulation loop."""
+from __future__ import annotations
+
+import time
+import numpy
+from sumo_rl.models.serde import GenericFile
+
+class Profiler:
+  """Collects monotonic clock spans (nanoseconds) by phase, summarized per episode.
+
+  Usage: `start = profiler.clock()`, then `profiler.record('phase', start)` when the phase ends.
+  Recording a span is one clock read and one list append.
+  """
+
+  def __init__(self) -> None:
+    self.spans: dict[str, list[int]] = {}
+    self.clock = time.perf_counter_ns
+
+  def record(self, phase: str, start: int) -> int:
+    """Record the span of phase started at start, returns the end (usable as start of the next phase)."""
+    end = self.clock()
+    spans = self.spans.get(phase)
+    if spans is None:
+      spans = self.spans[phase] = []
+    spans.append(end - start)
+    return end
+
+  def clear(self) -> None:
+    self.spans = {}
+
+  def summary(self) -> dict[str, dict[str, float]]:
+    """count, total, mean and p50/p95/p99 (seconds) of each phase."""
+    summary = {}
+    for phase, spans in self.spans.items():
+      values = numpy.array(spans, dtype=numpy.int64) / 1e9
+      p50, p95, p99 = numpy.percentile(values, [50, 95, 99])
+      summary[phase] = {
+        'count': int(len(values)),
+        'total': float(values.sum()),
+        'mean': float(values.mean()),
+        'p50': float(p50),
+        'p95': float(p95),
+        'p99': float(p99),
+      }
+    return summary
+
+  def table(self, summary: dict[str, dict[str, float]]|None = None) -> str:
+    if summary is None:
+      summary = self.summary()
+    lines = ["%-20s %8s %10s %10s %10s %10s" % ('phase', 'count', 'total s', 'p50 ms', 'p95 ms', 'p99 ms')]
+    for phase, stats in sorted(summary.items(), key=lambda item: -item[1]['total']):
+      lines.append("%-20s %8d %10.3f %10.3f %10.3f %10.3f" % (phase, stats['count'], stats['total'], 1e3 * stats['p50'], 1e3 * stats['p95'], 1e3 * stats['p99']))
+    return "\n".join(lines)
+
+  def dump(self, path: str) -> None:
+    """Write the summary of the episode to path (YAML), print it and start over."""
+    summary = self.summary()
+    GenericFile(summary).to_yaml_file(path)
+    print(self.table(summary))
+    self.clear()
+
+class NullProfiler(Profiler):
+  """Profiler which records nothing, so that instrumented loops cost (almost) nothing when timings are off."""
+
+  def __init__(self) -> None:
+    super().__init__()
+    self.clock = int
+
+  def record(self, phase: str, start: int) -> int:
+    return 0
+
+  def dump(self, path: str) -> None:
+    pass
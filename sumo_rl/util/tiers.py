@@ -0,0 +1,44 @@
+"""Throughput and metric drift of training episodes simulated at different fidelities (see SumoConfig.fidelity)."""
+
+import numpy
+from sumo_rl.environment.metrics import MetricsRecorder
+
+# Metrics compared between fidelities, by their mean over an episode
+DRIFT_METRICS = ['total_running', 'total_stopped', 'total_arrived', 'mean_waiting_time', 'mean_speed']
+
+class TierReport:
+  """Report of each episode: its fidelity, throughput and metric means, and how far these drift from the last episode of every other fidelity."""
+
+  def __init__(self) -> None:
+    self.last_means: dict[str, dict[str, float]] = {}
+
+  def episode(self, fidelity: str, wall_seconds: float, sim_seconds: float, metrics) -> dict:
+    """metrics is a MetricsRecorder or a DataFrame of the episode"""
+    # A MetricsRecorder is a mapping of its columns, a DataFrame has a length in rows
+    steps = metrics.length if isinstance(metrics, MetricsRecorder) else len(metrics)
+    means = {metric: float(numpy.nanmean(metrics[metric])) for metric in DRIFT_METRICS if metric in metrics and steps > 0}
+    drift = {}
+    for other, other_means in self.last_means.items():
+      if other == fidelity:
+        continue
+      drift[other] = {
+        metric: (mean - other_means[metric]) / other_means[metric] if other_means.get(metric) else float('nan')
+        for metric, mean in means.items()
+      }
+    self.last_means[fidelity] = means
+    return {
+      'fidelity': fidelity,
+      'wall_seconds': wall_seconds,
+      'sim_seconds': sim_seconds,
+      'sim_seconds_per_second': sim_seconds / wall_seconds if wall_seconds > 0 else float('nan'),
+      'steps_per_second': steps / wall_seconds if wall_seconds > 0 else float('nan'),
+      'means': means,
+      'drift': drift,
+    }
+
+def describe(report: dict) -> str:
+  """One line summary of an episode report"""
+  line = "%s :: %.1f sim s/s, %.1f steps/s" % (report['fidelity'], report['sim_seconds_per_second'], report['steps_per_second'])
+  for other, drift in report['drift'].items():
+    line += " :: drift from %s %s" % (other, ", ".join("%s %+.1f%%" % (metric, 100 * change) for metric, change in drift.items()))
+  return line
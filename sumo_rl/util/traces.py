@@ -0,0 +1,132 @@
+"""Recorded transitions of the traffic signals, to train agents again without simulating."""
+from __future__ import annotations
+
+import os
+import numpy
+from sumo_rl.models.serde import GenericFile
+from sumo_rl.agents.agent import Agent, Experience
+
+# Columns of a chunk, one row per step (observations are the padded batches of ObservationFunction.batch)
+TRACE_COLUMNS = ['time', 'observation', 'action', 'reward', 'next_observation']
+
+class TraceRecorder:
+  """Writes (observation, action, reward, next observation, time) of every signal at every step of an episode.
+
+  Steps are buffered in preallocated arrays and written every chunk_steps steps, either as one compressed
+  chunk-<n>.npz or (compress=False) as a chunk-<n> directory of .npy files, which load memory-mapped.
+  meta.yml holds the signals, their observation sizes and the number of chunks and steps.
+  """
+
+  def __init__(self, path: str, ts_ids: list[str], chunk_steps: int = 1024, compress: bool = True) -> None:
+    self.path = path
+    self.ts_ids = list(ts_ids)
+    self.chunk_steps = chunk_steps
+    self.compress = compress
+    self.sizes: list[int]|None = None
+    self.buffers: dict[str, numpy.ndarray]|None = None
+    self.used: int = 0
+    self.chunks: int = 0
+    self.steps: int = 0
+    if not os.path.exists(path):
+      os.makedirs(path)
+
+  def _allocate(self, observations: numpy.ndarray, sizes: numpy.ndarray) -> None:
+    num_signals, width = observations.shape
+    self.sizes = [int(size) for size in sizes]
+    self.buffers = {
+      'time': numpy.zeros(self.chunk_steps, dtype=numpy.float64),
+      'observation': numpy.zeros((self.chunk_steps, num_signals, width), dtype=observations.dtype),
+      'action': numpy.zeros((self.chunk_steps, num_signals), dtype=numpy.int64),
+      'reward': numpy.zeros((self.chunk_steps, num_signals), dtype=numpy.float64),
+      'next_observation': numpy.zeros((self.chunk_steps, num_signals, width), dtype=observations.dtype),
+    }
+
+  def record(self, time: float, observations: numpy.ndarray, sizes: numpy.ndarray, actions: dict[str, int], rewards: numpy.ndarray, next_observations: numpy.ndarray) -> None:
+    """One step: observations before the actions, the actions (by signal, -1 if none), rewards and observations after."""
+    if self.buffers is None:
+      self._allocate(observations, sizes)
+    row = self.used
+    self.buffers['time'][row] = time
+    self.buffers['observation'][row] = observations
+    self.buffers['action'][row] = [int(actions.get(ts_id, -1)) for ts_id in self.ts_ids]
+    self.buffers['reward'][row] = rewards
+    self.buffers['next_observation'][row] = next_observations
+    self.used += 1
+    if self.used == self.chunk_steps:
+      self._write_chunk()
+
+  def _write_chunk(self) -> None:
+    if self.used == 0:
+      return
+    columns = {column: self.buffers[column][:self.used] for column in TRACE_COLUMNS}
+    name = os.path.join(self.path, "chunk-%05d" % self.chunks)
+    if self.compress:
+      numpy.savez_compressed(name + ".npz", **columns)
+    else:
+      os.makedirs(name, exist_ok=True)
+      for column, values in columns.items():
+        numpy.save(os.path.join(name, column + ".npy"), values)
+    self.chunks += 1
+    self.steps += self.used
+    self.used = 0
+
+  def close(self) -> None:
+    self._write_chunk()
+    GenericFile({
+      'signals': self.ts_ids,
+      'sizes': self.sizes or [],
+      'chunks': self.chunks,
+      'steps': self.steps,
+      'compressed': self.compress,
+    }).to_yaml_file(os.path.join(self.path, "meta.yml"))
+
+def read_trace_meta(path: str) -> dict:
+  return GenericFile.from_yaml_file(os.path.join(path, "meta.yml")).to_dict()
+
+def identify_traces(traces_dir: str) -> list[int]:
+  """Episodes with a complete trace in traces_dir, in order."""
+  if not os.path.exists(traces_dir):
+    return []
+  episodes = [int(name) for name in os.listdir(traces_dir) if name.isdigit() and os.path.exists(os.path.join(traces_dir, name, "meta.yml"))]
+  return sorted(episodes)
+
+def trace_chunks(path: str):
+  """Yields the chunks of a trace as dicts of column arrays (memory-mapped when not compressed)."""
+  meta = read_trace_meta(path)
+  for chunk in range(meta['chunks']):
+    name = os.path.join(path, "chunk-%05d" % chunk)
+    if meta['compressed']:
+      with numpy.load(name + ".npz") as data:
+        yield {column: data[column] for column in TRACE_COLUMNS}
+    else:
+      yield {column: numpy.load(os.path.join(name, column + ".npy"), mmap_mode='r') for column in TRACE_COLUMNS}
+
+def _states(signals: list[str], matrix: list, sizes: list[int]) -> dict:
+  # Same hashable per-signal observations as ObservationFunction.unbatch
+  return {ts_id: tuple(row[:size]) for ts_id, row, size in zip(signals, matrix, sizes)}
+
+def replay_trace(path: str, agents: list[Agent]) -> int:
+  """Feeds the transitions of a recorded episode to the learning agents (observe, then learn_from), returns the steps replayed."""
+  meta = read_trace_meta(path)
+  signals, sizes = meta['signals'], meta['sizes']
+  learners = [agent for agent in agents if agent.can_learn()]
+  for agent in learners:
+    agent.reset()
+  steps = 0
+  for chunk in trace_chunks(path):
+    observations = chunk['observation'].tolist()
+    next_observations = chunk['next_observation'].tolist()
+    actions = chunk['action'].tolist()
+    rewards = chunk['reward'].tolist()
+    for step in range(len(observations)):
+      previous_states = _states(signals, observations[step], sizes)
+      current_states = _states(signals, next_observations[step], sizes)
+      experience = Experience(previous_states, dict(zip(signals, actions[step])), current_states, dict(zip(signals, rewards[step])))
+      for agent in learners:
+        if steps == 0 and agent.can_observe():
+          agent.observe(previous_states)
+        if agent.can_observe():
+          agent.observe(current_states)
+        agent.learn_from(experience)
+      steps += 1
+  return steps
@@ -0,0 +1,54 @@
+"""DirectionStatistics against grouping the vehicles by direction and reducing each group with NumPy"""
+from __future__ import annotations
+
+import numpy
+
+from sumo_rl.environment.directions import DirectionStatistics
+
+
+FLOWS = {'f_0': 'A-B', 'f_1': 'B-A', 'f_2': 'A-C', 'f_3': 'A-B'}
+
+
+def expected_statistics(vehicle_IDs: list[str], values: numpy.ndarray) -> tuple[dict, dict, dict]:
+  groups: dict = {}
+  for vehicle_ID, value in zip(vehicle_IDs, values.tolist()):
+    direction = FLOWS.get(vehicle_ID.split('.')[0])
+    groups[direction] = groups.get(direction, []) + [value]
+  return (
+    {direction: float(numpy.mean(group)) for direction, group in groups.items()},
+    {direction: float(numpy.median(group)) for direction, group in groups.items()},
+    {direction: float(numpy.std(group)) for direction, group in groups.items()},
+  )
+
+
+def assert_close(observed: dict, expected: dict) -> None:
+  assert observed.keys() == expected.keys()
+  for direction, value in expected.items():
+    numpy.testing.assert_allclose(observed[direction], value, rtol=1e-12, atol=1e-12)
+
+
+def test_statistics_match_numpy():
+  rng = numpy.random.default_rng(0)
+  statistics = DirectionStatistics(FLOWS, capacity=4)
+  running: list[str] = []
+  for step in range(50):
+    # Vehicles of known flows and of unknown ones (direction None) depart, some of the running ones arrive
+    departing = ["%s.%d" % (flow, step) for flow in ['f_0', 'f_1', 'f_2', 'f_3', 'other'] if rng.uniform() < 0.6]
+    statistics.depart(departing)
+    running += departing
+    arriving = [vehicle_ID for vehicle_ID in running if rng.uniform() < 0.2]
+    statistics.arrive(arriving)
+    running = [vehicle_ID for vehicle_ID in running if vehicle_ID not in arriving]
+    values = rng.uniform(0, 100, len(running))
+    for observed, expected in zip(statistics.statistics(running, values), expected_statistics(running, values)):
+      assert_close(observed, expected)
+
+
+def test_unseen_vehicles_and_empty_steps():
+  statistics = DirectionStatistics(FLOWS)
+  assert statistics.statistics([], numpy.zeros(0)) == ({}, {}, {})
+  # Vehicles loaded with a saved state never departed
+  vehicle_IDs = ['f_0.1', 'f_3.2', 'f_1.0', 'x.0']
+  values = numpy.array([1.0, 2.0, 4.0, 8.0])
+  for observed, expected in zip(statistics.statistics(vehicle_IDs, values), expected_statistics(vehicle_IDs, values)):
+    assert_close(observed, expected)
@@ -0,0 +1,43 @@
+"""Waiting time rewards and metrics under the mesoscopic simulation, on the aq scenario (needs SUMO)"""
+from __future__ import annotations
+
+import os
+import shutil
+
+import numpy
+import pytest
+
+
+pytestmark = pytest.mark.skipif('SUMO_HOME' not in os.environ and shutil.which('sumo') is None, reason="SUMO is not installed")
+
+SCENARIO = os.path.join(os.path.dirname(__file__), '..', 'scenarios', 'aq')
+
+
+@pytest.mark.parametrize('use_subscriptions', [False, True])
+def test_meso_waiting_times_are_sensible(use_subscriptions):
+  from sumo_rl.environment.env import SumoEnvironment
+  from sumo_rl.rewards import DiffWaitingTimeRewardFunction
+  env = SumoEnvironment(
+    os.path.join(SCENARIO, 'network.net.xml'), os.path.join(SCENARIO, 'routes.rou.xml'),
+    num_seconds=300, delta_time=5, yellow_time=2, sumo_seed=1, sumo_warnings=False, additional_sumo_cmd='--junction-taz',
+    fidelity='meso', use_subscriptions=use_subscriptions, reward_fn=DiffWaitingTimeRewardFunction(),
+  )
+  try:
+    env.reset()
+    rewards = []
+    while not env.done():
+      env.step(action={ts_id: 0 for ts_id in env.ts_ids})
+      env.gather_data_from_sumo()
+      env.compute_observations()
+      env.compute_rewards()
+      env.compute_metrics()
+      rewards.append(env.reward_vector.copy())
+    rewards = numpy.array(rewards)
+    awt = env.metrics['total_accumulated_waiting_time']
+    assert numpy.isfinite(rewards).all() and numpy.isfinite(awt).all()
+    # Vehicles wait in the queues of the red approaches
+    assert (awt >= 0).all() and awt.max() > 0
+    # A step of 5 seconds changes the waiting time at a junction by a few vehicles times 5 seconds, not by SUMO's invalid value
+    assert numpy.abs(rewards).max() < 1e4
+  finally:
+    env.close()
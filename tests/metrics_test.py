@@ -0,0 +1,50 @@
+"""Metrics recorded by a MetricsRecorder, streamed to column files by a MetricsSink and read back"""
+
+import numpy
+import pandas
+import pytest
+
+from sumo_rl.environment.metrics import COLUMNS_SUFFIX, DirectionsSink, MetricsRecorder, MetricsSink, identify_episodes, read_metrics
+
+
+def test_sink_raises_writer_errors(tmp_path):
+  sink = MetricsSink(str(tmp_path / '0.columns'), {'step': numpy.float64, 'mean_speed': numpy.float32}, maxsize=1)
+  # A chunk without mean_speed fails in the writer thread
+  sink.write({'step': numpy.arange(3, dtype=numpy.float64)})
+  with pytest.raises(KeyError):
+    for _ in range(8):
+      sink.write({'step': numpy.arange(3, dtype=numpy.float64), 'mean_speed': numpy.zeros(3, dtype=numpy.float32)})
+  with pytest.raises(KeyError):
+    sink.close()
+
+
+def test_directions_sink_raises_writer_errors(tmp_path):
+  sink = DirectionsSink(str(tmp_path / 'xdir'), maxsize=1, batch_size=1, drop=False)
+  # Fewer values than directions fail in the writer thread
+  sink.write(0, ['A-B', 'B-A'], [numpy.zeros(1)] * 3)
+  with pytest.raises(IndexError):
+    for row in range(1, 9):
+      sink.write(row, ['A-B'], [numpy.zeros(1)] * 3)
+  with pytest.raises(IndexError):
+    sink.close()
+
+
+def test_recorder_round_trip(tmp_path):
+  dtypes = {'step': numpy.float64, 'total_running': numpy.int64, 'mean_speed': numpy.float64}
+  recorder = MetricsRecorder(dtypes, capacity=2)
+  rows = [{'step': float(step), 'total_running': step * 3, 'mean_speed': step / 7} for step in range(10)]
+  recorder.append(rows[0])
+  # Rows recorded before streaming starts are written as well
+  recorder.stream(MetricsSink(str(tmp_path / ('0' + COLUMNS_SUFFIX)), recorder.dtypes, str(tmp_path / '0.csv')), chunk_size=3)
+  for row in rows[1:]:
+    recorder.append(row)
+  numpy.testing.assert_array_equal(recorder['total_running'], [row['total_running'] for row in rows])
+  recorder.close()
+  assert identify_episodes(str(tmp_path)) == [0]
+  metrics = read_metrics(str(tmp_path), 0)
+  assert list(metrics.columns) == list(dtypes)
+  for key, dtype in dtypes.items():
+    assert metrics[key].dtype == dtype
+    numpy.testing.assert_array_equal(metrics[key].to_numpy(), [row[key] for row in rows])
+  exported = pandas.read_csv(tmp_path / '0.csv')
+  numpy.testing.assert_allclose(exported.to_numpy(), metrics.to_numpy())
@@ -0,0 +1,65 @@
+"""Batched observations against the per-signal ones, on signals with empty lane segments"""
+
+import types
+
+import numpy
+import pytest
+
+from sumo_rl.environment.datastore import LANE_COLUMNS, Datastore
+from sumo_rl.observations import (
+  DefaultObservationFunction,
+  DensityObservationFunction,
+  PhaseObservationFunction,
+  QueueObservationFunction,
+)
+
+
+LANES = [[], [0, 1], [], [2, 3, 4], [5], []]
+
+
+def make_signals(seed: int) -> list:
+  rng = numpy.random.default_rng(seed)
+  signals = []
+  for index, lanes in enumerate(LANES):
+    num_green_phases = int(rng.integers(2, 5))
+    signals.append(types.SimpleNamespace(
+      id="ts%d" % index,
+      index=index,
+      num_green_phases=num_green_phases,
+      green_phase=int(rng.integers(0, num_green_phases)),
+      time_since_last_phase_change=float(rng.integers(0, 20)),
+      min_green=5,
+      yellow_time=2,
+      lanes=["lane%d" % lane for lane in lanes],
+      lanes_idx=numpy.array(lanes, dtype=numpy.int64),
+      out_lanes_idx=numpy.zeros(0, dtype=numpy.int64),
+    ))
+  return signals
+
+
+def make_datastore(seed: int) -> Datastore:
+  rng = numpy.random.default_rng(seed)
+  datastore = Datastore(["lane%d" % idx for idx in range(6)])
+  for key in LANE_COLUMNS:
+    datastore.columns[key][:] = rng.uniform(0, 1, 6)
+  # Halting vehicles are among the vehicles, one lane is empty
+  datastore.columns['lsvn'][:] = rng.integers(0, 10, 6)
+  datastore.columns['lsvn'][2] = 0
+  datastore.columns['lshn'][:] = numpy.floor(datastore.columns['lsvn'] * rng.uniform(0, 1, 6))
+  return datastore
+
+
+@pytest.mark.parametrize('observation_fn', [
+  DefaultObservationFunction,
+  DensityObservationFunction,
+  PhaseObservationFunction,
+  QueueObservationFunction,
+])
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_batch_matches_per_signal(observation_fn, seed):
+  signals = make_signals(seed)
+  datastore = make_datastore(seed)
+  function = observation_fn()
+  matrix, sizes = function.batch(datastore, signals)
+  assert sizes.tolist() == [function.observation_space_size(ts) for ts in signals]
+  assert function.unbatch(matrix, sizes) == [function(datastore, ts) for ts in signals]
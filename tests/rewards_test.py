@@ -0,0 +1,65 @@
+"""Batched rewards against the per-signal ones, on signals with empty lane segments"""
+
+import types
+
+import numpy
+import pytest
+
+from sumo_rl.environment.datastore import LANE_COLUMNS, Datastore
+from sumo_rl.rewards import (
+  AverageSpeedRewardFunction,
+  DiffWaitingTimeRewardFunction,
+  MixedRewardFunction,
+  PressureRewardFunction,
+  QueueLengthRewardFunction,
+)
+from sumo_rl.rewards.reward_function import segment_mean, segment_sum
+
+
+# Incoming and outgoing lanes of each signal, empty segments lead, trail and sit in the middle
+LANES = [[], [0, 1], [], [2, 3, 4], []]
+OUT_LANES = [[], [5], [6, 7], [8, 9, 10], []]
+
+
+def make_signals() -> list:
+  return [
+    types.SimpleNamespace(id="ts%d" % index, index=index, num_green_phases=2, lanes_idx=numpy.array(lanes, dtype=numpy.int64), out_lanes_idx=numpy.array(out_lanes, dtype=numpy.int64))
+    for index, (lanes, out_lanes) in enumerate(zip(LANES, OUT_LANES))
+  ]
+
+
+def make_datastore(seed: int) -> Datastore:
+  rng = numpy.random.default_rng(seed)
+  datastore = Datastore(["lane%d" % idx for idx in range(11)], num_signals=len(LANES))
+  for key in LANE_COLUMNS:
+    datastore.columns[key][:] = rng.uniform(0, 100, 11)
+  datastore.columns['ms'][:] = rng.uniform(10, 20, 11)
+  return datastore
+
+
+def test_segment_sum_empty_segments():
+  values = numpy.array([1, 2, 3], dtype=numpy.float32)
+  numpy.testing.assert_array_equal(segment_sum(values, numpy.array([0, 3]), numpy.array([3, 0])), [6, 0])
+  numpy.testing.assert_array_equal(segment_sum(values, numpy.array([0, 0, 2, 3]), numpy.array([0, 2, 1, 0])), [0, 3, 3, 0])
+  numpy.testing.assert_array_equal(segment_sum(values[:0], numpy.array([0, 0]), numpy.array([0, 0])), [0, 0])
+  numpy.testing.assert_array_equal(segment_mean(values, numpy.array([0, 3]), numpy.array([3, 0])), [2, numpy.nan])
+
+
+@pytest.mark.filterwarnings('ignore::RuntimeWarning')
+@pytest.mark.parametrize('reward_fn', [
+  AverageSpeedRewardFunction,
+  DiffWaitingTimeRewardFunction,
+  PressureRewardFunction,
+  QueueLengthRewardFunction,
+  lambda: MixedRewardFunction([PressureRewardFunction(), QueueLengthRewardFunction()], [0.5, 0.5]),
+])
+def test_batch_matches_per_signal(reward_fn):
+  signals = make_signals()
+  batched, single = make_datastore(0), make_datastore(0)
+  batch_fn, single_fn = reward_fn(), reward_fn()
+  # Twice, so that the diff waiting time differs from its previous value
+  for seed in [1, 2]:
+    for datastore in [batched, single]:
+      datastore.columns['tawt'][:] = numpy.random.default_rng(seed).uniform(0, 1000, 11)
+    expected = numpy.array([single_fn(single, ts) for ts in signals], dtype=numpy.float64)
+    numpy.testing.assert_allclose(batch_fn.batch(batched, signals), expected, rtol=1e-5, atol=1e-4)
@@ -0,0 +1,31 @@
+"""Scenario bundles: written atomically, rebuilt when their sources change"""
+
+import os
+import shutil
+
+from sumo_rl.models.scenario import bundle_path, file_hash, load_scenario
+
+
+SCENARIO = os.path.join(os.path.dirname(__file__), '..', 'scenarios', 'aq')
+
+
+def test_bundle_round_trip(tmp_path):
+  net_file = str(tmp_path / 'network.net.xml')
+  route_file = str(tmp_path / 'routes.rou.xml')
+  shutil.copy(os.path.join(SCENARIO, 'network.net.xml'), net_file)
+  shutil.copy(os.path.join(SCENARIO, 'routes.rou.xml'), route_file)
+  scenario = load_scenario(net_file, [route_file])
+  assert sorted(os.listdir(tmp_path)) == ['network.bundle.pickle', 'network.net.xml', 'routes.rou.xml']
+  assert scenario.next_departure(route_file, 0) == 0.0
+  reloaded = load_scenario(net_file, [route_file])
+  assert reloaded.sources == scenario.sources
+  assert reloaded.departures == scenario.departures
+
+
+def test_file_hash_follows_changes(tmp_path):
+  path = tmp_path / 'routes.rou.xml'
+  path.write_text('<routes/>')
+  first = file_hash(str(path))
+  assert file_hash(str(path)) == first
+  path.write_text('<routes></routes>')
+  assert file_hash(str(path)) != first
@@ -0,0 +1,27 @@
+"""Order in which the signal events come out of the EventScheduler"""
+
+from sumo_rl.environment.scheduler import DECISION, YELLOW_END, EventScheduler
+
+
+def test_pop_due_in_order():
+  scheduler = EventScheduler()
+  scheduler.schedule(10, DECISION, 1)
+  scheduler.schedule(7, YELLOW_END, 0)
+  scheduler.schedule(10, YELLOW_END, 2)
+  scheduler.schedule(5, DECISION, 0)
+  scheduler.schedule(10, DECISION, 0)
+  assert scheduler.next_time() == 5
+  assert scheduler.pop_due(4) == []
+  assert scheduler.pop_due(7) == [(5, DECISION, 0), (7, YELLOW_END, 0)]
+  # At the same second yellows end before signals decide, then signals go by index
+  assert scheduler.pop_due(10) == [(10, YELLOW_END, 2), (10, DECISION, 0), (10, DECISION, 1)]
+  assert len(scheduler) == 0
+  assert scheduler.next_time() is None
+
+
+def test_clear():
+  scheduler = EventScheduler()
+  scheduler.schedule(3, DECISION, 0)
+  scheduler.clear()
+  assert len(scheduler) == 0
+  assert scheduler.pop_due(100) == []
@@ -0,0 +1,100 @@
+"""Fast forward and idle skipping against the per-second stepping, on the aq scenario (needs SUMO)"""
+from __future__ import annotations
+
+import os
+import shutil
+
+import pytest
+
+
+pytestmark = pytest.mark.skipif('SUMO_HOME' not in os.environ and shutil.which('sumo') is None, reason="SUMO is not installed")
+
+SCENARIO = os.path.join(os.path.dirname(__file__), '..', 'scenarios', 'aq')
+
+
+def late_scenario(tmp_path, begin: int) -> tuple[str, str]:
+  """The aq network with its flows departing from begin on, so that the network is empty before"""
+  net_file = str(tmp_path / 'network.net.xml')
+  route_file = str(tmp_path / 'routes.rou.xml')
+  shutil.copy(os.path.join(SCENARIO, 'network.net.xml'), net_file)
+  with open(os.path.join(SCENARIO, 'routes.rou.xml'), encoding="utf-8") as source:
+    routes = source.read().replace('begin="0.00"', 'begin="%d.00"' % begin)
+  with open(route_file, mode="w", encoding="utf-8") as target:
+    target.write(routes)
+  return net_file, route_file
+
+
+def make_env(net_file: str, route_file: str, **kwargs):
+  from sumo_rl.environment.env import SumoEnvironment
+  return SumoEnvironment(net_file, route_file, num_seconds=200, delta_time=5, yellow_time=2, sumo_seed=1, sumo_warnings=False, additional_sumo_cmd='--junction-taz', **kwargs)
+
+
+def test_fast_forward_matches_per_second(tmp_path):
+  net_file, route_file = late_scenario(tmp_path, 0)
+  actions = [0, 0, 1, 1, 1, 0, 0, 1, 0, 1, 1, 1, 0]
+  states = {}
+  for fast_forward in [False, True]:
+    env = make_env(net_file, route_file, fast_forward=fast_forward)
+    try:
+      env.reset()
+      ts = env.ts_ids[0]
+      states[fast_forward] = []
+      for action in actions:
+        env.step({ts: action})
+        states[fast_forward].append((env.sim_time, env.sumo.trafficlight.getRedYellowGreenState(ts), env.traffic_signals[ts].is_yellow))
+    finally:
+      env.close()
+  assert states[True] == states[False]
+
+
+def test_yellow_ends_at_yellow_time_with_due_decision(tmp_path):
+  from sumo_rl.environment.scheduler import DECISION
+  env = make_env(*late_scenario(tmp_path, 0), fast_forward=True)
+  try:
+    env.reset()
+    ts = env.ts_ids[0]
+    signal = env.traffic_signals[ts]
+    env.step({ts: 0})
+    env.step({ts: 0})
+    # A decision already due when the step starts, as reset leaves behind
+    env.scheduler.schedule(env.sim_time, DECISION, signal.index)
+    env.step({ts: 1})
+    # The yellow ended yellow_time into the step, the new green has been on since
+    assert not signal.is_yellow
+    assert env.sumo.trafficlight.getRedYellowGreenState(ts) == signal.all_phases[1].state
+  finally:
+    env.close()
+
+
+@pytest.mark.parametrize('fast_forward', [False, True])
+def test_skip_idle_matches_per_step(tmp_path, fast_forward):
+  net_file, route_file = late_scenario(tmp_path, 80)
+  results = {}
+  for skip_idle in [False, True]:
+    env = make_env(net_file, route_file, skip_idle=skip_idle, fast_forward=fast_forward)
+    try:
+      env.reset()
+      ts = env.ts_ids[0]
+      signal = env.traffic_signals[ts]
+      for action in [0, 0, 1]:
+        env.step({ts: action})
+      if skip_idle:
+        skipped = env.skip_idle_steps()
+      else:
+        # Holding the green, as signals do during a skip
+        skipped = 0
+        while env.sim_time + env.delta_time < 80:
+          env.step({ts: signal.green_phase})
+          env.gather_data_from_sumo()
+          env.compute_metrics()
+          skipped += 1
+        env.compute_observations()
+      jump = (skipped, env.sim_time, env.observations[ts], signal.green_phase, signal.is_yellow, signal.last_phase_change_time, signal.time_to_act)
+      env.step({ts: 0})
+      env.gather_data_from_sumo()
+      env.compute_observations()
+      results[skip_idle] = (jump, env.sim_time, env.observations[ts], signal.is_yellow, signal.next_action_time, len(env.metrics['step']))
+    finally:
+      env.close()
+  assert results[True][0][0] > 0
+  assert results[True] == results[False]
@@ -0,0 +1,83 @@
+"""Transitions recorded by a TraceRecorder and fed back to agents by replay_trace"""
+from __future__ import annotations
+
+import numpy
+import pytest
+
+from sumo_rl.agents.agent import Agent
+from sumo_rl.util.traces import TraceRecorder, identify_traces, replay_trace
+
+
+TS_IDS = ['A', 'B']
+SIZES = numpy.array([3, 2])
+
+
+class RecordingAgent(Agent):
+    """Learns nothing, keeps what it observes and the experiences it learns from"""
+
+    def __init__(self) -> None:
+      super().__init__('recording')
+      self.observed: list = []
+      self.experiences: list = []
+
+    def reset(self) -> None:
+      pass
+
+    def hard_reset(self) -> None:
+      pass
+
+    def observe(self, observations) -> None:
+      self.observed.append(observations)
+
+    def act(self) -> dict[str, int]:
+      return {}
+
+    def learn(self, rewards) -> None:
+      pass
+
+    def learn_from(self, experience) -> None:
+      self.experiences.append(experience)
+
+    def serialize(self, output_filepath: str) -> None:
+      pass
+
+    def deserialize(self, input_filepath: str) -> None:
+      pass
+
+    def can_learn(self) -> bool:
+      return True
+
+    def can_observe(self) -> bool:
+      return True
+
+
+def states(matrix: numpy.ndarray) -> dict:
+  return {ts_id: tuple(row[:size]) for ts_id, row, size in zip(TS_IDS, matrix.tolist(), SIZES.tolist())}
+
+
+@pytest.mark.parametrize('compress', [True, False])
+def test_replay_round_trip(tmp_path, compress):
+  rng = numpy.random.default_rng(0)
+  path = str(tmp_path / '0')
+  recorder = TraceRecorder(path, TS_IDS, chunk_steps=4, compress=compress)
+  observations = numpy.floor(rng.uniform(0, 1, (2, 3)) * 64).astype(numpy.float32) / 64
+  steps = []
+  for step in range(10):
+    next_observations = numpy.floor(rng.uniform(0, 1, (2, 3)) * 64).astype(numpy.float32) / 64
+    actions = {'A': int(rng.integers(0, 4))} if step % 3 == 0 else {'A': 1, 'B': 0}
+    rewards = rng.normal(size=2)
+    recorder.record(5.0 * step, observations, SIZES, actions, rewards, next_observations)
+    steps.append((observations, actions, rewards, next_observations))
+    observations = next_observations
+  recorder.close()
+  assert identify_traces(str(tmp_path)) == [0]
+
+  agent = RecordingAgent()
+  assert replay_trace(path, [agent]) == 10
+  assert agent.observed == [states(steps[0][0])] + [states(step[3]) for step in steps]
+  for experience, (observations, actions, rewards, next_observations) in zip(agent.experiences, steps):
+    assert experience.previous_states == states(observations)
+    assert experience.current_states == states(next_observations)
+    # Signals which didn't act are recorded with action -1
+    assert experience.previous_actions == {ts_id: actions.get(ts_id, -1) for ts_id in TS_IDS}
+    assert experience.rewards == dict(zip(TS_IDS, rewards.tolist()))
@@ -0,0 +1,45 @@
+"""Episodes after a simulated warm-up against episodes after a cached one, on the aq scenario (needs SUMO)"""
+from __future__ import annotations
+
+import os
+import shutil
+
+import numpy
+import pytest
+
+
+pytestmark = pytest.mark.skipif('SUMO_HOME' not in os.environ and shutil.which('sumo') is None, reason="SUMO is not installed")
+
+SCENARIO = os.path.join(os.path.dirname(__file__), '..', 'scenarios', 'aq')
+
+
+@pytest.mark.parametrize('persistent_connection', [False, True])
+def test_cached_warm_up_matches_simulated(tmp_path, monkeypatch, persistent_connection):
+  from sumo_rl.environment.env import SumoEnvironment
+  # Warm-up states are cached in .cache/warmup, under the working directory
+  monkeypatch.chdir(tmp_path)
+  env = SumoEnvironment(
+    os.path.join(SCENARIO, 'network.net.xml'), os.path.join(SCENARIO, 'routes.rou.xml'),
+    num_seconds=200, delta_time=5, yellow_time=2, sumo_seed=1, sumo_warnings=False, additional_sumo_cmd='--junction-taz',
+    warmup_seconds=60, persistent_connection=persistent_connection,
+  )
+  actions = [0, 1, 1, 0, 1, 0, 0, 1]
+  episodes = []
+  try:
+    for _ in range(2):
+      env.reset()
+      step = 0
+      while not env.done():
+        env.step(action={ts_id: actions[step % len(actions)] for ts_id in env.ts_ids})
+        env.gather_data_from_sumo()
+        env.compute_observations()
+        env.compute_rewards()
+        env.compute_metrics()
+        step += 1
+      episodes.append({column: env.metrics[column].copy() for column in env.metrics})
+  finally:
+    env.close()
+  assert len(os.listdir(tmp_path / '.cache' / 'warmup')) == 1
+  # Episode 0 simulates the warm-up and saves its state, episode 1 loads it
+  for column, values in episodes[0].items():
+    numpy.testing.assert_array_equal(episodes[1][column], values, err_msg=column)
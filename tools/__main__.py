@@ -5,3 +5,6 @@ if __name__ == "__main__":
   print("> tools.amma2sumo")
   print("> tools.generation")
   print("> tools.flows")
+  print("> tools.compile")
+  print("> tools.bench")
+  print("> tools.calibrate")
@@ -0,0 +1,158 @@
+from __future__ import annotations
+import os
+import sys
+import time
+import argparse
+import itertools
+import subprocess
+from sumo_rl.models.commons import ensure_dir
+from sumo_rl.models.serde import GenericFile
+import sumo_rl.util.config
+
+# Per case metrics compared against the baseline, with the direction in which they get worse
+COMPARED = {
+  'sim_seconds_per_second': 'lower',
+  'steps_per_second': 'lower',
+  'wall_seconds': 'higher',
+  'peak_rss_mb': 'higher',
+}
+
+def bundled_scenarios(base_dir: str = './scenarios') -> list[str]:
+  return sorted(os.path.join(base_dir, name) for name in os.listdir(base_dir) if os.path.exists(os.path.join(base_dir, name, 'config.yml')))
+
+def case_key(scenario: str, agent: str, observation: str, reward: str, backend: str, jobs: int) -> str:
+  return '/'.join([os.path.basename(os.path.normpath(scenario)), agent, observation, reward, backend, 'j%s' % jobs])
+
+def write_case_config(base: dict, scenario: str, case_dir: str, seconds: int, seed: int) -> str:
+  """Config of one case: the first training route file of the scenario for seconds, with artifacts in case_dir"""
+  scenario_config = sumo_rl.util.config.ScenarioConfig.from_yaml_file(os.path.join(scenario, 'config.yml'))
+  scenario_config.set_path(scenario)
+  routes = [os.path.abspath(scenario_config.training_routes[0])]
+  scenario_dir = ensure_dir(os.path.join(case_dir, 'scenario'))
+  GenericFile({
+    'network': os.path.abspath(scenario_config.network),
+    'routes': {'training': routes, 'evaluation': routes, 'demo': routes},
+  }).to_yaml_file(os.path.join(scenario_dir, 'config.yml'))
+
+  data = dict(base)
+  data['sumo'] = dict(base['sumo'], seconds=seconds, sumo_seed=seed)
+  data['training'] = dict(base['training'], seconds=seconds)
+  data['scenario'] = scenario_dir
+  data['artifacts'] = {
+    'agents': os.path.join(case_dir, 'agents'),
+    'metrics': os.path.join(case_dir, 'metrics'),
+    'plots': os.path.join(case_dir, 'plots'),
+  }
+  path = os.path.join(case_dir, 'config.yml')
+  GenericFile(data).to_yaml_file(path)
+  return path
+
+def run_case(config_path: str, case_dir: str, agent: str, observation: str, reward: str, backend: str, jobs: int, seed: int, seconds: int) -> dict:
+  """Runs one training episode of main in a subprocess, returns its throughput, peak RSS and per phase timings"""
+  args = [sys.executable, '-m', 'main', '-C', config_path, '-DT', '-tm',
+          '-A', agent, '-O', observation, '-R', reward, '-S', str(seed), '-j', str(jobs)]
+  environ = dict(os.environ)
+  if backend == 'libsumo':
+    environ['LIBSUMO_AS_TRACI'] = '1'
+  else:
+    environ.pop('LIBSUMO_AS_TRACI', None)
+  with open(os.path.join(case_dir, 'output.log'), mode="w", encoding="utf-8") as log:
+    start = time.perf_counter()
+    process = subprocess.Popen(args, stdout=log, stderr=subprocess.STDOUT, env=environ)
+    # wait4 gives the resource usage of this child alone (ru_maxrss is in KiB on Linux)
+    _, status, usage = os.wait4(process.pid, 0)
+    wall = time.perf_counter() - start
+    process.returncode = os.waitstatus_to_exitcode(status)
+  result = {
+    'returncode': process.returncode,
+    'wall_seconds': wall,
+    'peak_rss_mb': usage.ru_maxrss / 1024,
+  }
+  if process.returncode != 0:
+    return result
+  timings_path = os.path.join(case_dir, 'metrics', 'training', '0.timings.yml')
+  phases = GenericFile.from_yaml_file(timings_path).to_dict() if os.path.exists(timings_path) else {}
+  steps = phases.get('env.step', {}).get('count', 0)
+  result.update({
+    'sim_seconds_per_second': seconds / wall,
+    'steps_per_second': steps / wall,
+    'phases': {phase: stats['total'] for phase, stats in phases.items()},
+  })
+  return result
+
+def compare(results: dict, baseline: dict, threshold: float) -> tuple[list[str], int]:
+  """Diff table of the cases in both results, and the number of metrics which got worse by more than threshold (relative)"""
+  lines = ["%-60s %-24s %12s %12s %9s" % ('case', 'metric', 'baseline', 'current', 'change')]
+  regressions = 0
+  for key in sorted(results.keys()):
+    if key not in baseline:
+      lines.append("%-60s %s" % (key, 'new case'))
+      continue
+    current, previous = results[key], baseline[key]
+    compared = list(COMPARED.items())
+    compared += [('phases.%s' % phase, 'higher') for phase in sorted(current.get('phases', {}).keys())]
+    for metric, worse in compared:
+      before, after = lookup(previous, metric), lookup(current, metric)
+      if before is None or after is None or before == 0:
+        continue
+      change = (after - before) / before
+      regressed = (change > threshold) if worse == 'higher' else (change < -threshold)
+      regressions += int(regressed)
+      lines.append("%-60s %-24s %12.3f %12.3f %+8.1f%%%s" % (key, metric, before, after, 100 * change, ' REGRESSION' if regressed else ''))
+  for key in sorted(set(baseline.keys()) - set(results.keys())):
+    lines.append("%-60s %s" % (key, 'missing'))
+  return lines, regressions
+
+def lookup(result: dict, metric: str) -> float|None:
+  value = result
+  for part in metric.split('.', 1):
+    if not isinstance(value, dict) or part not in value:
+      return None
+    value = value[part]
+  return value
+
+if __name__ == "__main__":
+  cli = argparse.ArgumentParser(sys.argv[0], description="Measures the throughput of a fixed, seeded training episode per scenario, agent, observation/reward, backend and number of jobs")
+  cli.add_argument('-C', '--config', default='./config.yml', help="Base YAML config (defaults to ./config.yml), its scenario and artifacts are replaced per case")
+  cli.add_argument('-s', '--scenarios', nargs='+', default=None, help="Scenario directories (defaults to every bundled scenario)")
+  cli.add_argument('-a', '--agents', nargs='+', default=['fixed', 'ql', 'dqn', 'ppo'], help="Agent types (as main -A)")
+  cli.add_argument('-o', '--observations', nargs='+', default=['default'], help="Observation functions (as main -O)")
+  cli.add_argument('-r', '--rewards', nargs='+', default=['dwt'], help="Reward functions (as main -R)")
+  cli.add_argument('-B', '--backends', nargs='+', choices=['traci', 'libsumo'], default=['traci', 'libsumo'], help="TraCI backends")
+  cli.add_argument('-j', '--jobs', type=int, default=1, help="Runs each case with 1..JOBS jobs")
+  cli.add_argument('-t', '--seconds', type=int, default=3600, help="Simulated seconds of each case")
+  cli.add_argument('-S', '--seed', type=int, default=42, help="SUMO seed of each case")
+  cli.add_argument('-w', '--workdir', default='./outputs/bench', help="Where cases write configs, logs and artifacts")
+  cli.add_argument('-O', '--output', default='bench.json', help="Results file (JSON)")
+  cli.add_argument('-b', '--baseline', default=None, help="Results file to compare against")
+  cli.add_argument('-T', '--threshold', type=float, default=0.1, help="Relative change flagged as a regression (defaults to 0.1)")
+  cli_args = cli.parse_args(sys.argv[1:])
+
+  base = GenericFile.from_yaml_file(cli_args.config).to_dict()
+  scenarios = cli_args.scenarios or bundled_scenarios()
+  cases = itertools.product(scenarios, cli_args.agents, cli_args.observations, cli_args.rewards, cli_args.backends, range(1, cli_args.jobs + 1))
+  results = {}
+  for scenario, agent, observation, reward, backend, jobs in cases:
+    key = case_key(scenario, agent, observation, reward, backend, jobs)
+    case_dir = ensure_dir(os.path.join(cli_args.workdir, key.replace('/', '-')))
+    config_path = write_case_config(base, scenario, case_dir, cli_args.seconds, cli_args.seed)
+    result = run_case(config_path, case_dir, agent, observation, reward, backend, jobs, cli_args.seed, cli_args.seconds)
+    results[key] = result
+    if result['returncode'] != 0:
+      print("%-60s FAILED (see %s)" % (key, os.path.join(case_dir, 'output.log')))
+    else:
+      print("%-60s %10.1f sim s/s %10.1f steps/s %8.1f MiB" % (key, result['sim_seconds_per_second'], result['steps_per_second'], result['peak_rss_mb']))
+
+  GenericFile({
+    'seconds': cli_args.seconds,
+    'seed': cli_args.seed,
+    'cases': results,
+  }).to_json_file(cli_args.output)
+
+  if cli_args.baseline is not None:
+    baseline = GenericFile.from_json_file(cli_args.baseline).to_dict()
+    lines, regressions = compare(results, baseline['cases'], cli_args.threshold)
+    print("\n".join(lines))
+    if regressions > 0:
+      print("%s regressions against %s" % (regressions, cli_args.baseline))
+      sys.exit(1)
@@ -0,0 +1,106 @@
+from __future__ import annotations
+import os
+import sys
+import time
+import argparse
+import subprocess
+import numpy
+from sumo_rl.models.commons import ensure_dir
+from sumo_rl.models.serde import GenericFile
+from sumo_rl.environment.metrics import identify_episodes, read_metrics
+
+# Metrics compared between SUMO and the surrogate
+COMPARED = ['total_running', 'total_backlogged', 'total_stopped', 'total_arrived', 'total_waiting_time', 'mean_waiting_time', 'total_accumulated_waiting_time', 'mean_speed']
+BACKENDS = ['sumo', 'surrogate']
+
+def write_backend_config(base: dict, backend_dir: str, seconds: int|None) -> str:
+  """Config of one backend: the base one with artifacts in backend_dir"""
+  data = dict(base)
+  if seconds is not None:
+    data['evaluation'] = dict(base['evaluation'], seconds=seconds)
+  data['artifacts'] = {
+    'agents': os.path.join(backend_dir, 'agents'),
+    'metrics': os.path.join(backend_dir, 'metrics'),
+    'plots': os.path.join(backend_dir, 'plots'),
+  }
+  path = os.path.join(backend_dir, 'config.yml')
+  GenericFile(data).to_yaml_file(path)
+  return path
+
+def run_backend(config_path: str, backend_dir: str, backend: str, agent: str, seed: int) -> dict:
+  """Runs the evaluation episodes of main on one backend, returns its exit code and wall time"""
+  args = [sys.executable, '-m', 'main', '-C', config_path, '-DE', '-A', agent, '-S', str(seed)]
+  if backend == 'surrogate':
+    args.append('-sg')
+  with open(os.path.join(backend_dir, 'output.log'), mode="w", encoding="utf-8") as log:
+    start = time.perf_counter()
+    returncode = subprocess.call(args, stdout=log, stderr=subprocess.STDOUT)
+  return {'returncode': returncode, 'wall_seconds': time.perf_counter() - start}
+
+def compare_metrics(reference, surrogate) -> dict[str, dict[str, float]]:
+  """Mean of each metric on both backends, with the error of the surrogate (mean, relative mean, RMSE, correlation over time)"""
+  steps = min(len(reference), len(surrogate))
+  report = {}
+  for metric in COMPARED:
+    if metric not in reference or metric not in surrogate:
+      continue
+    expected = reference[metric].to_numpy(dtype=numpy.float64)[:steps]
+    observed = surrogate[metric].to_numpy(dtype=numpy.float64)[:steps]
+    expected_mean, observed_mean = float(numpy.nanmean(expected)), float(numpy.nanmean(observed))
+    correlation = numpy.nan
+    if numpy.nanstd(expected) > 0 and numpy.nanstd(observed) > 0:
+      valid = ~(numpy.isnan(expected) | numpy.isnan(observed))
+      correlation = float(numpy.corrcoef(expected[valid], observed[valid])[0, 1])
+    report[metric] = {
+      'sumo': expected_mean,
+      'surrogate': observed_mean,
+      'error': observed_mean - expected_mean,
+      'relative_error': (observed_mean - expected_mean) / expected_mean if expected_mean != 0 else numpy.nan,
+      'rmse': float(numpy.sqrt(numpy.nanmean((observed - expected) ** 2))),
+      'correlation': correlation,
+    }
+  return report
+
+if __name__ == "__main__":
+  cli = argparse.ArgumentParser(sys.argv[0], description="Runs the evaluation episodes of a config in SUMO and in the surrogate (main -sg) with the same agent and seed, reports how far apart their metrics are and how much faster the surrogate is")
+  cli.add_argument('-C', '--config', default='./config.yml', help="YAML config (defaults to ./config.yml), its artifacts are replaced per backend")
+  cli.add_argument('-A', '--agent', default='fixed', help="Agent type (as main -A, defaults to fixed so that both backends see the same signal plans)")
+  cli.add_argument('-t', '--seconds', type=int, default=None, help="Simulated seconds of each episode (defaults to the evaluation seconds of the config)")
+  cli.add_argument('-S', '--seed', type=int, default=42, help="SUMO seed")
+  cli.add_argument('-w', '--workdir', default='./outputs/calibrate', help="Where backends write configs, logs and metrics")
+  cli.add_argument('-O', '--output', default='calibration.yml', help="Report file (YAML, or JSON if it ends with .json)")
+  cli_args = cli.parse_args(sys.argv[1:])
+
+  base = GenericFile.from_yaml_file(cli_args.config).to_dict()
+  runs = {}
+  for backend in BACKENDS:
+    backend_dir = ensure_dir(os.path.join(cli_args.workdir, backend))
+    config_path = write_backend_config(base, backend_dir, cli_args.seconds)
+    runs[backend] = run_backend(config_path, backend_dir, backend, cli_args.agent, cli_args.seed)
+    if runs[backend]['returncode'] != 0:
+      print("%s FAILED (see %s)" % (backend, os.path.join(backend_dir, 'output.log')))
+      sys.exit(1)
+    print("%-10s %8.1f s" % (backend, runs[backend]['wall_seconds']))
+
+  metrics_dirs = {backend: os.path.join(cli_args.workdir, backend, 'metrics', 'evaluation') for backend in BACKENDS}
+  episodes = {}
+  for episode in identify_episodes(metrics_dirs['sumo']):
+    episodes[episode] = compare_metrics(read_metrics(metrics_dirs['sumo'], episode), read_metrics(metrics_dirs['surrogate'], episode))
+    print("Episode %s" % episode)
+    print("  %-32s %12s %12s %9s %12s %7s" % ('metric', 'sumo', 'surrogate', 'rel err', 'rmse', 'corr'))
+    for metric, stats in episodes[episode].items():
+      print("  %-32s %12.3f %12.3f %+8.1f%% %12.3f %7.2f" % (metric, stats['sumo'], stats['surrogate'], 100 * stats['relative_error'], stats['rmse'], stats['correlation']))
+
+  report = {
+    'config': cli_args.config,
+    'agent': cli_args.agent,
+    'seed': cli_args.seed,
+    'wall_seconds': {backend: run['wall_seconds'] for backend, run in runs.items()},
+    'speedup': runs['sumo']['wall_seconds'] / runs['surrogate']['wall_seconds'],
+    'episodes': episodes,
+  }
+  print("Surrogate speedup: %.1fx" % report['speedup'])
+  if cli_args.output.endswith('.json'):
+    GenericFile(report).to_json_file(cli_args.output)
+  else:
+    GenericFile(report).to_yaml_file(cli_args.output)
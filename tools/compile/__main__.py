@@ -0,0 +1,18 @@
+import sumo_rl.models.scenario
+import sumo_rl.models.commons
+import sumo_rl.util.config
+import argparse
+import sys
+
+if __name__ == "__main__":
+  cli = argparse.ArgumentParser(sys.argv[0], description="Compiles the network and the route files of a scenario into its bundle")
+  cli.add_argument('-C', '--config', default='./config.yml', help="Selects YAML config (defaults to ./config.yml)")
+  cli.add_argument('-f', '--force', action="store_true", default=False, help="Rebuilds the bundle even if no source file changed")
+  cli_args = cli.parse_args(sys.argv[1:])
+  config = sumo_rl.util.config.Config.from_yaml_file(cli_args.config)
+
+  timer = sumo_rl.models.commons.Timer()
+  network = config.scenario.network
+  routes = list(dict.fromkeys(config.scenario.training_routes + config.scenario.evaluation_routes + config.scenario.demo_routes))
+  scenario = sumo_rl.models.scenario.load_scenario(network, routes, rebuild=cli_args.force)
+  timer.round("Compiled %s into %s" % (scenario, sumo_rl.models.scenario.bundle_path(network)))
@@ -3,6 +3,7 @@ Sogno tecnologico bolscevico
 Atea mistica meccanica
 Macchina automatica. No anima
 """
+from __future__ import annotations
 
 import sumo_rl.models.sumo
 import sumo_rl.models.flows
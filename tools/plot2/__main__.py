@@ -7,6 +7,7 @@ import matplotlib.pyplot
 from sumo_rl.models.serde import GenericFile
 import sumo_rl.util.color
 import sumo_rl.util.config
+import sumo_rl.environment.metrics
 import argparse
 import sys
 import enum
@@ -24,20 +25,13 @@ class Datastore:
     self.metrics: dict[int, pandas.DataFrame] = self._load_metrics()
     self.tracks = self._identify_tracks()
 
-  def _identify_all_csvs(self, dir: str) -> list[str]:
-    files = []
-    for file in os.listdir(dir):
-      if file.endswith('.csv'):
-        files.append(file)
-    return files
-
   def _identify_episodes(self) -> list[int]:
-    return [int(file.split('.')[0]) for file in self._identify_all_csvs(self.metrics_dir())]
+    return sumo_rl.environment.metrics.identify_episodes(self.metrics_dir())
 
   def _load_metrics(self) -> dict[int, pandas.DataFrame]:
     metrics = {}
     for episode in self.episodes:
-      df = pandas.read_csv(self.metrics_file(episode))
+      df = sumo_rl.environment.metrics.read_metrics(self.metrics_dir(), episode)
       df = df.dropna()
       metrics[episode] = df
     return metrics
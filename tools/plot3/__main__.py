@@ -7,6 +7,7 @@ import matplotlib.pyplot
 from sumo_rl.models.serde import GenericFile
 import sumo_rl.util.color
 import sumo_rl.util.config
+import sumo_rl.environment.metrics
 import sumo_rl.models.flows
 import argparse
 import sys
@@ -27,20 +28,13 @@ class Datastore:
     self.routes: dict[int, pandas.DataFrame] = self._load_routes()
     self.tracks = self._identify_tracks()
 
-  def _identify_all_csvs(self, dir: str) -> list[str]:
-    files = []
-    for file in os.listdir(dir):
-      if file.endswith('.csv'):
-        files.append(file)
-    return files
-
   def _identify_episodes(self) -> list[int]:
-    return [int(file.split('.')[0]) for file in self._identify_all_csvs(self.metrics_dir())]
+    return sumo_rl.environment.metrics.identify_episodes(self.metrics_dir())
 
   def _load_metrics(self) -> dict[int, pandas.DataFrame]:
     metrics = {}
     for episode in self.episodes:
-      df = pandas.read_csv(self.metrics_file(episode))
+      df = sumo_rl.environment.metrics.read_metrics(self.metrics_dir(), episode)
       df = df.fillna(0)
       metrics[episode] = df
     return metrics
@@ -133,6 +127,13 @@ class Datastore:
   def extract(self, episode: int, label: str) -> numpy.ndarray:
     return numpy.array(self.metrics[episode][label])
 
+  def extract_directions(self, episode: int, label: str) -> numpy.ndarray:
+    """Per-direction records of an xdir statistic, from the xdir files or, for older runs, from the metrics column"""
+    directions = sumo_rl.environment.metrics.read_episode_directions(self.metrics_dir(), episode)
+    if directions is None:
+      return interpret_dicts(self.extract(episode, label))
+    return numpy.array(sumo_rl.environment.metrics.direction_records(directions[label]))
+
 class Smoother:
   @staticmethod
   def Symmetric(data: numpy.ndarray, K: int) -> numpy.ndarray:
@@ -320,7 +321,7 @@ if __name__ == "__main__":
       # Plotter.Directional(smoothed_Ys, datastore.plots_file('smoothed_%s' % label, episode), 'smoothed_%s' % label)
 
       for label in ['mean_awt_xdir', 'median_awt_xdir', 'std_awt_xdir']:
-        Ys = divide_by_dirs(interpret_dicts(datastore.extract(episode, label)))
+        Ys = divide_by_dirs(datastore.extract_directions(episode, label))
         # track = datastore.track(episode)
         normalized_Ys = normalize_data_by_occupancy(Ys, compatible_vehs)
         normalized_slotted_Ys = DirectionalSlotter.Apply(normalized_Ys, 100)
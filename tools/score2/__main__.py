@@ -4,6 +4,7 @@ import numpy
 import pandas
 from sumo_rl.models.serde import GenericFile
 import sumo_rl.util.config
+import sumo_rl.environment.metrics
 import argparse
 import sys
 import enum
@@ -22,20 +23,13 @@ class Datastore:
     self.metrics: dict[int, pandas.DataFrame] = self._load_metrics()
     self.tracks = self._identify_tracks()
 
-  def _identify_all_csvs(self, dir: str) -> list[str]:
-    files = []
-    for file in os.listdir(dir):
-      if file.endswith('.csv'):
-        files.append(file)
-    return files
-
   def _identify_episodes(self) -> list[int]:
-    return [int(file.split('.')[0]) for file in self._identify_all_csvs(self.metrics_dir())]
+    return sumo_rl.environment.metrics.identify_episodes(self.metrics_dir())
 
   def _load_metrics(self) -> dict[int, pandas.DataFrame]:
     metrics = {}
     for episode in self.episodes:
-      df = pandas.read_csv(self.metrics_file(episode))
+      df = sumo_rl.environment.metrics.read_metrics(self.metrics_dir(), episode)
       df = df.dropna()
       metrics[episode] = df
     return metrics
@@ -93,6 +87,17 @@ class Datastore:
       result += list(self.metrics[episode][label])
     return numpy.array(result)
 
+  def extract_directions_roll(self, label: str) -> numpy.ndarray:
+    """Per-direction records of an xdir statistic, from the xdir files or, for older runs, from the metrics column"""
+    result = []
+    for episode in self.episodes:
+      directions = sumo_rl.environment.metrics.read_episode_directions(self.metrics_dir(), episode)
+      if directions is None:
+        result += list(interpret_dicts(self.metrics[episode][label]))
+      else:
+        result += sumo_rl.environment.metrics.direction_records(directions[label])
+    return numpy.array(result)
+
 def divide_by_dirs(Ys: numpy.ndarray) -> dict:
   dirs: dict[str, list] = {}
   for idx, record in enumerate(Ys):
@@ -131,9 +136,9 @@ if __name__ == "__main__":
 
   datastore = Datastore(config, Datastore.Mode.EVALUATION)
   data = {}
-  data['mean_awt_xdir'] = interpret_dicts(datastore.extract_roll('mean_awt_xdir'))
-  data['median_awt_xdir'] = interpret_dicts(datastore.extract_roll('median_awt_xdir'))
-  data['std_awt_xdir'] = interpret_dicts(datastore.extract_roll('std_awt_xdir'))
+  data['mean_awt_xdir'] = datastore.extract_directions_roll('mean_awt_xdir')
+  data['median_awt_xdir'] = datastore.extract_directions_roll('median_awt_xdir')
+  data['std_awt_xdir'] = datastore.extract_directions_roll('std_awt_xdir')
   scores = {}
   labels = [
     'mean_awt_xdir',